@@ -0,0 +1,66 @@
+"""
+Runs the endpoint load through Django's test client, in-process.
+
+Started by benchmarks.run in a fresh interpreter per scenario, with
+SQLITE_PATH / STORM_DATA_DIR / CACHE_DIR / NHC_CURRENT_STORMS_URL already
+pointing at the scenario's data, so peak RSS is this scenario's alone.
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import threading
+
+import django
+
+from .load import HEADERS, RSSSampler, run_load
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--endpoints", required=True, help="JSON {name: path}")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "hurricane_project.settings")
+    django.setup()
+    from django.test import Client
+
+    local = threading.local()
+
+    def client():
+        if not hasattr(local, "client"):
+            local.client = Client(
+                HTTP_HOST=HEADERS["Host"],
+                HTTP_X_FORWARDED_PROTO=HEADERS["X-Forwarded-Proto"],
+                HTTP_ACCEPT_ENCODING=HEADERS["Accept-Encoding"],
+            )
+        return local.client
+
+    def sender(path):
+        def send():
+            r = client().get(path)
+            body = b"".join(r.streaming_content) if r.streaming else r.content
+            return r.status_code, len(body)
+
+        return send
+
+    results = {}
+    # The views log per request; keep that out of the measurements' way
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for name, path in json.loads(args.endpoints).items():
+            with RSSSampler() as rss:
+                summary = run_load(sender(path), args.requests, args.concurrency)
+            summary["peak_rss_mb"] = round(rss.peak / 2**20, 1)
+            results[name] = summary
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
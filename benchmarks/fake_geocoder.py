@@ -0,0 +1,116 @@
+"""
+Local stand-in for Nominatim's /search, for /api/geocode/remote.
+
+Any query gets one deterministic hit inside Florida (derived from a hash of
+q) in Nominatim's jsonv2 shape; queries containing "nowhere" get []. Counts
+every request it serves, so tests can check how many lookups actually went
+upstream. Point the app at it with GEOCODE_UPSTREAM_URL=<url>.
+
+Standalone:
+    python -m benchmarks.fake_geocoder --latency 0.3
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def fake_hits(q):
+    if "nowhere" in q.lower():
+        return []
+    h = int(hashlib.sha1(q.lower().encode("utf-8")).hexdigest()[:8], 16)
+    lat = 25.5 + (h % 5000) / 1000          # 25.5 .. 30.5
+    lon = -87.0 + (h // 5000 % 6500) / 1000  # -87.0 .. -80.5
+    return [{
+        "lat": f"{lat:.6f}",
+        "lon": f"{lon:.6f}",
+        "display_name": f"{q}, Florida, United States",
+        "addresstype": "city",
+        "boundingbox": [f"{lat - 0.05:.6f}", f"{lat + 0.05:.6f}", f"{lon - 0.05:.6f}", f"{lon + 0.05:.6f}"],
+    }]
+
+
+class FakeGeocoder:
+    def __init__(self, latency=0.0, failure_rate=0.0, host="127.0.0.1", port=0, seed=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.hits = 0
+        self.failures = 0
+        self.queries = []
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/search"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                q = parse_qs(urlparse(self.path).query).get("q", [""])[0]
+                with fake._lock:
+                    fake.hits += 1
+                    fake.queries.append(q)
+                    fail = fake._rng.random() < fake.failure_rate
+                    fake.failures += fail
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if fail:
+                    self.send_error(503, "Injected failure")
+                    return
+                body = json.dumps(fake_hits(q)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered 503")
+    args = parser.parse_args()
+
+    fake = FakeGeocoder(args.latency, args.failure_rate, port=args.port).start()
+    print(f"Serving {fake.url} (latency={args.latency}s, failure_rate={args.failure_rate})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Local stand-in for https://www.nhc.noaa.gov/CurrentStorms.json
+
+Serves a fixed payload with configurable latency and failure rate, so the
+NHC-facing endpoints can be benchmarked (and broken on purpose) offline.
+Point the app at it with NHC_CURRENT_STORMS_URL=<url>.
+
+Standalone:
+    python -m benchmarks.fake_nhc --data-dir tracker/static/tracker/data --latency 0.2 --failure-rate 0.1
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .synth import fake_current_storms
+
+
+class FakeNHC:
+    def __init__(self, payload, latency=0.0, failure_rate=0.0, host="127.0.0.1", port=0, seed=0):
+        self.body = json.dumps(payload).encode("utf-8")
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.hits = 0
+        self.failures = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/CurrentStorms.json"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with fake._lock:
+                    fake.hits += 1
+                    fail = fake._rng.random() < fake.failure_rate
+                    fake.failures += fail
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if fail:
+                    self.send_error(503, "Injected failure")
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(fake.body)))
+                self.end_headers()
+                self.wfile.write(fake.body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--data-dir", help="Build the feed from this dir's storm_names.json")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered 503")
+    args = parser.parse_args()
+
+    storms = []
+    if args.data_dir:
+        with open(f"{args.data_dir}/storm_names.json", encoding="utf-8") as f:
+            storms = [(sid, name, "001") for sid, name in json.load(f).items()]
+
+    fake = FakeNHC(fake_current_storms(storms), args.latency, args.failure_rate, port=args.port).start()
+    print(f"Serving {fake.url} (latency={args.latency}s, failure_rate={args.failure_rate})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
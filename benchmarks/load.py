@@ -0,0 +1,112 @@
+"""
+Load generation and measurement shared by the test-client and gunicorn runs.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# The app redirects plain HTTP when DEBUG is off; say we're behind Render's TLS proxy
+HEADERS = {"Host": "localhost", "X-Forwarded-Proto": "https", "Accept-Encoding": "gzip, br"}
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    i = min(len(sorted_values) - 1, max(0, round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[i]
+
+
+def rss_bytes(pid):
+    """Resident set size of one process (Linux /proc), or 0 if unavailable."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def process_tree(pid):
+    """pid plus its direct children (gunicorn master + workers)."""
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids += [int(p) for p in f.read().split()]
+    except OSError:
+        pass
+    return pids
+
+
+class RSSSampler:
+    """Samples the summed RSS of `pid`'s process tree in the background; .peak is the max seen."""
+
+    def __init__(self, pid=None, interval=0.02):
+        self.pid = pid or os.getpid()
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        self.peak = max(self.peak, sum(rss_bytes(p) for p in process_tree(self.pid)))
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def run_load(send, requests, concurrency, warmup=3):
+    """
+    Call send() `requests` times from `concurrency` threads. send() returns
+    (status_code, body_bytes). Returns a summary dict.
+    """
+    for _ in range(warmup):
+        send()
+
+    latencies, statuses, sizes = [], [], []
+    lock = threading.Lock()
+
+    def one(_):
+        t0 = time.perf_counter()
+        try:
+            status, nbytes = send()
+        except Exception:
+            status, nbytes = None, 0
+        dt = time.perf_counter() - t0
+        with lock:
+            latencies.append(dt)
+            statuses.append(status)
+            sizes.append(nbytes)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ms = lambda v: None if v is None else round(v * 1000, 2)  # noqa: E731
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1] if latencies else None),
+        "throughput_rps": round(requests / elapsed, 1) if elapsed else None,
+        "errors": sum(1 for s in statuses if s is None or s >= 400),
+        "avg_bytes": round(sum(sizes) / len(sizes)) if sizes else 0,
+    }
@@ -0,0 +1,268 @@
+"""
+Endpoint load benchmarks.
+
+For each scenario (advisory files : shelter rows) this generates a synthetic
+storm data directory and shelter database, starts a fake CurrentStorms.json
+server, and measures every endpoint in ENDPOINTS through the Django test
+client and through gunicorn (same ASGI worker layout as the Procfile).
+Reports p50/p95/p99 latency, throughput and peak RSS per endpoint.
+
+    python -m benchmarks.run                         # default matrix, compare with baseline
+    python -m benchmarks.run --scenarios 10:2000,2000:200000:20 --modes client
+    python -m benchmarks.run --nhc-latency 0.5 --nhc-failure-rate 0.2 --nhc-cache-ttl 0
+    python -m benchmarks.run --save-baseline         # record benchmarks/baselines/baseline.json
+
+Generated data is kept under .cache/bench/ and reused between runs. Results
+land in .cache/bench/results/. Compared against the baseline, a p95 more
+than --threshold slower (or throughput that much lower) is flagged, and
+--fail-on-regression turns that into a non-zero exit.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+from .fake_geocoder import FakeGeocoder
+from .fake_nhc import FakeNHC
+from .load import HEADERS, RSSSampler, run_load
+from .synth import fake_current_storms, make_shelter_csv, make_storm_dir
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+WORK_DIR = BASE_DIR / ".cache" / "bench"
+BASELINE = Path(__file__).resolve().parent / "baselines" / "baseline.json"
+
+ENDPOINTS = {
+    "storms_geojson": "/api/storms.geojson",
+    "storms_geojson_latest_z5": "/api/storms.geojson?latest=1&zoom=5",
+    "storms_geojson_live": "/api/storms.geojson?kind=cone&latest=1",
+    "storms_api": "/api/storms/",
+    "shelter_list": "/api/shelters/",
+    "shelter_columnar": "/api/shelters/?format=columnar",
+    "shelter_filter": "/api/shelters/?county=Lee&surge_zone=none&surge_risk_100yr=not_affected&generator=1&min_capacity=500",
+    "nhc_current": "/api/nhc/current",
+    "geocode_remote": "/api/geocode/remote?q=Tampa",
+}
+# <advisory files>:<shelter rows>[:<requests per endpoint>]; a full /api/shelters/
+# at 200k rows takes seconds, so the big scenario sends fewer requests
+DEFAULT_SCENARIOS = "10:2000,200:20000,2000:200000:20"
+
+
+def log(msg):
+    print(msg, file=sys.stderr, flush=True)
+
+
+def manage(env, *args):
+    subprocess.run([sys.executable, "manage.py", *args], cwd=BASE_DIR, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+
+
+def storm_dir(n_files):
+    path = WORK_DIR / f"storms-{n_files}"
+    meta = path / "bench.json"
+    if not meta.exists():
+        shutil.rmtree(path, ignore_errors=True)
+        log(f"  generating {n_files} advisory files")
+        storms = make_storm_dir(path, n_files)
+        meta.write_text(json.dumps(storms))
+    return path, [tuple(s) for s in json.loads(meta.read_text())]
+
+
+def shelter_db(n_rows):
+    # Rebuilt when a migration lands, so new Shelter columns get imported values
+    schema = max(p.stem[:4] for p in (BASE_DIR / "tracker" / "migrations").glob("0*.py"))
+    db = WORK_DIR / f"shelters-{n_rows}-m{schema}.sqlite3"
+    if not db.exists():
+        csv_path = WORK_DIR / f"shelters-{n_rows}.csv"
+        log(f"  generating {n_rows} shelter rows")
+        make_shelter_csv(csv_path, n_rows)
+        env = {**os.environ, "SQLITE_PATH": str(db.with_suffix(".tmp"))}
+        manage(env, "migrate", "--noinput")
+        manage(env, "import_shelters", str(csv_path), "--batch-size", "5000")
+        db.with_suffix(".tmp").rename(db)
+        csv_path.unlink()
+    return db
+
+
+def scenario_env(data_dir, db, nhc_url, cache_ttl, geocoder_url):
+    cache_dir = WORK_DIR / "cache"
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    return {
+        **os.environ,
+        "STORM_DATA_DIR": str(data_dir),
+        "SQLITE_PATH": str(db),
+        "CACHE_DIR": str(cache_dir),
+        "NHC_CURRENT_STORMS_URL": nhc_url,
+        "GEOCODE_UPSTREAM_URL": geocoder_url,
+        "NHC_CACHE_TTL": str(cache_ttl),
+        "DJANGO_DEBUG": "False",
+        "PYTHONWARNINGS": "ignore:No directory at",
+    }
+
+
+def run_client(env, args, n_requests):
+    out = WORK_DIR / "client-result.json"
+    subprocess.run(
+        [sys.executable, "-m", "benchmarks.client_runner", "--endpoints", json.dumps(ENDPOINTS),
+         "--requests", str(n_requests), "--concurrency", str(args.concurrency), "--out", str(out)],
+        cwd=BASE_DIR, env=env, check=True,
+    )
+    return json.loads(out.read_text())
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run_gunicorn(env, args, n_requests):
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "hurricane_project.asgi:application",
+         "-k", "uvicorn_worker.UvicornWorker", "--workers", str(args.workers),
+         "--bind", f"127.0.0.1:{port}", "--timeout", "120", "--log-level", "warning"],
+        cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(100):
+            try:
+                requests.get(f"{base}/api/nhc/current", headers=HEADERS, timeout=2)
+                break
+            except requests.ConnectionError:
+                time.sleep(0.1)
+        else:
+            raise RuntimeError("gunicorn did not come up")
+
+        local = threading.local()
+
+        def sender(path):
+            def send():
+                if not hasattr(local, "session"):
+                    local.session = requests.Session()
+                r = local.session.get(base + path, headers=HEADERS, timeout=60, stream=True)
+                return r.status_code, len(r.raw.read(decode_content=False))  # bytes on the wire
+            return send
+
+        results = {}
+        for name, path in ENDPOINTS.items():
+            with RSSSampler(proc.pid) as rss:
+                summary = run_load(sender(path), n_requests, args.concurrency)
+            summary["peak_rss_mb"] = round(rss.peak / 2**20, 1)
+            results[name] = summary
+        return results
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def print_table(results):
+    cols = ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "errors", "avg_bytes", "peak_rss_mb")
+    print(f"{'scenario':<14} {'mode':<9} {'endpoint':<26}" + "".join(f"{c:>15}" for c in cols))
+    for key, r in results.items():
+        scenario, mode, endpoint = key.split("|")
+        print(f"{scenario:<14} {mode:<9} {endpoint:<26}" + "".join(f"{str(r[c]):>15}" for c in cols))
+
+
+def compare(results, baseline, threshold):
+    """Return a list of regression messages vs. the baseline."""
+    regressions = []
+    for key, r in results.items():
+        b = baseline.get(key)
+        if not b:
+            continue
+        if b["p95_ms"] and r["p95_ms"] and r["p95_ms"] > b["p95_ms"] * (1 + threshold):
+            regressions.append(f"{key}: p95 {b['p95_ms']} -> {r['p95_ms']} ms")
+        if b["throughput_rps"] and r["throughput_rps"] and r["throughput_rps"] < b["throughput_rps"] * (1 - threshold):
+            regressions.append(f"{key}: throughput {b['throughput_rps']} -> {r['throughput_rps']} rps")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Endpoint load benchmarks")
+    parser.add_argument("--scenarios", default=DEFAULT_SCENARIOS,
+                        help="Comma-separated <advisory files>:<shelter rows>[:<requests>]")
+    parser.add_argument("--modes", default="client,gunicorn")
+    parser.add_argument("--requests", type=int, default=200, help="Default requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--nhc-latency", type=float, default=0.05, help="Fake NHC response delay (s)")
+    parser.add_argument("--nhc-failure-rate", type=float, default=0.0)
+    parser.add_argument("--nhc-cache-ttl", type=int, default=120)
+    parser.add_argument("--geocoder-latency", type=float, default=0.2, help="Fake geocoder response delay (s)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    WORK_DIR.mkdir(parents=True, exist_ok=True)
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    results = {}
+
+    for scenario in args.scenarios.split(","):
+        n_files, n_rows, *rest = (int(v) for v in scenario.split(":"))
+        n_requests = rest[0] if rest else args.requests
+        scenario = f"{n_files}:{n_rows}"
+        log(f"scenario {scenario} ({n_requests} requests per endpoint)")
+        data_dir, storms = storm_dir(n_files)
+        db = shelter_db(n_rows)
+
+        with FakeNHC(fake_current_storms(storms), args.nhc_latency, args.nhc_failure_rate) as nhc, \
+                FakeGeocoder(args.geocoder_latency) as geocoder:
+            env = scenario_env(data_dir, db, nhc.url, args.nhc_cache_ttl, geocoder.url)
+            manage(env, "migrate", "--noinput")  # databases generated by older trees
+            manage(env, "build_storm_snapshot")
+            for mode in modes:
+                log(f"  {mode}")
+                env = scenario_env(data_dir, db, nhc.url, args.nhc_cache_ttl, geocoder.url)
+                run = run_client if mode == "client" else run_gunicorn
+                for endpoint, summary in run(env, args, n_requests).items():
+                    results[f"{scenario}|{mode}|{endpoint}"] = summary
+            log(f"  fake NHC: {nhc.hits} hits, {nhc.failures} injected failures")
+            log(f"  fake geocoder: {geocoder.hits} hits")
+
+    print_table(results)
+
+    record = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "cpus": os.cpu_count()},
+        "args": {k: str(v) for k, v in vars(args).items()},
+        "results": results,
+    }
+    out_dir = WORK_DIR / "results"
+    out_dir.mkdir(exist_ok=True)
+    (out_dir / f"{time.strftime('%Y%m%d-%H%M%S')}.json").write_text(json.dumps(record, indent=2))
+
+    if args.save_baseline:
+        # Merge, so a baseline can be refreshed one scenario at a time
+        if args.baseline.exists():
+            record["results"] = {**json.loads(args.baseline.read_text())["results"], **results}
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(record, indent=2) + "\n")
+        log(f"baseline saved to {args.baseline}")
+        return 0
+
+    if args.baseline.exists():
+        regressions = compare(results, json.loads(args.baseline.read_text())["results"], args.threshold)
+        for msg in regressions:
+            print(f"REGRESSION {msg}")
+        if not regressions:
+            print(f"No regressions beyond {args.threshold:.0%} vs {args.baseline.name}")
+        if regressions and args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
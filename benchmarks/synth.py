@@ -0,0 +1,125 @@
+"""
+Synthetic inputs for the benchmarks.
+
+make_storm_dir() writes a data directory shaped like download_storms.py
+output ({storm}_{cone|track}_{adv}.geojson + storm_names.json) with cones of
+roughly real NHC vertex counts. make_shelter_csv() writes a CSV with the
+risk_shelters.csv header; every column is sampled from the real file, then
+names, keys and coordinates are made unique.
+"""
+import csv
+import json
+import math
+import random
+from pathlib import Path
+
+import shapely
+from shapely.geometry import LineString, Point, mapping
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+SHELTER_CSV = BASE_DIR / "risk_shelters.csv"
+
+ADVISORIES_PER_STORM = 20  # a cone and a track per advisory
+BASINS = {"al": ((12, 28), (-80, -40)), "ep": ((10, 22), (-125, -95)), "cp": ((10, 22), (-165, -140))}
+NAMES = ["Ana", "Bill", "Claudette", "Danny", "Elsa", "Fred", "Grace", "Henri", "Ida", "Julian",
+         "Kate", "Larry", "Mindy", "Nicholas", "Odette", "Peter", "Rose", "Sam", "Teresa", "Victor"]
+STORM_TYPES = ["TD", "TS", "HU", "MH"]
+FL_LAT = (24.6, 30.9)
+FL_LON = (-87.5, -80.1)
+
+
+def _track(rng, lat0, lon0, heading, hours=(0, 12, 24, 36, 48, 72, 96, 120)):
+    speed = rng.uniform(0.08, 0.2)  # degrees per hour
+    pts = []
+    for h in hours:
+        turn = heading + h * rng.uniform(0, 0.004)
+        pts.append((lon0 + math.cos(turn) * speed * h, lat0 + math.sin(turn) * speed * h))
+    return pts
+
+
+def _cone(track):
+    # Growing error circles, hulled: ~1,000 vertices like a real 5-day cone
+    circles = [Point(p).buffer(0.3 + 0.25 * i, quad_segs=128) for i, p in enumerate(track)]
+    return shapely.union_all(circles).convex_hull.segmentize(0.01)
+
+
+def _write(path, name, props, geom):
+    fc = {"type": "FeatureCollection", "name": name,
+          "features": [{"type": "Feature", "properties": props, "geometry": mapping(geom)}]}
+    path.write_text(json.dumps(fc, separators=(",", ":")), encoding="utf-8")
+
+
+def make_storm_dir(path, n_files, seed=0, year=2025):
+    """
+    Write about n_files advisory files into `path`.
+    Returns [(storm_id, name, latest_advisory), ...] for the fake NHC feed.
+    """
+    rng = random.Random(seed)
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+    storms, names = [], {}
+    remaining = max(n_files // 2, 1)
+    n = 0
+    while remaining > 0:
+        n += 1
+        basin = list(BASINS)[n % len(BASINS)]
+        sid = f"{basin}{n % 100:02d}{year - n // 100}"
+        name = NAMES[n % len(NAMES)]
+        (lat_lo, lat_hi), (lon_lo, lon_hi) = BASINS[basin]
+        lat, lon = rng.uniform(lat_lo, lat_hi), rng.uniform(lon_lo, lon_hi)
+        heading = math.radians(rng.uniform(100, 160))
+
+        count = min(ADVISORIES_PER_STORM, remaining)
+        for adv in range(1, count + 1):
+            track = _track(rng, lat + adv * 0.3, lon - adv * 0.4, heading)
+            props = {
+                "STORMNAME": name, "STORMTYPE": rng.choice(STORM_TYPES),
+                "ADVDATE": f"500 PM AST Tue Aug {1 + adv % 28} {year}", "ADVISNUM": str(adv),
+                "STORMNUM": float(n % 100), "FCSTPRD": 120.0, "BASIN": basin.upper(),
+            }
+            stem = f"{sid}_{{kind}}_{adv:03d}"
+            _write(path / f"{stem.format(kind='cone')}.geojson", stem.format(kind="cone"), props, _cone(track))
+            _write(path / f"{stem.format(kind='track')}.geojson", stem.format(kind="track"), props, LineString(track))
+        storms.append((sid, name, f"{count:03d}"))
+        names[sid] = name
+        remaining -= count
+
+    (path / "storm_names.json").write_text(json.dumps(names, indent=2), encoding="utf-8")
+    return storms
+
+
+def make_shelter_csv(path, n_rows, seed=0):
+    """Write a risk_shelters.csv-shaped file with n_rows Florida shelters."""
+    rng = random.Random(seed)
+    with open(SHELTER_CSV, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        header = reader.fieldnames
+        columns = {k: [] for k in header}
+        for row in reader:
+            for k in header:
+                columns[k].append(row[k])
+
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=header)
+        writer.writeheader()
+        for i in range(n_rows):
+            row = {k: rng.choice(values) for k, values in columns.items()}
+            lat, lon = rng.uniform(*FL_LAT), rng.uniform(*FL_LON)
+            row.update({
+                "Name": f"Shelter {i}", "Address": f"{i} Synthetic Way",
+                "Asset ID": f"SYN{i:07d}", "Building": "Main",
+                "X": f"{lon:.6f}", "Y": f"{lat:.6f}",
+                "EHPA_Capac": str(rng.randint(50, 2000)),
+            })
+            writer.writerow(row)
+
+
+def fake_current_storms(storms, zip_base="http://127.0.0.1/none"):
+    """CurrentStorms.json payload for storms returned by make_storm_dir()."""
+    kinds = ["Hurricane", "Tropical Storm", "Tropical Depression", "Post-Tropical Cyclone"]
+    return {"activeStorms": [
+        {"id": sid, "name": name, "stormType": kinds[i % len(kinds)],
+         "forecastTrack": {"advNum": adv, "zipFile": f"{zip_base}/{sid}_5day_{adv}.zip"}}
+        for i, (sid, name, adv) in enumerate(storms)
+    ]}
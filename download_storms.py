@@ -1,127 +1,375 @@
+import contextlib
+import io
+import logging
+import math
 import os
 import requests
 import zipfile
-import shutil
-import geopandas as gpd
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+import pyogrio
+import shapely
+from requests.adapters import HTTPAdapter
+from shapely.geometry import mapping
 
+from tracker import archive
+from tracker.advisories import build_snapshot, current_snapshot, snapshot_dir
+
+logger = logging.getLogger("download_storms")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 NHC_API = "https://www.nhc.noaa.gov/CurrentStorms.json"
-DATA_DIR = "tracker/static/tracker/data"
-TMP_DIR = "tmp_download"
+DATA_DIR = os.environ.get("STORM_DATA_DIR", os.path.join(BASE_DIR, "tracker", "static", "tracker", "data"))
 STORM_NAME_FILE = os.path.join(DATA_DIR, "storm_names.json")
+# Conditional-GET validators (ETag / Last-Modified) per storm and for the feed.
+# Kept with the files they describe, so a new or wiped DATA_DIR starts over
+# with unconditional requests instead of 304s for files it doesn't have.
+STATE_FILE = os.path.join(snapshot_dir(DATA_DIR), "ingest_state.json")
+# The app's database, which holds the advisory archive (tracker/archive.py)
+DB_PATH = os.environ.get("SQLITE_PATH", os.path.join(BASE_DIR, "db.sqlite3"))
+
+MAX_WORKERS = 4
+TIMEOUT = (5, 60)  # connect, read
 
 os.makedirs(DATA_DIR, exist_ok=True)
-os.makedirs(TMP_DIR, exist_ok=True)
-
-def extract_related_files(z, base_name, dest_dir):
-    extracted = []
-    for ext in [".shp", ".shx", ".dbf", ".prj"]:
-        filename = f"{base_name}{ext}"
-        if filename in z.namelist():
-            extracted_path = z.extract(filename, dest_dir)
-            extracted.append(extracted_path)
-        else:
-            print(f"⚠️ Missing {filename}")
-    return extracted
-
-def download_and_convert_zip(storm_id, advisory, url):
-    zip_path = os.path.join(TMP_DIR, f"{storm_id}_{advisory}.zip")
 
+
+class DeadlineExceeded(Exception):
+    """The run's time budget ran out before this step could start."""
+
+
+def request_timeout(deadline=None):
+    """(connect, read) timeout for one request, capped by the run's deadline."""
+    if deadline is None:
+        return TIMEOUT
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded()
+    return (min(TIMEOUT[0], remaining), min(TIMEOUT[1], remaining))
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """One pooled HTTP session shared by every download in this process."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=2, pool_maxsize=MAX_WORKERS)
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                _session = s
+    return _session
+
+
+def load_state():
     try:
-        print(f"🔽 Downloading ZIP from: {url}")
-        with requests.get(url, stream=True) as r:
-            r.raise_for_status()
-            with open(zip_path, "wb") as f:
-                for chunk in r.iter_content(chunk_size=8192):
-                    f.write(chunk)
-    except Exception as e:
-        print(f"❌ Error downloading {url}: {e}")
+        with open(STATE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state):
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    tmp = f"{STATE_FILE}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, STATE_FILE)
+
+
+def conditional_headers(validators):
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+
+def response_validators(r, url):
+    return {
+        "url": url,
+        "etag": r.headers.get("ETag"),
+        "last_modified": r.headers.get("Last-Modified"),
+    }
+
+
+# Shapefile suffix inside the NHC ZIP -> kind in {storm}_{kind}_{adv}.geojson
+LAYER_KINDS = {
+    "_5day_pgn": "cone",
+    "_5day_lin": "track",
+    "_5day_pts": "points",
+}
+
+
+def output_paths(storm_id, advisory):
+    return {
+        kind: os.path.join(DATA_DIR, f"{storm_id}_{kind}_{advisory}.geojson")
+        for kind in LAYER_KINDS.values()
+    }
+
+
+def _json_value(v):
+    if hasattr(v, "item"):
+        v = v.item()  # numpy scalar -> python
+    if isinstance(v, float) and math.isnan(v):
+        return None
+    return v
+
+
+def layer_to_geojson(zip_bytes, layer, name):
+    """
+    Read one shapefile layer straight out of the ZIP bytes (GDAL /vsizip/
+    over /vsimem/, no extraction) and return compact GeoJSON bytes.
+    NHC layers are geographic, so coordinates are written as-is.
+    """
+    meta, _, geometry, field_data = pyogrio.raw.read(io.BytesIO(zip_bytes), layer=layer)
+    columns = list(meta["fields"])
+    features = []
+    for i, wkb in enumerate(geometry):
+        geom = shapely.from_wkb(wkb) if wkb is not None else None
+        features.append({
+            "type": "Feature",
+            "properties": {col: _json_value(field_data[j][i]) for j, col in enumerate(columns)},
+            "geometry": mapping(geom) if geom is not None and not geom.is_empty else None,
+        })
+    fc = {"type": "FeatureCollection", "name": name, "features": features}
+    return json.dumps(fc, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def write_atomic(path, body):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(body)
+    os.replace(tmp, path)
+
+
+@contextlib.contextmanager
+def archive_db():
+    """sqlite3 connection to the advisory archive, or None if it hasn't been migrated in."""
+    if not os.path.exists(DB_PATH):
+        yield None
         return
+    with contextlib.closing(archive.connect(DB_PATH)) as conn:
+        yield conn if archive.available(conn) else None
+
 
+def archive_layer(storm_id, kind, advisory, body):
+    """Keep a copy of a converted layer in the archive; failures are logged, not fatal."""
     try:
-        with zipfile.ZipFile(zip_path, "r") as z:
-            cone_base = None
-            track_base = None
-
-            print(f"📦 Contents of ZIP for {storm_id}:")
-            for name in z.namelist():
-                print(" -", name)
-                if name.endswith("_5day_pgn.shp"):
-                    cone_base = name.replace(".shp", "")
-                    print(f"✅ Found cone shapefile: {name}")
-                elif name.endswith("_5day_lin.shp"):
-                    track_base = name.replace(".shp", "")
-                    print(f"✅ Found track shapefile: {name}")
-
-            if cone_base:
-                extract_related_files(z, cone_base, TMP_DIR)
-                gdf_cone = gpd.read_file(os.path.join(TMP_DIR, f"{cone_base}.shp"))
-                cone_out = os.path.join(DATA_DIR, f"{storm_id}_cone_{advisory}.geojson")
-                gdf_cone.to_file(cone_out, driver="GeoJSON")
-                print(f"✅ Saved cone GeoJSON: {cone_out}")
-
-            if track_base:
-                extract_related_files(z, track_base, TMP_DIR)
-                gdf_track = gpd.read_file(os.path.join(TMP_DIR, f"{track_base}.shp"))
-                track_out = os.path.join(DATA_DIR, f"{storm_id}_track_{advisory}.geojson")
-                gdf_track.to_file(track_out, driver="GeoJSON")
-                print(f"✅ Saved track GeoJSON: {track_out}")
-
-            if not cone_base and not track_base:
-                print(f"⚠️ No relevant shapefiles found in {storm_id} ZIP")
+        with archive_db() as conn:
+            if conn is not None:
+                status = archive.store(conn, storm_id, kind, advisory, body)
+                logger.info("%s %s %s: %s in archive", storm_id, kind, advisory, status)
+    except Exception as e:
+        logger.warning("Could not archive %s %s %s: %s", storm_id, kind, advisory, e)
+
 
+def download_and_convert_zip(storm_id, advisory, url, validators=None, deadline=None):
+    """
+    Returns (status, validators) where status is "converted",
+    "not_modified" or "failed".
+    """
+    validators = validators if (validators or {}).get("url") == url else {}
+
+    try:
+        logger.info("Downloading ZIP from %s", url)
+        r = get_session().get(url, timeout=request_timeout(deadline), headers=conditional_headers(validators))
+        if r.status_code == 304:
+            if all(os.path.exists(p) for p in output_paths(storm_id, advisory).values()):
+                logger.info("%s ZIP not modified since last run", storm_id)
+                return "not_modified", validators
+            # Our validators are for files that are gone: fetch it again
+            logger.info("%s ZIP not modified, but advisory %s isn't on disk; downloading it again",
+                        storm_id, advisory)
+            r = get_session().get(url, timeout=request_timeout(deadline))
+        r.raise_for_status()
+        zip_bytes = r.content
+        validators = response_validators(r, url)
     except Exception as e:
-        print(f"❌ Error extracting ZIP: {e}")
+        logger.error("Error downloading %s: %s", url, e)
+        return "failed", validators
 
-def main():
-    print("🌐 Fetching active storms...")
     try:
-        response = requests.get(NHC_API)
+        with zipfile.ZipFile(io.BytesIO(zip_bytes)) as z:
+            names = z.namelist()
+        logger.debug("%s ZIP: %d members", storm_id, len(names))
+
+        outputs = output_paths(storm_id, advisory)
+        found = False
+        for name in names:
+            if not name.endswith(".shp"):
+                continue
+            layer = os.path.basename(name)[:-4]
+            kind = next((k for suffix, k in LAYER_KINDS.items() if layer.endswith(suffix)), None)
+            if kind is None:
+                continue
+            found = True
+            out = outputs[kind]
+            body = layer_to_geojson(zip_bytes, layer, os.path.basename(out)[:-8])
+            write_atomic(out, body)
+            logger.info("Saved %s GeoJSON: %s", kind, out)
+            archive_layer(storm_id, kind, advisory, body)
+
+        if not found:
+            logger.warning("No relevant shapefiles found in %s ZIP", storm_id)
+
+    except Exception as e:
+        logger.error("Error converting %s ZIP: %s", storm_id, e)
+        return "failed", {}
+
+    return "converted", validators
+
+
+def run_once(deadline=None):
+    """
+    One ingest pass. `deadline` is a time.monotonic() value; requests are
+    capped to it and downloads still pending when it passes are abandoned.
+    Returns a dict of counts and timings (ms) for the caller to log.
+    """
+    started = time.perf_counter()
+    stats = {"status": "unchanged", "storms": 0, "converted": 0, "not_modified": 0,
+             "skipped": 0, "failed": 0, "removed": 0}
+    state = load_state()
+    session = get_session()
+
+    logger.info("Fetching active storms")
+    try:
+        feed = state.get("_feed", {})
+        response = session.get(NHC_API, timeout=request_timeout(deadline), headers=conditional_headers(feed))
+        stats["feed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        if response.status_code == 304:
+            logger.info("CurrentStorms.json not modified; nothing to do")
+            stats["status"] = "not_modified"
+            return stats
         response.raise_for_status()
         storm_data = response.json().get("activeStorms", [])
+        feed = response_validators(response, NHC_API)
     except Exception as e:
-        print(f"❌ Failed to fetch storm data: {e}")
-        return
+        logger.error("Failed to fetch storm data: %s", e)
+        stats["status"] = "failed"
+        stats["feed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return stats
 
     if not storm_data:
-        print("🌀 No active storms found.")
-        return
+        logger.info("No active storms found")
+        stats["status"] = "no_storms"
+        return stats
 
     storm_names = {}
     active_ids = []
+    jobs = {}
+    changed = False
+    all_ok = True
+    stats["storms"] = len(storm_data)
+
+    downloads_started = time.perf_counter()
+    pool = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+    try:
+        for storm in storm_data:
+            storm_id = storm.get("id")
+            storm_name = storm.get("name", storm_id)
+            advisory = storm.get("forecastTrack", {}).get("advNum")
+            zip_url = storm.get("forecastTrack", {}).get("zipFile")
+
+            if storm_id:
+                active_ids.append(storm_id)
+
+            if storm_id and advisory and zip_url:
+                storm_names[storm_id] = storm_name
+                if all(os.path.exists(p) for p in output_paths(storm_id, advisory).values()):
+                    logger.info("%s (%s) advisory %s already converted", storm_id, storm_name, advisory)
+                    stats["skipped"] += 1
+                    continue
+                logger.info("Processing %s (%s) advisory %s", storm_id, storm_name, advisory)
+                fut = pool.submit(download_and_convert_zip, storm_id, advisory, zip_url,
+                                  state.get(storm_id), deadline)
+                jobs[fut] = storm_id
+            else:
+                logger.warning("Incomplete data for %s", storm_name)
+
+        wait = None if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            for fut in as_completed(jobs, timeout=wait):
+                storm_id = jobs.pop(fut)
+                status, validators = fut.result()
+                if validators:
+                    state[storm_id] = validators
+                stats[status] += 1
+                changed |= status == "converted"
+                all_ok &= status != "failed"
+        except FuturesTimeout:
+            logger.warning("Run deadline passed; abandoning %d download(s): %s", len(jobs), ", ".join(jobs.values()))
+            stats["failed"] += len(jobs)
+            all_ok = False
+    finally:
+        # Don't block on abandoned downloads; their writes are atomic renames
+        pool.shutdown(wait=deadline is None, cancel_futures=True)
+    stats["download_ms"] = round((time.perf_counter() - downloads_started) * 1000, 1)
+
+    # Save storm ID → name mapping (only when it changed, so its mtime means something)
+    try:
+        with open(STORM_NAME_FILE, "r", encoding="utf-8") as f:
+            names_changed = json.load(f) != storm_names
+    except (OSError, ValueError):
+        names_changed = True
+    if names_changed:
+        with open(STORM_NAME_FILE, "w") as f:
+            json.dump(storm_names, f, indent=2)
+            logger.info("Saved storm names to %s", STORM_NAME_FILE)
+        changed = True
+
+    # Inactive storms leave the data directory; the archive keeps their history
+    with archive_db() as db:
+        for filename in os.listdir(DATA_DIR):
+            if filename.endswith(".geojson"):
+                parts = filename.split("_")
+                if len(parts) == 3:
+                    storm_id = parts[0]
+                    if storm_id not in active_ids:
+                        file_path = os.path.join(DATA_DIR, filename)
+                        if db is not None:
+                            try:
+                                archive.store_file(db, file_path)
+                            except Exception as e:
+                                logger.warning("Keeping %s: could not archive it (%s)", filename, e)
+                                continue
+                        os.remove(file_path)
+                        logger.info("Removed outdated file: %s", filename)
+                        stats["removed"] += 1
+                        changed = True
+
+    for storm_id in [k for k in state if not k.startswith("_") and k not in active_ids]:
+        del state[storm_id]
+    # Only trust the feed's validators once every storm in it was handled
+    if all_ok:
+        state["_feed"] = feed
+    save_state(state)
+
+    if changed or current_snapshot(DATA_DIR, "storms") is None:
+        # Prebuild the enriched FeatureCollection served by /api/storms.geojson
+        snapshot_started = time.perf_counter()
+        digest, feature_count = build_snapshot(DATA_DIR, storm_data)
+        stats["snapshot_ms"] = round((time.perf_counter() - snapshot_started) * 1000, 1)
+        logger.info("Storm snapshot %s (%d features)", digest[:12], feature_count)
+
+    if not all_ok:
+        stats["status"] = "failed"
+    elif changed:
+        stats["status"] = "updated"
+    return stats
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="[%(name)s] %(levelname)s %(message)s")
+    run_once()
 
-    for storm in storm_data:
-        storm_id = storm.get("id")
-        storm_name = storm.get("name", storm_id)
-        advisory = storm.get("forecastTrack", {}).get("advNum")
-        zip_url = storm.get("forecastTrack", {}).get("zipFile")
-
-        if storm_id:
-            active_ids.append(storm_id)
-
-        if storm_id and advisory and zip_url:
-            print(f"\n🌀 Processing {storm_id} ({storm_name}) - Advisory {advisory}...")
-            storm_names[storm_id] = storm_name
-            download_and_convert_zip(storm_id, advisory, zip_url)
-        else:
-            print(f"⚠️ Incomplete data for {storm_name}")
-
-    # Save storm ID → name mapping
-    with open(STORM_NAME_FILE, "w") as f:
-        json.dump(storm_names, f, indent=2)
-        print(f"\n✅ Saved storm names to {STORM_NAME_FILE}")
-    
-    for filename in os.listdir(DATA_DIR):
-        if filename.endswith(".geojson"):
-            parts = filename.split("_")
-            if len(parts) == 3:
-                storm_id = parts[0]
-                if storm_id not in active_ids:
-                    file_path = os.path.join(DATA_DIR, filename)
-                    os.remove(file_path)
-                    print(f"🗑️ Removed outdated file: {filename}")
-
-    shutil.rmtree(TMP_DIR, ignore_errors=True)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
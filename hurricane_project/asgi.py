@@ -13,4 +13,35 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hurricane_project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+
+async def lifespan(receive, send):
+    """
+    Django only speaks http; answer the server's lifespan events here to
+    start per-worker background work (the in-process ingest scheduler, if
+    settings.INGEST_IN_PROCESS) and to close per-worker resources (the
+    pooled upstream HTTP clients) on shutdown instead of leaving them to
+    the garbage collector.
+    """
+    from django.conf import settings
+    from tracker import http, ingest
+
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            if settings.INGEST_IN_PROCESS:
+                ingest.start_in_process()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            ingest.stop_in_process()
+            await http.aclose_clients()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+    else:
+        await django_application(scope, receive, send)
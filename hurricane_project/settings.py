@@ -53,6 +53,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",  # must be right after SecurityMiddleware
+    "tracker.metrics.MetricsMiddleware",  # per-view latency/size, see /metrics
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -85,10 +86,69 @@ WSGI_APPLICATION = "hurricane_project.wsgi.application"
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "NAME": Path(os.environ.get("SQLITE_PATH", BASE_DIR / "db.sqlite3")),
     }
 }
 
+# --- Cache (file-based so every gunicorn worker shares it) ---
+CACHE_DIR = Path(os.environ.get("CACHE_DIR", BASE_DIR / ".cache"))
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": CACHE_DIR / "django",
+    }
+}
+
+# Rendered /tiles/... vector tiles (see tracker/tiles.py)
+TILE_CACHE_DIR = CACHE_DIR / "tiles"
+
+# --- Metrics (tracker/metrics.py, served on /metrics) ---
+METRICS_DIR = CACHE_DIR / "metrics"  # one file per worker process, summed on scrape
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")  # if set, scrapes need "Authorization: Bearer <token>"
+
+# --- Logging (per-request detail is at DEBUG; TRACKER_LOG_LEVEL=DEBUG to see it) ---
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {"plain": {"format": "[%(name)s] %(levelname)s %(message)s"}},
+    "handlers": {"console": {"class": "logging.StreamHandler", "formatter": "plain"}},
+    "loggers": {
+        "tracker": {"handlers": ["console"], "level": os.environ.get("TRACKER_LOG_LEVEL", "INFO"), "propagate": False},
+        "download_storms": {"handlers": ["console"], "level": os.environ.get("TRACKER_LOG_LEVEL", "INFO"), "propagate": False},
+    },
+}
+
+# --- Storm advisory GeoJSON (written by download_storms.py) ---
+STORM_DATA_DIR = Path(os.environ.get("STORM_DATA_DIR", BASE_DIR / "tracker" / "static" / "tracker" / "data"))
+STORM_FEATURE_CACHE_MB = int(os.environ.get("STORM_FEATURE_CACHE_MB", "64"))  # parsed features kept per worker
+STORM_STREAM_POLL = float(os.environ.get("STORM_STREAM_POLL", "2"))  # seconds between change-journal checks
+STORM_STREAM_HEARTBEAT = float(os.environ.get("STORM_STREAM_HEARTBEAT", "20"))  # seconds between keep-alive comments
+STORM_STREAM_RETRY_MS = int(os.environ.get("STORM_STREAM_RETRY_MS", "10000"))  # EventSource reconnect delay
+# Run the ingest schedule (tracker/ingest.py) inside the web workers, one at a time, instead of
+# a separate run_ingest_daemon; for hosts where services don't share a disk
+INGEST_IN_PROCESS = os.environ.get("INGEST_IN_PROCESS", "False").lower() == "true"
+
+# --- NHC upstream ---
+NHC_CURRENT_STORMS_URL = os.environ.get("NHC_CURRENT_STORMS_URL", "https://www.nhc.noaa.gov/CurrentStorms.json")
+NHC_TIMEOUT = float(os.environ.get("NHC_TIMEOUT", "6"))
+NHC_CACHE_TTL = int(os.environ.get("NHC_CACHE_TTL", "120"))  # seconds
+NHC_FAILURE_TTL = int(os.environ.get("NHC_FAILURE_TTL", "15"))  # seconds before retrying after a failure
+NHC_BREAKER_FAILURES = int(os.environ.get("NHC_BREAKER_FAILURES", "3"))  # failures in a row that open the circuit
+NHC_BREAKER_COOLDOWN = int(os.environ.get("NHC_BREAKER_COOLDOWN", "60"))  # seconds between probes while open
+
+# --- Remote geocoding (tracker/geocoder.py, /api/geocode/remote) ---
+GEOCODE_UPSTREAM_URL = os.environ.get("GEOCODE_UPSTREAM_URL", "https://nominatim.openstreetmap.org/search")
+GEOCODE_TIMEOUT = float(os.environ.get("GEOCODE_TIMEOUT", "5"))
+# Nominatim's usage policy wants an application-specific User-Agent with a way to reach the operator
+GEOCODE_CONTACT = os.environ.get("GEOCODE_CONTACT", "https://hurricane-tracker.onrender.com")
+GEOCODE_USER_AGENT = os.environ.get("GEOCODE_USER_AGENT", f"hurricane-tracker-geocoder/1.0 (+{GEOCODE_CONTACT})")
+GEOCODE_CACHE_TTL = int(os.environ.get("GEOCODE_CACHE_TTL", str(30 * 24 * 3600)))  # seconds
+GEOCODE_EMPTY_TTL = int(os.environ.get("GEOCODE_EMPTY_TTL", "3600"))  # seconds to remember a query with no match
+GEOCODE_RATE = float(os.environ.get("GEOCODE_RATE", "1"))  # upstream requests per second, whole box
+GEOCODE_BURST = float(os.environ.get("GEOCODE_BURST", "1"))
+GEOCODE_MAX_WAIT = float(os.environ.get("GEOCODE_MAX_WAIT", "3"))  # seconds a lookup may queue for a slot
+
 # --- Password validators ---
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
@@ -0,0 +1,732 @@
+"""
+Storm GeoJSON helpers shared by the views and by download_storms.py.
+
+Nothing in here imports Django, so the ingest script can build the same
+enriched FeatureCollection the API serves and write it out as a snapshot:
+
+    snapshot/storms-<sha256>.json      raw bytes
+    snapshot/storms-<sha256>.json.gz   gzip variant
+    snapshot/storms-<sha256>.json.br   brotli variant (if Brotli is installed)
+    snapshot/storms.current            "<sha256>" of the live generation
+    snapshot/changes.json              change journal behind /api/storms/changes
+    snapshot/advisories/<file>.<hash>.geojson[.gz|.br]
+                                       each advisory file under an immutable,
+                                       content-hashed name (publish_files)
+    snapshot/advisories.json           manifest: file name -> published name
+    snapshot/ingest_state.json         download_storms' conditional-GET validators
+"""
+from collections import OrderedDict
+from pathlib import Path
+import gzip
+import hashlib
+import json
+import math
+import os
+import re
+import secrets
+import threading
+import time
+
+import shapely
+from shapely.geometry import mapping, shape
+
+try:
+    import brotli
+except ImportError:  # optional: gzip is always written
+    brotli = None
+
+SNAPSHOT_DIRNAME = "snapshot"
+
+# Precomputed detail levels: minimum map zoom -> (simplify tolerance in
+# degrees, coordinate decimals). At FULL_DETAIL_ZOOM and above the original
+# geometry is served.
+SIMPLIFY_LEVELS = {
+    3: (0.05, 2),
+    5: (0.02, 3),
+    7: (0.005, 3),
+    9: (0.001, 4),
+}
+FULL_DETAIL_ZOOM = 10
+
+# {storm}_{kind}_{adv}.geojson, e.g. al052025_cone_006 or ep082025_track_012A
+STORM_FILE_RE = re.compile(
+    r"^(?P<storm>[a-z]{2}\d{6})_(?P<kind>[a-z]+)_(?P<advisory>\d+[a-z]?)\.geojson$", re.IGNORECASE
+)
+
+
+def load_name_lookup(data_dir):
+    """storm_names.json -> {sid: {"name": ..., "type": ...}} (lower-case ids)."""
+    storm_name_file = Path(data_dir) / "storm_names.json"
+    name_lookup = {}
+    if storm_name_file.exists():
+        try:
+            with open(storm_name_file, "r", encoding="utf-8") as fh:
+                raw = json.load(fh)
+            for sid, val in raw.items():
+                sid = sid.lower()
+                if isinstance(val, dict):
+                    name_lookup[sid] = {
+                        "name": (val.get("name") or "").strip(),
+                        "type": (val.get("type") or "").strip(),
+                    }
+                else:
+                    name_lookup[sid] = {"name": str(val).strip(), "type": ""}
+        except Exception:
+            pass
+    return name_lookup
+
+
+def merge_nhc_storms(name_lookup, storms):
+    """
+    Fold CurrentStorms.json entries into name_lookup (in place) and return
+    {sid: stormType}.
+    """
+    nhc_types = {}
+    for s in storms:
+        sid = (s.get("id") or "").lower()
+        stype = (s.get("stormType") or "").strip()  # e.g., "Tropical Storm", "Hurricane"
+        if sid:
+            nhc_types[sid] = stype
+            if sid not in name_lookup:
+                name_lookup[sid] = {"name": (s.get("name") or "").strip(), "type": stype}
+            else:
+                if stype and not name_lookup[sid].get("type"):
+                    name_lookup[sid]["type"] = stype
+    return nhc_types
+
+
+def classify_from_props(props):
+    # direct text fields
+    for k in ("status", "stormType", "type", "CLASS", "Class", "system", "SYSTEM"):
+        v = str(props.get(k, "")).strip()
+        if v:
+            return v
+
+    # code fields (TS/HU/TD etc.)
+    code = str(props.get("INTENSITY") or props.get("TCtype") or "").upper().strip()
+    cmap = {
+        "TD": "Tropical Depression",
+        "TS": "Tropical Storm",
+        "HU": "Hurricane",
+        "SS": "Subtropical Storm",
+        "SD": "Subtropical Depression",
+        "EX": "Extratropical",
+        "PT": "Post-Tropical",
+        "LO": "Low",
+        "DB": "Disturbance",
+    }
+    if code in cmap:
+        if code == "HU":
+            cat = props.get("SS") or props.get("SAFFIR_SIMPSON") or props.get("Category") or props.get("category")
+            if cat:
+                return f"Hurricane Cat {cat}"
+        return cmap[code]
+
+    # wind-based inference
+    wind_keys = ("MAX_WIND_MPH", "MAX_WIND", "Vmax", "V_MAX", "VMAX", "MAX_WIND_KTS")
+    vmax = None
+    for k in wind_keys:
+        if k in props and props[k] not in (None, "", "NA"):
+            try:
+                n = float(props[k])
+                vmax = n * 1.15078 if ("KTS" in k or (k == "Vmax" and n < 120)) else n
+            except Exception:
+                pass
+            break
+    if vmax is not None:
+        if vmax < 39:
+            return "Tropical Depression"
+        if vmax < 74:
+            return "Tropical Storm"
+        cat = 5 if vmax >= 157 else 4 if vmax >= 130 else 3 if vmax >= 111 else 2 if vmax >= 96 else 1
+        return f"Hurricane Cat {cat}"
+
+    return ""
+
+
+def enrich_feature(feat, storm_id, friendly_name, nhc_type):
+    props = feat.setdefault("properties", {})
+    # ensure stormName
+    if not props.get("stormName"):
+        props["stormName"] = props.get("name") or props.get("storm") or friendly_name
+    # status: prefer NHC type, else classify from props
+    status = nhc_type or classify_from_props(props)
+    if status:
+        props["status"] = status
+        props["title"] = f"{status} {props['stormName']}"
+    else:
+        props["title"] = props["stormName"]
+    # also expose a likely ID so client can match if needed
+    props.setdefault("stormId", storm_id)
+    return feat
+
+
+def _enrichment(storm_id, name_lookup, nhc_types):
+    """(friendly name, NHC type) that enrich_feature() stamps on a storm's features."""
+    info = name_lookup.get(storm_id, {})
+    friendly_name = info.get("name") or f"Unnamed Storm ({storm_id.upper()})"
+    return friendly_name, info.get("type") or nhc_types.get(storm_id, "")
+
+
+def read_features(path):
+    """The raw (unenriched) features of one storm GeoJSON file."""
+    gj = json.loads(Path(path).read_text(encoding="utf-8"))
+    if gj.get("type") == "FeatureCollection":
+        return gj.get("features", [])
+    if gj.get("type") == "Feature":
+        return [gj]
+    return []
+
+
+def load_features(path, name_lookup, nhc_types, timings=None):
+    """
+    Parse one storm GeoJSON file and return its enriched features.
+    If `timings` is a dict, seconds spent are added to its "parse" and
+    "enrich" entries.
+    """
+    started = time.perf_counter()
+    path = Path(path)
+    raw = read_features(path)
+    parsed = time.perf_counter()
+    storm_id = path.stem.split("_")[0].lower()  # e.g., al012025_cone_005 -> al012025
+    friendly_name, nhc_type = _enrichment(storm_id, name_lookup, nhc_types)
+    features = [enrich_feature(f, storm_id, friendly_name, nhc_type) for f in raw]
+    if timings is not None:
+        timings["parse"] = timings.get("parse", 0.0) + parsed - started
+        timings["enrich"] = timings.get("enrich", 0.0) + time.perf_counter() - parsed
+    return features
+
+
+def advisory_key(advisory):
+    """Sortable key for advisory numbers like "7", "007" or "012A"."""
+    m = re.match(r"^(\d+)([a-z]?)$", str(advisory).strip(), re.IGNORECASE)
+    if not m:
+        return (-1, "")
+    return (int(m.group(1)), m.group(2).upper())
+
+
+def index_storm_files(data_dir):
+    """
+    {(storm_id, kind, advisory): path} for every file in data_dir that follows
+    the {storm}_{kind}_{adv}.geojson scheme. Built from the directory listing
+    alone; nothing is opened.
+    """
+    index = {}
+    try:
+        entries = os.scandir(data_dir)
+    except OSError:
+        return index
+    with entries:
+        for entry in entries:
+            m = STORM_FILE_RE.match(entry.name)
+            if m and entry.is_file():
+                key = (m.group("storm").lower(), m.group("kind").lower(), m.group("advisory").upper())
+                index[key] = Path(entry.path)
+    return index
+
+
+def select_files(index, storm=None, kind=None, advisory_min=None, advisory_max=None, latest=False):
+    """
+    Filter an index_storm_files() mapping and return its paths in
+    (storm, kind, advisory) order. `latest` keeps only the highest advisory
+    per (storm, kind) after the other filters are applied.
+    """
+    lo = advisory_key(advisory_min) if advisory_min is not None else None
+    hi = advisory_key(advisory_max) if advisory_max is not None else None
+    keys = []
+    for sid, k, adv in index:
+        if storm and sid != storm:
+            continue
+        if kind and k != kind:
+            continue
+        if lo is not None and advisory_key(adv) < lo:
+            continue
+        if hi is not None and advisory_key(adv) > hi:
+            continue
+        keys.append((sid, k, adv))
+    keys.sort(key=lambda key: (key[0], key[1], advisory_key(key[2])))
+
+    if latest:
+        newest = {}
+        for key in keys:
+            newest[key[:2]] = key  # sorted ascending, so the last one wins
+        keys = sorted(newest.values())
+    return [index[key] for key in keys]
+
+
+def latest_file(index, storm_id, kind):
+    """(advisory, path) of the newest `kind` file for storm_id, or None."""
+    keys = [key for key in index if key[0] == storm_id and key[1] == kind]
+    if not keys:
+        return None
+    key = max(keys, key=lambda key: advisory_key(key[2]))
+    return key[2], index[key]
+
+
+def load_area(path):
+    """Union of every polygon in a cone file as one shapely geometry (lon/lat)."""
+    gj = json.loads(Path(path).read_text(encoding="utf-8"))
+    feats = gj.get("features", []) if gj.get("type") == "FeatureCollection" else [gj]
+    polys = [shape(f["geometry"]) for f in feats if f.get("geometry")]
+    polys = [g for g in polys if g.geom_type in ("Polygon", "MultiPolygon")]
+    return shapely.union_all(polys) if polys else shapely.Polygon()
+
+
+def buffer_km(geom, km):
+    """
+    Grow a lon/lat geometry by roughly `km` kilometres. Uses an equirectangular
+    projection around the geometry's centre latitude, which is plenty for
+    cone-sized shapes outside the polar regions.
+    """
+    if not km or geom.is_empty:
+        return geom
+    scale = math.cos(math.radians(geom.centroid.y))
+    flat = shapely.transform(geom, lambda c: c * [scale, 1.0])
+    grown = flat.buffer(km / 111.32)
+    return shapely.transform(grown, lambda c: c / [scale, 1.0])
+
+
+def build_feature_collection(paths, name_lookup, nhc_types, timings=None, cache=None):
+    """
+    Enriched FeatureCollection of every file in `paths`; unreadable files are
+    skipped. With a FeatureCache, unchanged files aren't parsed again and the
+    features are shared with the cache (don't modify them).
+    """
+    features = []
+    for p in paths:
+        try:
+            if cache is None:
+                features.extend(load_features(p, name_lookup, nhc_types, timings))
+            else:
+                features.extend(cache.features(p, name_lookup, nhc_types, timings))
+        except Exception:
+            continue
+    return {"type": "FeatureCollection", "features": features}
+
+
+class FeatureCache:
+    """
+    Parsed storm files kept in this process until they change, so a live
+    build only parses new or modified files.
+
+    An entry holds a file's raw features, checked on every lookup against
+    the file's own (st_mtime_ns, st_size, st_ino) as tiles.layer_version
+    does, plus the enriched copies for the last storm name / NHC type it was
+    asked for; when those change only the cheap enrichment is redone. The
+    inode catches download_storms.py's atomic replaces even when the new
+    file has the same size and a coarse mtime. Least recently used entries
+    go once the estimated size (PARSED_SIZE_FACTOR x bytes on disk) passes
+    max_bytes.
+    """
+
+    PARSED_SIZE_FACTOR = 5  # parsed GeoJSON measures 3-6x its file size
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # path -> _CachedFile
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def features(self, path, name_lookup, nhc_types, timings=None):
+        """
+        load_features() for `path`, served from the cache when the file is
+        unchanged. The result is shared: don't modify it.
+        """
+        path = Path(path)
+        stamp = _file_stamp(path.stat())
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                self._entries.move_to_end(path)
+        if entry is None or entry.stamp != stamp:
+            entry = self._load(path, timings)
+
+        storm_id = path.stem.split("_")[0].lower()
+        enrichment = _enrichment(storm_id, name_lookup, nhc_types)
+        enriched = entry.enriched  # read once; another thread may swap it
+        if enriched is None or enriched[0] != enrichment:
+            started = time.perf_counter()
+            # Shallow copies: geometry stays shared with the raw features
+            features = [
+                enrich_feature({**f, "properties": dict(f.get("properties") or {})}, storm_id, *enrichment)
+                for f in entry.raw
+            ]
+            enriched = entry.enriched = (enrichment, features)
+            if timings is not None:
+                timings["enrich"] = timings.get("enrich", 0.0) + time.perf_counter() - started
+        return enriched[1]
+
+    def _load(self, path, timings):
+        st = path.stat()  # before reading: a replace in between only costs a re-parse later
+        started = time.perf_counter()
+        entry = _CachedFile(_file_stamp(st), read_features(path), st.st_size * self.PARSED_SIZE_FACTOR)
+        if timings is not None:
+            timings["parse"] = timings.get("parse", 0.0) + time.perf_counter() - started
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self.size -= old.cost
+            if entry.cost <= self.max_bytes:
+                self._entries[path] = entry
+                self.size += entry.cost
+                while self.size > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.size -= evicted.cost
+        return entry
+
+
+def _file_stamp(st):
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+class _CachedFile:
+    __slots__ = ("stamp", "raw", "cost", "enriched")
+
+    def __init__(self, stamp, raw, cost):
+        self.stamp = stamp            # _file_stamp() of the file when read
+        self.raw = raw
+        self.cost = cost
+        self.enriched = None          # ((name, nhc type), features)
+
+
+# --- Simplification / quantization ---
+
+def detail_level(zoom):
+    """The SIMPLIFY_LEVELS key to use at `zoom`, or None for full detail."""
+    if zoom >= FULL_DETAIL_ZOOM:
+        return None
+    usable = [z for z in SIMPLIFY_LEVELS if z <= zoom]
+    return max(usable) if usable else min(SIMPLIFY_LEVELS)
+
+
+def decimals_for_tolerance(tolerance):
+    """Enough decimals that rounding stays well under the simplify tolerance."""
+    return max(0, min(6, math.ceil(-math.log10(tolerance)) + 1))
+
+
+def _round_coords(coords, decimals):
+    if coords and isinstance(coords[0], (int, float)):
+        return [round(c, decimals) for c in coords]
+    return [_round_coords(c, decimals) for c in coords]
+
+
+def simplify_geometry(geom, tolerance, decimals):
+    """Simplify a GeoJSON geometry dict and snap it to `decimals` places."""
+    if not geom:
+        return geom
+    g = shape(geom)
+    if g.geom_type not in ("Point", "MultiPoint"):
+        g = g.simplify(tolerance, preserve_topology=True)
+    g = shapely.set_precision(g, 10 ** -decimals)
+    if g.is_empty:
+        return None
+    out = mapping(g)
+    return {"type": out["type"], "coordinates": _round_coords(out["coordinates"], decimals)}
+
+
+def simplify_collection(fc, tolerance, decimals=None):
+    """Copy of `fc` with every geometry simplified; the input is left untouched."""
+    if decimals is None:
+        decimals = decimals_for_tolerance(tolerance)
+    features = []
+    for feat in fc["features"]:
+        try:
+            geom = simplify_geometry(feat.get("geometry"), tolerance, decimals)
+        except Exception:
+            geom = feat.get("geometry")
+        features.append({**feat, "geometry": geom})
+    return {"type": "FeatureCollection", "features": features}
+
+
+def encode_collection(fc):
+    return json.dumps(fc, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+# --- Prebuilt snapshots ---
+
+def snapshot_dir(data_dir):
+    return Path(data_dir) / SNAPSHOT_DIRNAME
+
+
+def _atomic_write(path, body):
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(body)
+    os.replace(tmp, path)
+
+
+def _write_variants(base, body):
+    """`base` plus its .gz (and, with Brotli, .br) siblings, all written atomically."""
+    _atomic_write(base, body)
+    _atomic_write(base.with_name(base.name + ".gz"), gzip.compress(body, compresslevel=9, mtime=0))
+    if brotli is not None:
+        _atomic_write(base.with_name(base.name + ".br"), brotli.compress(body, quality=11))
+
+
+def _variants(base):
+    variants = {"identity": base}
+    for encoding, suffix in (("gzip", ".gz"), ("br", ".br")):
+        p = base.with_name(base.name + suffix)
+        if p.exists():
+            variants[encoding] = p
+    return variants
+
+
+def write_snapshot(data_dir, name, body):
+    """
+    Publish `body` as the current generation of snapshot `name`.
+
+    Files are content-addressed and the pointer is swapped last, so a reader
+    never sees a body that doesn't match its hash. The previous generation is
+    kept around for readers that already resolved the old pointer.
+    """
+    out_dir = snapshot_dir(data_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256(body).hexdigest()
+    base = out_dir / f"{name}-{digest}.json"
+
+    _write_variants(base, body)
+
+    pointer = out_dir / f"{name}.current"
+    previous = pointer.read_text().strip() if pointer.exists() else None
+    _atomic_write(pointer, digest.encode("ascii"))
+
+    keep = {digest, previous}
+    generation = re.compile(rf"^{re.escape(name)}-([0-9a-f]{{64}})\.json")
+    for p in out_dir.iterdir():
+        m = generation.match(p.name)
+        if m and m.group(1) not in keep:
+            p.unlink(missing_ok=True)
+    return digest
+
+
+def current_snapshot(data_dir, name):
+    """
+    Return (digest, {"identity"|"gzip"|"br": path}) for snapshot `name`,
+    or None if it hasn't been built.
+    """
+    out_dir = snapshot_dir(data_dir)
+    try:
+        digest = (out_dir / f"{name}.current").read_text().strip()
+    except OSError:
+        return None
+    base = out_dir / f"{name}-{digest}.json"
+    if not base.exists():
+        return None
+    return digest, _variants(base)
+
+
+def storm_files(data_dir):
+    """Every storm GeoJSON under data_dir (snapshots excluded)."""
+    return [p for p in Path(data_dir).rglob("*.geojson") if SNAPSHOT_DIRNAME not in p.relative_to(data_dir).parts]
+
+
+# --- Published advisory files ---
+#
+# download_storms.py writes advisory files after collectstatic has run, so
+# they never get the hashed, compressed treatment of the static pipeline.
+# publish_files() gives each one an immutable copy named after its content,
+# with gzip/brotli siblings, and records it in snapshot/advisories.json:
+#
+#     {"al052025_cone_006.geojson": {"file": "al052025_cone_006.3f9a1c02b4e17d55.geojson",
+#                                    "sha256": "...", "size": 48211, "mtime_ns": ...}}
+#
+# A published name always serves the same bytes, so it can be cached forever.
+
+PUBLISHED_DIRNAME = "advisories"
+MANIFEST_NAME = "advisories.json"
+PUBLISHED_NAME_RE = re.compile(r"^(?P<stem>[A-Za-z0-9_-]+)\.(?P<hash>[0-9a-f]{16})\.geojson$")
+
+
+def published_dir(data_dir):
+    return snapshot_dir(data_dir) / PUBLISHED_DIRNAME
+
+
+def read_manifest(data_dir):
+    """The published-files manifest, or {} before the first publish."""
+    try:
+        with open(snapshot_dir(data_dir) / MANIFEST_NAME, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def publish_files(data_dir, paths=None):
+    """
+    Publish every storm file (or `paths`) under its content-hashed name and
+    rewrite the manifest if anything changed. Files whose size and mtime
+    match their manifest entry aren't read again. Copies referenced by
+    neither this manifest nor the previous one are deleted, so a client
+    holding URLs from the last generation can still fetch them. Returns the
+    manifest.
+    """
+    out_dir = published_dir(data_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    previous = read_manifest(data_dir)
+    manifest = {}
+    for path in storm_files(data_dir) if paths is None else paths:
+        st = path.stat()
+        entry = previous.get(path.name)
+        if (entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns
+                and (out_dir / entry["file"]).exists()):
+            manifest[path.name] = entry
+            continue
+        body = path.read_bytes()
+        digest = hashlib.sha256(body).hexdigest()
+        published = f"{path.stem}.{digest[:16]}.geojson"
+        if not (out_dir / published).exists():
+            _write_variants(out_dir / published, body)
+        manifest[path.name] = {"file": published, "sha256": digest, "size": len(body), "mtime_ns": st.st_mtime_ns}
+
+    if manifest != previous:
+        _atomic_write(snapshot_dir(data_dir) / MANIFEST_NAME,
+                      json.dumps(manifest, sort_keys=True, separators=(",", ":")).encode("utf-8"))
+    keep = {e["file"] for e in manifest.values()} | {e["file"] for e in previous.values()}
+    for p in out_dir.iterdir():
+        base = p.name[:-3] if p.name.endswith((".gz", ".br")) else p.name
+        if PUBLISHED_NAME_RE.match(base) and base not in keep:
+            p.unlink(missing_ok=True)
+    return manifest
+
+
+def published_file(data_dir, name):
+    """
+    {"identity"|"gzip"|"br": path} for a published name, or None if it isn't
+    one (or has been pruned).
+    """
+    if not PUBLISHED_NAME_RE.match(name):
+        return None
+    base = published_dir(data_dir) / name
+    return _variants(base) if base.exists() else None
+
+
+def build_snapshot(data_dir, nhc_storms=()):
+    """
+    Enrich every storm file and publish it as the "storms" snapshot, plus a
+    "storms-latest" snapshot holding only the newest advisory per storm/kind.
+    Each also gets a simplified "-z<level>" variant per SIMPLIFY_LEVELS entry,
+    and the advisory files themselves are published (publish_files). Returns (digest, feature_count) of the full snapshot.
+    """
+    name_lookup = load_name_lookup(data_dir)
+    nhc_types = merge_nhc_storms(name_lookup, nhc_storms)
+    fc = build_feature_collection(storm_files(data_dir), name_lookup, nhc_types)
+    latest_paths = select_files(index_storm_files(data_dir), latest=True)
+    latest_fc = build_feature_collection(latest_paths, name_lookup, nhc_types)
+
+    digest = None
+    for name, collection in (("storms", fc), ("storms-latest", latest_fc)):
+        d = write_snapshot(data_dir, name, encode_collection(collection))
+        digest = digest or d
+        for level, (tolerance, decimals) in SIMPLIFY_LEVELS.items():
+            simplified = simplify_collection(collection, tolerance, decimals)
+            write_snapshot(data_dir, f"{name}-z{level}", encode_collection(simplified))
+    update_changes(data_dir, latest_paths, name_lookup, nhc_types)
+    publish_files(data_dir)
+    return digest, len(fc["features"])
+
+
+# --- Change journal ---
+#
+# snapshot/changes.json records, for the newest advisory of every storm/kind
+# (what storms-latest holds), the ingest sequence number at which it last
+# changed, plus tombstones for layers that went away:
+#
+#     {"epoch": "<hex>", "seq": 42, "floor": 0,
+#      "layers": {"al052025/cone": {"advisory": "006", "file": "al052025_cone_006.geojson",
+#                                   "name": "Erin", "type": "Hurricane", "digest": "...", "seq": 41}},
+#      "removed": {"al042025/track": 40}}
+#
+# A client holding cursor "<epoch>:<seq>" only needs the layers with a higher
+# seq. A different epoch (journal recreated) or a seq below the floor (its
+# tombstones were pruned) means it has to start over.
+
+CHANGES_NAME = "changes.json"
+TOMBSTONES_KEPT = 500
+
+
+def read_changes(data_dir):
+    """The change journal, or None if no snapshot build has written one."""
+    try:
+        return json.loads((snapshot_dir(data_dir) / CHANGES_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def empty_journal():
+    return {"epoch": secrets.token_hex(4), "seq": 0, "floor": 0, "layers": {}, "removed": {}}
+
+
+def fold_changes(journal, latest_paths, name_lookup, nhc_types):
+    """
+    The journal after an ingest whose newest-advisory files are
+    `latest_paths`: layers added, replaced or re-enriched get the next
+    sequence number and layers that went away get tombstones. Returns None
+    if nothing changed. `journal` may be None to start a new one.
+    """
+    journal = journal or empty_journal()
+    seq = journal["seq"] + 1
+    layers = {}
+    for path in latest_paths:
+        path = Path(path)
+        m = STORM_FILE_RE.match(path.name)
+        storm_id, kind = m.group("storm").lower(), m.group("kind").lower()
+        name, nhc_type = _enrichment(storm_id, name_lookup, nhc_types)
+        try:
+            body = path.read_bytes()
+        except OSError:
+            continue
+        digest = hashlib.sha256(f"{path.name}\0{name}\0{nhc_type}\0".encode("utf-8") + body).hexdigest()
+        key = f"{storm_id}/{kind}"
+        old = journal["layers"].get(key)
+        layers[key] = {"advisory": m.group("advisory").upper(), "file": path.name,
+                       "name": name, "type": nhc_type, "digest": digest,
+                       "seq": old["seq"] if old and old["digest"] == digest else seq}
+
+    removed = {k: v for k, v in journal["removed"].items() if k not in layers}
+    removed.update((key, seq) for key in journal["layers"] if key not in layers)
+    if removed == journal["removed"] and all(v["seq"] < seq for v in layers.values()):
+        return None
+
+    floor = journal["floor"]
+    if len(removed) > TOMBSTONES_KEPT:
+        ordered = sorted(removed.items(), key=lambda kv: kv[1])
+        floor = max(floor, ordered[-TOMBSTONES_KEPT - 1][1])
+        removed = dict(ordered[-TOMBSTONES_KEPT:])
+    return {**journal, "seq": seq, "floor": floor, "layers": layers, "removed": removed}
+
+
+def update_changes(data_dir, latest_paths, name_lookup, nhc_types):
+    """Bring snapshot/changes.json up to date with this ingest; returns the journal."""
+    journal = read_changes(data_dir)
+    updated = fold_changes(journal, latest_paths, name_lookup, nhc_types)
+    if updated is None:
+        return journal
+    out_dir = snapshot_dir(data_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    _atomic_write(out_dir / CHANGES_NAME, json.dumps(updated, indent=1).encode("utf-8"))
+    return updated
+
+
+def format_cursor(journal):
+    return f"{journal['epoch']}:{journal['seq']}"
+
+
+def changes_since(journal, cursor):
+    """
+    What a client at `cursor` is missing: (reset, layer keys to (re)send,
+    tombstoned layer keys). reset means the client has to drop everything it
+    holds and take the full set of layers; a missing or unusable cursor
+    (malformed, another epoch, pruned, from the future) always resets.
+    """
+    epoch, _, seq = (cursor or "").partition(":")
+    try:
+        since = int(seq)
+    except ValueError:
+        since = None
+    if since is None or epoch != journal["epoch"] or not journal["floor"] <= since <= journal["seq"]:
+        return True, sorted(journal["layers"]), []
+    updated = sorted(k for k, v in journal["layers"].items() if v["seq"] > since)
+    removed = sorted(k for k, v in journal["removed"].items() if v > since)
+    return False, updated, removed
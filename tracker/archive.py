@@ -0,0 +1,157 @@
+"""
+Advisory archive: every cone, track and points layer ingested, kept in the
+app's SQLite database so history survives storms leaving the feed.
+
+    tracker_advisory        one row per (storm, kind, advisory) with indexed
+                            storm_id / advisory_rank / issue_time columns and
+                            the layer's GeoJSON, zlib-compressed
+    tracker_advisory_rtree  R*Tree of each layer's bounding box in (lon, lat,
+                            issue time as epoch seconds), keyed on the row id
+
+The tables come from Django migrations (tracker.models.Advisory). Like
+tracker.advisories this module doesn't import Django: it writes through
+plain sqlite3 so download_storms.py can archive what it converts without
+setting Django up. Reads go through the ORM (views.advisory_archive).
+"""
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import hashlib
+import json
+import re
+import sqlite3
+import zlib
+
+import shapely
+from shapely.geometry import shape
+
+from .advisories import STORM_FILE_RE, advisory_key
+
+TABLE = "tracker_advisory"
+RTREE = "tracker_advisory_rtree"
+
+# ADVDATE as NHC writes it: "500 PM AST Mon Aug 11 2025"
+ADVDATE_RE = re.compile(
+    r"^\s*(?P<hhmm>\d{3,4})\s+(?P<ampm>AM|PM)\s+(?P<tz>[A-Z]+)\s+[A-Z]{3}\s+"
+    r"(?P<mon>[A-Z]{3})\s+(?P<day>\d{1,2})\s+(?P<year>\d{4})\s*$",
+    re.IGNORECASE,
+)
+TZ_OFFSETS = {  # hours from UTC, for the zones NHC/CPHC advisories use
+    "UTC": 0, "GMT": 0, "CVT": -1, "AST": -4, "EDT": -4, "EST": -5, "CDT": -5,
+    "CST": -6, "MDT": -6, "MST": -7, "PDT": -7, "PST": -8, "AKDT": -8, "AKST": -9,
+    "HST": -10, "SST": -11, "CHST": 10,
+}
+MONTHS = {m: i for i, m in enumerate(
+    ("JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"), start=1)}
+
+
+def parse_advdate(text):
+    """ADVDATE string -> aware UTC datetime, or None if it doesn't parse."""
+    m = ADVDATE_RE.match(str(text or ""))
+    if not m or m.group("tz").upper() not in TZ_OFFSETS or m.group("mon").upper() not in MONTHS:
+        return None
+    hhmm = int(m.group("hhmm"))
+    hour, minute = divmod(hhmm, 100)
+    if not (1 <= hour <= 12 and minute < 60):
+        return None
+    hour = hour % 12 + (12 if m.group("ampm").upper() == "PM" else 0)
+    try:
+        local = datetime(int(m.group("year")), MONTHS[m.group("mon").upper()], int(m.group("day")), hour, minute)
+    except ValueError:
+        return None
+    return (local - timedelta(hours=TZ_OFFSETS[m.group("tz").upper()])).replace(tzinfo=timezone.utc)
+
+
+def advisory_rank(advisory):
+    """Sortable integer for an advisory number: "7" -> 700, "012A" -> 1201."""
+    number, suffix = advisory_key(advisory)
+    if number < 0:
+        raise ValueError(f"bad advisory number {advisory!r}")
+    return number * 100 + (ord(suffix) - ord("A") + 1 if suffix else 0)
+
+
+def _db_datetime(value):
+    # The format Django's SQLite backend stores DateTimeFields in (naive UTC)
+    return value.astimezone(timezone.utc).replace(tzinfo=None).isoformat(" ")
+
+
+def connect(db_path):
+    return sqlite3.connect(str(db_path), timeout=30)
+
+
+def available(conn):
+    """True once the migrations that create the archive tables have run."""
+    row = conn.execute(
+        "SELECT count(*) FROM sqlite_master WHERE name IN (?, ?)", (TABLE, RTREE)
+    ).fetchone()
+    return row[0] == 2
+
+
+def layer_bounds(fc):
+    """(min_lon, min_lat, max_lon, max_lat) of every geometry in a FeatureCollection, or None."""
+    geoms = [shape(f["geometry"]) for f in fc.get("features", []) if f.get("geometry")]
+    if not geoms:
+        return None
+    bounds = shapely.total_bounds(geoms)
+    return None if any(b != b for b in bounds) else tuple(float(b) for b in bounds)  # NaN when all empty
+
+
+def store(conn, storm_id, kind, advisory, body, issue_time=None):
+    """
+    Archive one layer's GeoJSON bytes; re-issues of the same advisory replace
+    the earlier copy. The issue time comes from the features' ADVDATE, else
+    `issue_time`, else now. Returns "archived", "replaced" or "unchanged".
+    """
+    storm_id, advisory = storm_id.lower(), advisory.upper()
+    digest = hashlib.sha1(body).hexdigest()
+    existing = conn.execute(
+        f"SELECT id, digest FROM {TABLE} WHERE storm_id = ? AND kind = ? AND advisory = ?",
+        (storm_id, kind, advisory),
+    ).fetchone()
+    if existing and existing[1] == digest:
+        return "unchanged"
+
+    fc = json.loads(body)
+    props = next((f.get("properties") or {} for f in fc.get("features", [])), {})
+    issued = parse_advdate(props.get("ADVDATE")) or issue_time or datetime.now(timezone.utc)
+    bounds = layer_bounds(fc)
+
+    with conn:
+        conn.execute(
+            f"INSERT INTO {TABLE} (storm_id, kind, advisory, advisory_rank, issue_time, storm_name,"
+            " geojson, digest, archived_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (storm_id, kind, advisory) DO UPDATE SET advisory_rank = excluded.advisory_rank,"
+            " issue_time = excluded.issue_time, storm_name = excluded.storm_name,"
+            " geojson = excluded.geojson, digest = excluded.digest, archived_at = excluded.archived_at",
+            (storm_id, kind, advisory, advisory_rank(advisory), _db_datetime(issued),
+             str(props.get("STORMNAME") or "").strip(), zlib.compress(body, 9), digest,
+             _db_datetime(datetime.now(timezone.utc))),
+        )
+        row_id = conn.execute(
+            f"SELECT id FROM {TABLE} WHERE storm_id = ? AND kind = ? AND advisory = ?",
+            (storm_id, kind, advisory),
+        ).fetchone()[0]
+        if bounds is None:
+            conn.execute(f"DELETE FROM {RTREE} WHERE id = ?", (row_id,))
+        else:
+            t = issued.timestamp()
+            conn.execute(
+                f"INSERT OR REPLACE INTO {RTREE} VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (row_id, bounds[0], bounds[2], bounds[1], bounds[3], t, t),
+            )
+    return "replaced" if existing else "archived"
+
+
+def store_file(conn, path):
+    """
+    Archive a {storm}_{kind}_{adv}.geojson file (the file's mtime stands in
+    for the issue time if its features carry no ADVDATE). Returns store()'s
+    status, or None if the name doesn't follow the scheme.
+    """
+    path = Path(path)
+    m = STORM_FILE_RE.match(path.name)
+    if not m:
+        return None
+    mtime = datetime.fromtimestamp(path.stat().st_mtime, timezone.utc)
+    return store(conn, m.group("storm"), m.group("kind").lower(), m.group("advisory"),
+                 path.read_bytes(), issue_time=mtime)
+
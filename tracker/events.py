@@ -0,0 +1,184 @@
+"""
+Push channel for new advisories, served as Server-Sent Events on
+/api/storms/stream.
+
+download_storms.py ends every ingest that changed something by rewriting
+the change journal (advisories.update_changes). One poller task per event
+loop (under uvicorn: per worker process) stats that file every
+settings.STORM_STREAM_POLL seconds and, when it moves, sends each connected
+client one small event naming the layers that changed:
+
+    id: 3f9a1c02:17
+    event: changes
+    data: {"cursor": "3f9a1c02:17", "layers": [{"stormId": "al052025", "kind": "cone", "advisory": "007"}], "removed": []}
+
+Clients then fetch /api/storms/changes?since=<their cursor>. An open stream
+costs a queue and a suspended generator, no thread; the poller stops once
+the last client on its loop goes away. EventSource resends the last event
+id when it reconnects, so a client that missed an ingest is caught up
+straight away.
+"""
+import asyncio
+import json
+import logging
+import os
+import weakref
+
+from django.conf import settings
+
+from . import advisories, metrics
+from .http import in_thread
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 16  # undelivered events before a client counts as stuck and is dropped
+
+_broadcasters = weakref.WeakKeyDictionary()  # loop -> _Broadcaster
+
+
+def _journal_stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def changes_event(journal, since):
+    """The "changes" payload for a client at cursor `since`, or None if it's up to date."""
+    cursor = advisories.format_cursor(journal)
+    if since == cursor:
+        return None
+    reset, updated, tombstones = advisories.changes_since(journal, since)
+    live = {k.split("/")[0] for k in journal["layers"]}
+    layers = [{"stormId": k.split("/")[0], "kind": k.split("/")[1], "advisory": journal["layers"][k]["advisory"]}
+              for k in updated]
+    return {
+        "cursor": cursor,
+        "reset": reset,
+        "layers": layers,
+        "removed": sorted({k.split("/")[0] for k in tombstones} - live),
+    }
+
+
+def format_event(event, data=None, event_id=None):
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+class _Broadcaster:
+    """Fans journal changes out to every stream open on one event loop."""
+
+    def __init__(self, data_dir):
+        self.path = advisories.snapshot_dir(data_dir) / advisories.CHANGES_NAME
+        self.data_dir = data_dir
+        self.journal = None
+        self.stamp = None
+        self.queues = set()
+        self.task = None
+
+    async def refresh(self):
+        stamp = await in_thread(_journal_stamp)(self.path)
+        if stamp is not None and stamp != self.stamp:
+            journal = await in_thread(advisories.read_changes)(self.data_dir)
+            if journal is not None:
+                self.stamp = stamp
+                return journal
+        return None
+
+    async def run(self):
+        while self.queues:
+            await asyncio.sleep(settings.STORM_STREAM_POLL)
+            try:
+                journal = await self.refresh()
+            except Exception as e:
+                logger.warning("storm_stream poll failed: %s", e)
+                continue
+            if journal is None:
+                continue
+            previous, self.journal = self.journal, journal
+            data = changes_event(journal, advisories.format_cursor(previous) if previous else None)
+            if data is None:
+                continue
+            metrics.inc("storm_stream_events_total", event="push")
+            for queue in list(self.queues):
+                try:
+                    queue.put_nowait(data)
+                except asyncio.QueueFull:
+                    # Stuck client: swap its backlog for a hang-up; it reconnects and catches up
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait(None)
+                    self.queues.discard(queue)
+                    metrics.inc("storm_stream_events_total", event="drop")
+
+    async def subscribe(self):
+        if self.journal is None:
+            journal = await self.refresh()
+            self.journal = self.journal or journal  # another subscriber may have got there first
+        queue = asyncio.Queue(QUEUE_SIZE)
+        self.queues.add(queue)
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.queues.discard(queue)
+
+
+def _broadcaster():
+    loop = asyncio.get_running_loop()
+    b = _broadcasters.get(loop)
+    if b is None:
+        b = _broadcasters[loop] = _Broadcaster(settings.STORM_DATA_DIR)
+    return b
+
+
+def catch_up(last_event_id=None):
+    """
+    The retry hint plus, if the client is behind, one "changes" event: the
+    whole response when the app runs under WSGI, where a request can't be
+    held open cheaply and EventSource reconnecting every retry interval
+    stands in for the push.
+    """
+    body = f"retry: {settings.STORM_STREAM_RETRY_MS}\n\n".encode("ascii")
+    journal = advisories.read_changes(settings.STORM_DATA_DIR)
+    data = changes_event(journal, last_event_id) if journal is not None and last_event_id else None
+    if data is not None:
+        body += format_event("changes", data, data["cursor"])
+    return body
+
+
+async def stream(last_event_id=None):
+    """
+    Async iterator of SSE-encoded bytes for one client: a catch-up event if
+    it's behind `last_event_id` (its cursor; None skips the check), then an event per ingest and a comment
+    line every STORM_STREAM_HEARTBEAT seconds to keep proxies from timing
+    the connection out.
+    """
+    broadcaster = _broadcaster()
+    queue = await broadcaster.subscribe()
+    metrics.inc("storm_stream_events_total", event="open")
+    try:
+        yield f"retry: {settings.STORM_STREAM_RETRY_MS}\n\n".encode("ascii")
+        journal = broadcaster.journal
+        if journal is not None and last_event_id:
+            data = changes_event(journal, last_event_id)
+            if data is not None:
+                yield format_event("changes", data, data["cursor"])
+        while True:
+            try:
+                data = await asyncio.wait_for(queue.get(), settings.STORM_STREAM_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield b": ping\n\n"
+                continue
+            if data is None:
+                return  # fell too far behind; EventSource reconnects with its last id
+            yield format_event("changes", data, data["cursor"])
+    finally:
+        broadcaster.unsubscribe(queue)
+        metrics.inc("storm_stream_events_total", event="close")
@@ -0,0 +1,169 @@
+"""
+Local Florida gazetteer behind /api/geocode.
+
+import_shelters derives one Place per ZIP, city, county and municipality
+named in the shelter inventory, placed at the mean of its shelters'
+coordinates with their bounding box as the extent (build_places). Each
+process keeps a sorted prefix index over the normalized names, rebuilt when
+the "shelters" DatasetVersion changes, so autocomplete is a binary search
+plus a walk over the matching run instead of a Nominatim round trip.
+
+Names are matched from their start and from the start of any later word
+("laud" finds Fort Lauderdale), with St./Ft./Pt./Mt. and N/S/E/W matching
+their spelled-out forms either way. The inventory spells some places
+several ways ("Port St Lucie", "Port St. Lucie"); those become one place
+under the most common spelling.
+"""
+from collections import Counter
+import bisect
+import re
+import threading
+
+from .models import DatasetVersion, Place
+
+KINDS = ("zip", "city", "county", "municipality")
+ABBREVIATIONS = {"st": "saint", "ste": "sainte", "ft": "fort", "pt": "port", "mt": "mount",
+                 "n": "north", "s": "south", "e": "east", "w": "west"}
+STATE_SUFFIX_RE = re.compile(r"(?:,|\s)\s*(?:florida|fla|fl)\s*$", re.IGNORECASE)
+COUNTY_SUFFIX_RE = re.compile(r"\s+county\s*$", re.IGNORECASE)
+ZIP_RE = re.compile(r"^\d{5}$")
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+def normalize(text):
+    """Lower-case words separated by single spaces: "St. Lucie" -> "st lucie"."""
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", str(text).lower()).split())
+
+
+def expand(normalized, complete=True):
+    """Spell out abbreviations; the last word only if `complete` (the user may still be typing it)."""
+    words = normalized.split()
+    last = len(words) - (0 if complete else 1)
+    return " ".join(ABBREVIATIONS.get(w, w) if i < last else w for i, w in enumerate(words))
+
+
+def build_places(points):
+    """
+    Place field values from (zip, city, county, municipality, lat, lon)
+    tuples, one per shelter. Spellings of one name are merged, and
+    municipalities that duplicate a city of the same county are dropped.
+    """
+    groups = {}
+    for zip_code, city, county, municipality, lat, lon in points:
+        zip_code = zip_code.strip()[:5]
+        for kind, name, in_county in (
+            ("zip", zip_code if ZIP_RE.match(zip_code) else "", county),
+            ("city", city, county),
+            ("county", county, ""),
+            ("municipality", municipality, county),
+        ):
+            name = " ".join(name.split())
+            if name:
+                key = (kind, expand(normalize(name)), expand(normalize(in_county)))
+                groups.setdefault(key, []).append((name, in_county, lat, lon))
+
+    places = []
+    for (kind, name_key, county_key), members in groups.items():
+        if kind == "municipality" and ("city", name_key, county_key) in groups:
+            continue
+        lats = [m[2] for m in members]
+        lons = [m[3] for m in members]
+        places.append({
+            "kind": kind,
+            "name": Counter(m[0] for m in members).most_common(1)[0][0],
+            "county": Counter(m[1] for m in members).most_common(1)[0][0],
+            "latitude": round(sum(lats) / len(lats), 6),
+            "longitude": round(sum(lons) / len(lons), 6),
+            "min_lat": min(lats), "min_lon": min(lons), "max_lat": max(lats), "max_lon": max(lons),
+            "shelter_count": len(members),
+        })
+    places.sort(key=lambda p: (KINDS.index(p["kind"]), p["name"], p["county"]))
+    return places
+
+
+class Gazetteer:
+    def __init__(self, version, places):
+        self.version = version
+        self.places = places
+        entries = set()
+        for i, place in enumerate(places):
+            names = {normalize(place["name"])}
+            if place["kind"] == "county":
+                names.add(normalize(f"{place['name']} county"))
+            names |= {expand(n) for n in names}
+            for name in names:
+                words = name.split()
+                entries.add((name, 0, i))
+                for w in range(1, len(words)):
+                    entries.add((" ".join(words[w:]), 1, i))  # word-start match
+        entries = sorted(entries)
+        self._keys = [e[0] for e in entries]
+        self._entries = entries
+
+    @classmethod
+    def build(cls, version):
+        fields = ("kind", "name", "county", "latitude", "longitude",
+                  "min_lat", "min_lon", "max_lat", "max_lon", "shelter_count")
+        return cls(version, list(Place.objects.order_by("id").values(*fields)))
+
+    def __len__(self):
+        return len(self.places)
+
+    def _prefix(self, prefix):
+        i = bisect.bisect_left(self._keys, prefix)
+        while i < len(self._keys) and self._keys[i].startswith(prefix):
+            yield self._entries[i]
+            i += 1
+
+    def search(self, query, limit=8):
+        """Best places for a (possibly partial) query, most likely first."""
+        query = STATE_SUFFIX_RE.sub("", str(query))
+        want_county = bool(COUNTY_SUFFIX_RE.search(query))
+        if want_county:
+            query = COUNTY_SUFFIX_RE.sub("", query)
+        raw = normalize(query)
+        if not raw:
+            return []
+        complete = not query[-1:].isalnum()
+        prefixes = {raw, expand(raw, complete)}
+        # Digits mean a ZIP and "... County" a county; otherwise ZIPs go last
+        preferred = "zip" if raw.isdigit() else "county" if want_county else None
+
+        best = {}  # place index -> rank
+        for prefix in prefixes:
+            for key, word_start, i in self._prefix(prefix):
+                place = self.places[i]
+                kind_rank = place["kind"] != preferred if preferred else place["kind"] == "zip"
+                # whole name before later words, exact before prefix; bigger places first
+                rank = (word_start, key != prefix, kind_rank, -place["shelter_count"], place["name"])
+                if i not in best or rank < best[i]:
+                    best[i] = rank
+        ranked = sorted(best, key=best.get)[:limit]
+        return [self._result(self.places[i]) for i in ranked]
+
+    @staticmethod
+    def _result(place):
+        return {
+            "name": place["name"],
+            "kind": place["kind"],
+            "county": place["county"],
+            "lat": place["latitude"],
+            "lon": place["longitude"],
+            "bbox": [place["min_lon"], place["min_lat"], place["max_lon"], place["max_lat"]],
+            "shelters": place["shelter_count"],
+        }
+
+
+def get_gazetteer():
+    """The gazetteer for the current shelter import, built on first use."""
+    global _gazetteer
+    version = DatasetVersion.current("shelters")
+    g = _gazetteer
+    if g is not None and g.version == version:
+        return g
+    with _gazetteer_lock:
+        if _gazetteer is None or _gazetteer.version != version:
+            _gazetteer = Gazetteer.build(version)
+        return _gazetteer
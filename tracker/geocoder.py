@@ -0,0 +1,201 @@
+"""
+Server-side proxy to Nominatim for searches the local gazetteer can't
+answer (/api/geocode/remote).
+
+  - queries are normalized ("Tampa, FL" and "tampa" are the same lookup)
+    and answers, empty ones included, are kept in the GeocodeResult table
+    for settings.GEOCODE_CACHE_TTL (GEOCODE_EMPTY_TTL when nothing matched)
+  - identical lookups in flight are coalesced: one task per query per
+    event loop, and one process per box (an interprocess lock, after which
+    the cache is checked again; queries hash onto LOCK_SLOTS lock files, so
+    user input can't grow the lock directory)
+  - upstream calls take a token from one bucket shared by every worker
+    (settings.GEOCODE_RATE per second, GEOCODE_BURST deep, kept in the
+    Django cache), which keeps the box inside Nominatim's usage policy; a
+    lookup that would queue longer than GEOCODE_MAX_WAIT is refused with
+    RateLimited instead
+  - upstream calls go through their own pooled client (tracker.http),
+    identified to Nominatim by settings.GEOCODE_USER_AGENT and bounded by
+    GEOCODE_TIMEOUT
+  - settings.GEOCODE_UPSTREAM_URL points it somewhere else, e.g. at
+    benchmarks.fake_geocoder
+
+Hits, misses and upstream calls are counted in geocode_lookups_total and
+geocode_upstream_duration_seconds on /metrics.
+"""
+import asyncio
+import hashlib
+import logging
+import time
+import weakref
+from datetime import timedelta
+
+import httpx
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import metrics
+from .gazetteer import STATE_SUFFIX_RE, normalize
+from .http import async_client, in_thread, outcome
+from .locks import ainterprocess_lock, interprocess_lock
+from .models import GeocodeResult
+
+logger = logging.getLogger(__name__)
+
+BUCKET_KEY = "geocode:bucket"  # {"tokens": float, "at": epoch}
+BUCKET_LOCK = "geocode-bucket"
+LOCK_SLOTS = 64  # lookup locks; two queries sharing one just wait for each other
+FLORIDA_VIEWBOX = "-87.634938,31.000888,-79.974307,24.396308"
+MAX_QUERY_LENGTH = 200
+
+_inflight = weakref.WeakKeyDictionary()  # loop -> {query: Task}
+
+
+class RateLimited(Exception):
+    """No upstream token within GEOCODE_MAX_WAIT; retry_after is in seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"geocoder busy, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class UpstreamUnavailable(Exception):
+    """The geocoder failed and the query isn't cached."""
+
+
+def normalize_query(query):
+    """The cache key for a search: lower-case words, state suffix dropped."""
+    return normalize(STATE_SUFFIX_RE.sub("", str(query)))[:MAX_QUERY_LENGTH].strip()
+
+
+def take_token(now=None):
+    """
+    Reserve the next upstream slot in the shared bucket. Returns the seconds
+    to wait before using it (0 if one is free), or raises RateLimited when
+    that would be more than GEOCODE_MAX_WAIT (nothing is reserved then).
+    """
+    rate, burst = settings.GEOCODE_RATE, settings.GEOCODE_BURST
+    with interprocess_lock(BUCKET_LOCK):
+        now = time.time() if now is None else now
+        bucket = cache.get(BUCKET_KEY) or {"tokens": burst, "at": now}
+        tokens = min(burst, bucket["tokens"] + (now - bucket["at"]) * rate) - 1
+        wait = max(0.0, -tokens / rate)
+        if wait > settings.GEOCODE_MAX_WAIT:
+            raise RateLimited(wait - settings.GEOCODE_MAX_WAIT)
+        # Tokens may go negative: that's the queue of callers already promised a slot
+        cache.set(BUCKET_KEY, {"tokens": tokens, "at": now}, None)
+        return wait
+
+
+def _results(payload):
+    """Nominatim jsonv2 hits -> the /api/geocode result shape."""
+    out = []
+    for hit in payload if isinstance(payload, list) else []:
+        try:
+            lat, lon = float(hit["lat"]), float(hit["lon"])
+            south, north, west, east = (float(v) for v in hit.get("boundingbox") or (lat, lat, lon, lon))
+        except (KeyError, TypeError, ValueError):
+            continue
+        out.append({
+            "name": hit.get("display_name") or hit.get("name") or "",
+            "kind": hit.get("addresstype") or hit.get("type") or "",
+            "lat": lat,
+            "lon": lon,
+            "bbox": [west, south, east, north],
+        })
+    return out
+
+
+def get_async_client():
+    """The pooled httpx.AsyncClient for the geocoder on the running event loop."""
+    # Lookups are serialized by the token bucket, so a couple of connections is plenty
+    return async_client(
+        "geocoder",
+        headers={"User-Agent": settings.GEOCODE_USER_AGENT},
+        limits=httpx.Limits(max_connections=2, max_keepalive_connections=2),
+        timeout=settings.GEOCODE_TIMEOUT,
+    )
+
+
+async def _afetch(query):
+    params = {
+        "q": f"{query}, Florida",
+        "format": "jsonv2",
+        "countrycodes": "us",
+        "viewbox": FLORIDA_VIEWBOX,
+        "bounded": 1,
+        "limit": 5,
+    }
+    r = await get_async_client().get(settings.GEOCODE_UPSTREAM_URL, params=params)
+    r.raise_for_status()
+    return _results(r.json())
+
+
+async def _acached(query):
+    row = await GeocodeResult.objects.filter(query=query, expires_at__gt=timezone.now()).afirst()
+    return None if row is None else row.results
+
+
+async def _astore(query, results):
+    now = timezone.now()
+    ttl = settings.GEOCODE_CACHE_TTL if results else settings.GEOCODE_EMPTY_TTL
+    await GeocodeResult.objects.aupdate_or_create(
+        query=query, defaults={"results": results, "fetched_at": now, "expires_at": now + timedelta(seconds=ttl)})
+    await GeocodeResult.objects.filter(expires_at__lte=now).adelete()
+
+
+async def alookup(query):
+    """
+    (normalized query, results, cached) for a free-text Florida search.
+    Raises ValueError for an empty query, RateLimited when the shared
+    upstream budget is spent, UpstreamUnavailable when the lookup failed.
+    """
+    key = normalize_query(query)
+    if not key:
+        raise ValueError("empty query")
+    results = await _acached(key)
+    if results is not None:
+        metrics.inc("geocode_lookups_total", result="hit")
+        return key, results, True
+
+    loop = asyncio.get_running_loop()
+    inflight = _inflight.setdefault(loop, {})
+    task = inflight.get(key)
+    if task is None:
+        task = inflight[key] = loop.create_task(_afill(key))
+        task.add_done_callback(lambda _: inflight.pop(key, None))
+    else:
+        metrics.inc("geocode_lookups_total", result="coalesced")
+    # shield: one client going away mustn't cancel a lookup others are waiting on
+    results, cached = await asyncio.shield(task)
+    return key, results, cached
+
+
+async def _afill(key):
+    slot = int(hashlib.sha1(key.encode("utf-8")).hexdigest(), 16) % LOCK_SLOTS
+    async with ainterprocess_lock(f"geocode-{slot}"):
+        # Another worker may have looked it up while we waited
+        results = await _acached(key)
+        if results is not None:
+            metrics.inc("geocode_lookups_total", result="coalesced")
+            return results, True
+        try:
+            wait = await in_thread(take_token)()
+        except RateLimited:
+            metrics.inc("geocode_lookups_total", result="rate_limited")
+            raise
+        if wait:
+            await asyncio.sleep(wait)
+
+        metrics.inc("geocode_lookups_total", result="miss")
+        started = time.perf_counter()
+        try:
+            results = await _afetch(key)
+        except Exception as e:
+            metrics.observe("geocode_upstream_duration_seconds", time.perf_counter() - started, outcome=outcome(e))
+            logger.warning("upstream lookup for %r failed: %s", key, e)
+            raise UpstreamUnavailable(str(e)) from e
+        metrics.observe("geocode_upstream_duration_seconds", time.perf_counter() - started, outcome="ok")
+        await _astore(key, results)
+        return results, False
@@ -0,0 +1,58 @@
+"""
+Outbound HTTP and off-loop helpers shared by the upstream clients
+(tracker.nhc, tracker.geocoder) and the async views.
+
+  - async_client(name, ...) is one pooled httpx.AsyncClient per event loop
+    and name (under uvicorn: per worker process), so each upstream keeps
+    its own headers, limits and timeout; aclose_clients() closes the
+    running loop's clients on ASGI lifespan shutdown (hurricane_project.asgi)
+  - in_thread() runs a blocking helper (cache or file I/O) off the loop
+  - outcome() is the short failure label used on the upstream metrics
+"""
+import asyncio
+import weakref
+
+import httpx
+import requests
+from asgiref.sync import sync_to_async
+
+_clients = weakref.WeakKeyDictionary()  # loop -> {name: AsyncClient}
+
+
+def in_thread(func):
+    """Run a blocking helper off the event loop (a no-op wrapper under WSGI)."""
+    return sync_to_async(func, thread_sensitive=False)
+
+
+def async_client(name, **config):
+    """
+    The running loop's client for `name`; config (httpx.AsyncClient
+    arguments) is only used the first time, when the client is created.
+    """
+    clients = _clients.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(name)
+    if client is None or client.is_closed:
+        client = clients[name] = httpx.AsyncClient(**config)
+    return client
+
+
+async def aclose_clients():
+    """Close every client the running loop has opened."""
+    clients = _clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
+
+
+def outcome(exc):
+    """Short label for why an upstream call failed."""
+    if isinstance(exc, (requests.exceptions.Timeout, httpx.TimeoutException)):
+        return "timeout"
+    if isinstance(exc, (requests.exceptions.ConnectionError, httpx.NetworkError)):
+        return "connection_error"
+    if isinstance(exc, requests.exceptions.HTTPError):
+        return f"http_{exc.response.status_code}" if exc.response is not None else "http_error"
+    if isinstance(exc, httpx.HTTPStatusError):
+        return f"http_{exc.response.status_code}"
+    if isinstance(exc, ValueError):
+        return "bad_payload"
+    return "error"
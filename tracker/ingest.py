@@ -0,0 +1,186 @@
+"""
+The storm ingest schedule: download_storms.run_once() on a loop, so imports,
+the pooled HTTP session and the conditional-GET state stay warm between polls.
+NHC issues full advisories at 03/09/15/21 UTC; around those times we poll
+every fast_interval seconds, otherwise every slow_interval. Failed cycles
+back off exponentially, and every delay gets +/- jitter.
+
+Each cycle is bounded by `timeout`: requests are capped to the deadline and
+pending downloads are abandoned when it passes. If a cycle is still running
+`grace` seconds after that (e.g. a stuck socket), it has overrun:
+run_ingest_daemon exits the process so its supervisor restarts it; a web
+worker can't do that without killing the requests it is serving, so it
+abandons the cycle's thread instead and hands the scheduler lock on.
+
+Two ways to run it:
+  - manage.py run_ingest_daemon, its own process; only where it shares
+    STORM_DATA_DIR (and the database) with the web service, i.e. one box
+  - settings.INGEST_IN_PROCESS: every web worker starts start_in_process()
+    on ASGI lifespan startup, and the one holding the "ingest-scheduler"
+    interprocess lock polls while the others wait on it; when that worker
+    exits, or a cycle of its overruns, the lock passes to one of them. This
+    is how hosts without a shared disk between services (Render, Heroku)
+    run it.
+"""
+import datetime as dt
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+from .locks import interprocess_lock
+
+logger = logging.getLogger(__name__)
+
+ADVISORY_HOURS_UTC = (3, 9, 15, 21)
+WINDOW_BEFORE = dt.timedelta(minutes=15)
+WINDOW_AFTER = dt.timedelta(minutes=45)
+
+TIMEOUT = 300  # per-cycle time budget (seconds)
+GRACE = 60  # overrun past TIMEOUT before the process exits
+FAST_INTERVAL = 60  # poll interval around advisory times (seconds)
+SLOW_INTERVAL = 900  # poll interval between advisory windows (seconds)
+MAX_BACKOFF = 1800
+JITTER = 0.1  # fractional +/- jitter on every delay
+SCHEDULER_LOCK = "ingest-scheduler"
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+_stop = threading.Event()
+
+
+def advisory_windows(now):
+    """(start, end) of the fast-poll window around each advisory time near `now`."""
+    day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    for offset in (-1, 0, 1):
+        for hour in ADVISORY_HOURS_UTC:
+            t = day + dt.timedelta(days=offset, hours=hour)
+            yield t - WINDOW_BEFORE, t + WINDOW_AFTER
+
+
+def scheduled_delay(now, fast, slow):
+    """Seconds until the next poll when the last cycle succeeded."""
+    next_start = None
+    for start, end in advisory_windows(now):
+        if start <= now < end:
+            return fast
+        if start > now and (next_start is None or start < next_start):
+            next_start = start
+    return min(slow, (next_start - now).total_seconds())
+
+
+def backoff_delay(failures, base, cap):
+    return min(base * 2 ** (failures - 1), cap)
+
+
+def jittered(delay, jitter):
+    return max(1.0, delay * random.uniform(1 - jitter, 1 + jitter))
+
+
+class CycleOverrun(Exception):
+    """A cycle ran past timeout + grace and was abandoned; .cycle is its still-running thread."""
+
+    def __init__(self, limit, cycle):
+        super().__init__(f"ingest cycle overran {limit}s")
+        self.limit = limit
+        self.cycle = cycle
+
+
+def run_cycle(timeout, grace, on_overrun=None):
+    """
+    One download_storms.run_once() under a watchdog; returns its stats.
+    If it overruns, on_overrun(limit) is called (run_ingest_daemon exits
+    there); if that returns, or there is none, raises CycleOverrun.
+    """
+    import download_storms  # the repo-root ingest script
+
+    started = time.perf_counter()
+    stats = {}
+
+    def cycle():
+        try:
+            stats.update(download_storms.run_once(deadline=time.monotonic() + timeout))
+        except Exception as e:
+            stats.update(status="error", error=f"{type(e).__name__}: {e}")
+
+    worker = threading.Thread(target=cycle, name="ingest-cycle", daemon=True)
+    worker.start()
+    worker.join(timeout + grace)
+    if worker.is_alive():
+        if on_overrun is not None:
+            on_overrun(timeout + grace)
+        raise CycleOverrun(timeout + grace, worker)
+    stats["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return stats
+
+
+def run(stop, log, on_overrun=None, once=False, timeout=TIMEOUT, grace=GRACE, fast_interval=FAST_INTERVAL,
+        slow_interval=SLOW_INTERVAL, max_backoff=MAX_BACKOFF, jitter=JITTER):
+    """
+    Poll until the `stop` Event is set (or after one cycle with `once`),
+    passing an "ingest_cycle" record to log() after each. Returns the number
+    of failed cycles in a row at the end. An overrun cycle calls
+    on_overrun and then raises CycleOverrun (see run_cycle).
+    """
+    failures = 0
+    cycle = 0
+    while not stop.is_set():
+        cycle += 1
+        stats = run_cycle(timeout, grace, on_overrun)
+        failures = failures + 1 if stats["status"] in ("failed", "error") else 0
+
+        now = dt.datetime.now(dt.timezone.utc)
+        if failures:
+            delay = backoff_delay(failures, fast_interval, max_backoff)
+        else:
+            delay = scheduled_delay(now, fast_interval, slow_interval)
+        delay = jittered(delay, jitter)
+
+        log({"event": "ingest_cycle", "cycle": cycle, "at": now.isoformat(timespec="seconds"),
+             **stats, "failures": failures, "next_poll_s": None if once else round(delay, 1)})
+        if once:
+            break
+        stop.wait(delay)
+    return failures
+
+
+def start_in_process():
+    """Start this worker's scheduler thread (once per process)."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None or not _scheduler.is_alive():
+            _stop.clear()
+            _scheduler = threading.Thread(target=_lead, name="ingest-scheduler", daemon=True)
+            _scheduler.start()
+
+
+def stop_in_process():
+    """Ask the scheduler to stop after its current cycle (ASGI lifespan shutdown)."""
+    _stop.set()
+
+
+def _lead():
+    while not _stop.is_set():
+        # Blocks until no other worker holds the lock, i.e. at most one polls
+        with interprocess_lock(SCHEDULER_LOCK):
+            if _stop.is_set():
+                return
+            logger.info("ingest scheduler running in worker %d", os.getpid())
+            try:
+                run(_stop, _log)
+                return
+            except CycleOverrun as e:
+                overrun = e
+            except Exception:
+                logger.exception("ingest scheduler stopped")
+                return
+        # Lock released, so another worker takes the schedule over; this one
+        # only queues for it again once its stuck cycle has let go
+        logger.error("%s in worker %d; handing the schedule to another worker", overrun, os.getpid())
+        overrun.cycle.join()
+
+
+def _log(record):
+    logger.info(json.dumps(record, separators=(",", ":")))
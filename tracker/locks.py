@@ -0,0 +1,53 @@
+"""
+Interprocess locks shared by every gunicorn worker on the box.
+
+Backed by flock() on files under settings.CACHE_DIR. On platforms without
+fcntl the lock degrades to a no-op (callers still hold their thread locks).
+"""
+import asyncio
+import contextlib
+from pathlib import Path
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes
+    fcntl = None
+
+
+def _lock_path(name):
+    lock_dir = Path(settings.CACHE_DIR) / "locks"
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    return lock_dir / f"{name}.lock"
+
+
+@contextlib.contextmanager
+def interprocess_lock(name):
+    """Block until no other process holds the lock called `name`."""
+    with open(_lock_path(name), "a+") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+@contextlib.asynccontextmanager
+async def ainterprocess_lock(name, poll=0.02):
+    """interprocess_lock() for async code: polls a non-blocking flock so the event loop never blocks."""
+    with open(_lock_path(name), "a+") as fh:
+        if fcntl is not None:
+            while True:
+                try:
+                    fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(poll)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_UN)
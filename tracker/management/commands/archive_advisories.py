@@ -0,0 +1,31 @@
+import contextlib
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker import advisories, archive
+
+
+class Command(BaseCommand):
+    help = "Copies the advisory GeoJSON files on disk into the advisory archive (safe to re-run)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--data-dir", default=settings.STORM_DATA_DIR,
+                            help="Directory of {storm}_{kind}_{adv}.geojson files (default: STORM_DATA_DIR)")
+
+    def handle(self, *args, **options):
+        paths = sorted(advisories.index_storm_files(Path(options["data_dir"])).values())
+        counts = Counter()
+        with contextlib.closing(archive.connect(settings.DATABASES["default"]["NAME"])) as conn:
+            if not archive.available(conn):
+                raise CommandError("Advisory archive tables are missing; run migrate first")
+            for path in paths:
+                try:
+                    counts[archive.store_file(conn, path)] += 1
+                except Exception as e:
+                    counts["failed"] += 1
+                    self.stderr.write(f"{path.name}: {e}")
+        summary = ", ".join(f"{n} {status}" for status, n in sorted(counts.items())) or "nothing to do"
+        self.stdout.write(f"Archived {len(paths)} files: {summary}")
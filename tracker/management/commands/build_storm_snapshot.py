@@ -0,0 +1,25 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tracker import nhc
+from tracker.advisories import build_snapshot
+
+
+class Command(BaseCommand):
+    help = ("Rebuilds the prebuilt /api/storms.geojson snapshot and republishes the advisory files "
+            "from the files already on disk")
+
+    def handle(self, *args, **options):
+        try:
+            nhc_storms = nhc.current_storms()
+        except nhc.UpstreamUnavailable:
+            self.stderr.write("NHC unavailable; building snapshot from local names only")
+            nhc_storms = []
+        else:
+            if nhc_storms.stale:
+                self.stderr.write("NHC unavailable; building snapshot with its last good storm list")
+
+        digest, feature_count = build_snapshot(Path(settings.STORM_DATA_DIR), nhc_storms)
+        self.stdout.write(f"Storm snapshot {digest[:12]} ({feature_count} features)")
@@ -4,9 +4,13 @@ import sys
 import os
 
 class Command(BaseCommand):
-    help = "Fetches latest storms by running download_storms.py"
+    help = "Fetches latest storms by running download_storms.py (see run_ingest_daemon for the in-process loop)"
 
-    def handle(self, *args, **options):
+    def add_arguments(self, parser):
+        parser.add_argument("--timeout", type=float, default=None,
+                            help="Kill the download run after this many seconds")
+
+    def handle(self, *args, timeout=None, **options):
         script_path = os.path.join(os.path.dirname(__file__), '../../../download_storms.py')
         script_path = os.path.abspath(script_path)
 
@@ -15,9 +19,14 @@ class Command(BaseCommand):
             sys.exit(1)
 
         self.stdout.write(f"Running: {script_path}")
-        result = subprocess.run([sys.executable, script_path], capture_output=True, text=True)
+        self.stdout.flush()
+        try:
+            # Inherit stdout/stderr so output streams to the log as it happens
+            result = subprocess.run([sys.executable, "-u", script_path], timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.stderr.write(f"download_storms.py timed out after {timeout:g}s")
+            sys.exit(1)
 
         if result.returncode != 0:
-            self.stderr.write(result.stderr)
-        else:
-            self.stdout.write(result.stdout)
+            self.stderr.write(f"download_storms.py exited with status {result.returncode}")
+            sys.exit(result.returncode)
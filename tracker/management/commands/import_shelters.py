@@ -0,0 +1,151 @@
+import csv
+import hashlib
+import json
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from tracker import shelter_risk
+from tracker.gazetteer import build_places
+from tracker.models import DatasetVersion, Place, Shelter
+
+UPDATE_FIELDS = [
+    "name", "address", "city", "zip_code", "county", "latitude", "longitude",
+    "capacity", "is_pet_friendly", "notes", "shelter_type", "status",
+    "surge_zone", "flood_zone", "is_ehpa", "is_special_needs", "has_generator", "generator_kw",
+    "risk_capacity", "surge_risk_100yr", "surge_risk_500yr", "rain_risk_100yr", "rain_risk_500yr",
+    "flood_risk", "row_hash",
+]
+
+
+def shelter_values(row):
+    """Map one risk_shelters.csv row onto Shelter field values."""
+    return {
+        "name": row["Name"].strip(),
+        "address": row["Address"].strip(),
+        "city": row["City"].strip(),
+        "zip_code": row["Zip"].strip(),
+        "county": row["COUNTY"].strip(),
+        "latitude": float(row["Y"]),
+        "longitude": float(row["X"]),
+        "capacity": int(row["EHPA_Capac"]) if row["EHPA_Capac"].strip().isdigit() else None,
+        "is_pet_friendly": row["Pet_Friend"].strip().lower() in ("yes", "true", "y", "1"),
+        "notes": (row.get("Notes") or "").strip(),
+        "shelter_type": (row.get("SHELTER_TY") or "").strip(),
+        "status": (row.get("General_Po") or "").strip(),
+        **shelter_risk.row_values(row),
+    }
+
+
+def base_key(row):
+    """A row's source key before duplicates are told apart."""
+    # Asset ID is per site; buildings on the same campus share it
+    return f"{(row.get('Asset ID') or '').strip()}|{(row.get('Building') or '').strip()}"
+
+
+def row_hash(values):
+    return hashlib.sha1(json.dumps(values, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class Command(BaseCommand):
+    help = "Imports/updates shelters from the FDEM risk shelter inventory CSV (bulk, incremental)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_path", nargs="?", default="risk_shelters.csv")
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, csv_path, batch_size, **options):
+        started = time.perf_counter()
+        existing = dict(Shelter.objects.exclude(source_key=None).values_list("source_key", "row_hash"))
+
+        seen = set()
+        batch = []
+        points = []  # (zip, city, county, municipality, lat, lon) of every row, for the gazetteer
+        counts = {"read": 0, "inserted": 0, "updated": 0, "unchanged": 0, "duplicates": 0, "errors": 0}
+
+        try:
+            fh = open(csv_path, newline="", encoding="utf-8-sig")
+        except OSError as e:
+            raise CommandError(f"Can't open {csv_path}: {e}")
+
+        with fh, transaction.atomic():
+            # Pass 1: which keys several rows share. Only the keys are kept, so
+            # the file is read twice instead of being held in memory
+            shared = {k for k, n in Counter(map(base_key, csv.DictReader(fh))).items() if n > 1}
+            fh.seek(0)
+
+            for row in csv.DictReader(fh):
+                counts["read"] += 1
+                try:
+                    values = shelter_values(row)
+                except Exception as e:
+                    counts["errors"] += 1
+                    self.stderr.write(f"❌ Error on row: {row.get('Name', '[Unnamed]')} → {e}")
+                    continue
+                values["row_hash"] = row_hash(values)
+                # Rows sharing a key are told apart by content rather than file
+                # order, so a reordered file re-imports as unchanged (an edit to
+                # one of them is a delete plus an insert)
+                key = base_key(row)
+                if key in shared:
+                    key = f"{key}#{values['row_hash'][:12]}"
+                if key in seen:
+                    counts["duplicates"] += 1
+                    self.stderr.write(f"⚠️ Skipping duplicate row: {values['name']} ({base_key(row)})")
+                    continue
+                seen.add(key)
+
+                points.append((values["zip_code"], values["city"], values["county"],
+                               (row.get("Municipality") or "").strip(), values["latitude"], values["longitude"]))
+                if existing.get(key) == values["row_hash"]:
+                    counts["unchanged"] += 1
+                    continue
+                counts["updated" if key in existing else "inserted"] += 1
+                batch.append(Shelter(source_key=key, **values))
+
+                if len(batch) >= batch_size:
+                    self._flush(batch)
+                    batch = []
+            self._flush(batch)
+
+            # Rows no longer in the file, plus rows from the old keyless importer
+            stale_keys = [k for k in existing if k not in seen]
+            counts["deleted"], _ = Shelter.objects.filter(source_key=None).delete()
+            for i in range(0, len(stale_keys), 500):
+                deleted, _ = Shelter.objects.filter(source_key__in=stale_keys[i:i + 500]).delete()
+                counts["deleted"] += deleted
+
+            changed = counts["inserted"] or counts["updated"] or counts["deleted"]
+            if changed or not Place.objects.exists():
+                Place.objects.all().delete()
+                Place.objects.bulk_create([Place(**p) for p in build_places(points)], batch_size=batch_size)
+                counts["places"] = Place.objects.count()
+                changed = True
+            if changed:
+                DatasetVersion.bump("shelters")
+
+        if changed and connection.vendor == "sqlite":
+            # Fresh statistics, so the planner picks the right composite index for /api/shelters filters
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE tracker_shelter")
+
+        elapsed = time.perf_counter() - started
+        rate = counts["read"] / elapsed if elapsed else 0
+        self.stdout.write(
+            f"✅ {counts['read']} rows in {elapsed:.2f}s ({rate:,.0f} rows/sec): "
+            f"{counts['inserted']} inserted, {counts['updated']} updated, "
+            f"{counts['unchanged']} unchanged, {counts['deleted']} deleted, "
+            f"{counts['duplicates']} duplicates, {counts['errors']} errors"
+            + (f"; gazetteer rebuilt with {counts['places']} places" if "places" in counts else "")
+        )
+
+    def _flush(self, batch):
+        if batch:
+            Shelter.objects.bulk_create(
+                batch,
+                update_conflicts=True,
+                unique_fields=["source_key"],
+                update_fields=UPDATE_FIELDS,
+            )
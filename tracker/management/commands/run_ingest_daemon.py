@@ -0,0 +1,52 @@
+"""
+Long-running replacement for cron + fetch_storms: runs the tracker.ingest
+schedule in this process until SIGINT/SIGTERM, one JSON line per cycle.
+
+Only for boxes where this process shares STORM_DATA_DIR and the database
+with the web service; elsewhere set INGEST_IN_PROCESS and let the web
+workers run the same schedule (see tracker/ingest.py).
+"""
+import json
+import os
+import signal
+import sys
+import threading
+
+from django.core.management.base import BaseCommand
+
+from tracker import ingest
+
+
+class Command(BaseCommand):
+    help = "Polls NHC and converts new advisories in-process on an advisory-aware schedule"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Run a single cycle and exit")
+        parser.add_argument("--timeout", type=float, default=ingest.TIMEOUT, help="Per-cycle time budget (seconds)")
+        parser.add_argument("--grace", type=float, default=ingest.GRACE,
+                            help="Exit the process if a cycle overruns --timeout by this much")
+        parser.add_argument("--fast-interval", type=float, default=ingest.FAST_INTERVAL,
+                            help="Poll interval around advisory times (seconds)")
+        parser.add_argument("--slow-interval", type=float, default=ingest.SLOW_INTERVAL,
+                            help="Poll interval between advisory windows (seconds)")
+        parser.add_argument("--max-backoff", type=float, default=ingest.MAX_BACKOFF)
+        parser.add_argument("--jitter", type=float, default=ingest.JITTER, help="Fractional +/- jitter on every delay")
+
+    def handle(self, *args, once, timeout, grace, fast_interval, slow_interval, max_backoff, jitter, **options):
+        stop = threading.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: stop.set())
+
+        failures = ingest.run(stop, self._log, self._overrun, once=once, timeout=timeout, grace=grace,
+                              fast_interval=fast_interval, slow_interval=slow_interval,
+                              max_backoff=max_backoff, jitter=jitter)
+        if once and failures:
+            sys.exit(1)
+
+    def _overrun(self, limit):
+        self._log({"event": "ingest_overrun", "limit_s": limit})
+        os._exit(3)
+
+    def _log(self, record):
+        self.stdout.write(json.dumps(record, separators=(",", ":")))
+        self.stdout.flush()
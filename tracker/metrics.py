@@ -0,0 +1,308 @@
+"""
+In-process metrics, aggregated across gunicorn workers, rendered for /metrics.
+
+Each process keeps its counters and histograms in memory, and a daemon
+thread writes them to settings.METRICS_DIR/<pid>.json every FLUSH_INTERVAL
+seconds when something changed. /metrics sums every process's file and
+renders the Prometheus text format, so whichever worker answers sees the
+whole box. When a process is
+gone its file is folded into _retired.json, which keeps the totals
+monotonic across worker restarts without the directory growing forever.
+
+    metrics.observe("nhc_fetch_duration_seconds", 0.42, outcome="ok")
+    metrics.inc("storms_geojson_responses_total", source="snapshot")
+    with metrics.timer("storms_geojson_phase_seconds", phase="scan"):
+        ...
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .locks import interprocess_lock
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+FLUSH_INTERVAL = 1.0  # seconds
+RETIRED = "_retired.json"
+
+# name -> (type, help, buckets)
+METRICS = {
+    "http_request_duration_seconds": (
+        "histogram", "Time from request to response (first byte for streamed bodies), by view.", LATENCY_BUCKETS),
+    "http_response_size_bytes": (
+        "histogram", "Response body size in bytes, by view.", BYTES_BUCKETS),
+    "nhc_fetch_duration_seconds": (
+        "histogram", "CurrentStorms.json upstream fetch time, by outcome.", LATENCY_BUCKETS),
+    "nhc_cache_lookups_total": (
+        "counter", "current_storms() lookups: hit, coalesced, miss, stale or failed_recently.", None),
+    "nhc_breaker_events_total": (
+        "counter", "NHC circuit breaker events: open, probe or close.", None),
+    "geocode_lookups_total": (
+        "counter", "/api/geocode/remote lookups: hit, coalesced, miss (went upstream), rate_limited.", None),
+    "geocode_upstream_duration_seconds": (
+        "histogram", "Remote geocoder request time, by outcome.", LATENCY_BUCKETS),
+    "storms_geojson_phase_seconds": (
+        "histogram", "Time spent in each phase of a live /api/storms.geojson build.", LATENCY_BUCKETS),
+    "storms_geojson_files": (
+        "histogram", "Advisory files read per live /api/storms.geojson build.", (1, 5, 10, 50, 100, 500, 1000, 5000)),
+    "storms_geojson_responses_total": (
+        "counter", "/api/storms.geojson responses by source (snapshot or live).", None),
+    "storm_stream_events_total": (
+        "counter", "/api/storms/stream events: open, close, push (per ingest) or drop (stuck client).", None),
+}
+
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> float
+_histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+_dirty = False
+_pid = None        # process that owns the flusher thread (reset by fork)
+
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    global _dirty
+    with _lock:
+        key = (name, _labels(labels))
+        _counters[key] = _counters.get(key, 0) + amount
+        _dirty = True
+    _ensure_flusher()
+
+
+def observe(name, value, **labels):
+    global _dirty
+    buckets = METRICS[name][2]
+    with _lock:
+        key = (name, _labels(labels))
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [0] * (len(buckets) + 2)
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                h[i] += 1
+        h[-2] += 1
+        h[-1] += value
+        _dirty = True
+    _ensure_flusher()
+
+
+@contextlib.contextmanager
+def timer(name, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+# --- Cross-process aggregation ---
+
+def _metrics_dir():
+    path = Path(settings.METRICS_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _encode(counters, histograms):
+    return {
+        "counters": [[n, list(map(list, lb)), v] for (n, lb), v in counters.items()],
+        "histograms": [[n, list(map(list, lb)), v] for (n, lb), v in histograms.items()],
+    }
+
+
+def _write(path, data):
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(data, separators=(",", ":")), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def flush():
+    """Write this process's metrics to its file now."""
+    global _dirty
+    with _lock:
+        data = _encode(_counters, _histograms)
+        _dirty = False
+    _write(_metrics_dir() / f"{os.getpid()}.json", data)
+
+
+def _flusher():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        if _dirty:
+            try:
+                flush()
+            except OSError:
+                pass
+
+
+def _ensure_flusher():
+    global _pid
+    if _pid == os.getpid():
+        return
+    with _lock:
+        if _pid == os.getpid():
+            return
+        _pid = os.getpid()
+    # First metric in this process (or a fork): tidy up after dead ones
+    try:
+        _retire_dead()
+    except OSError:
+        pass
+    threading.Thread(target=_flusher, name="metrics-flusher", daemon=True).start()
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _merge(into, data):
+    for kind in ("counters", "histograms"):
+        for name, labels, value in data.get(kind, []):
+            key = (name, tuple(tuple(lv) for lv in labels))
+            if kind == "counters":
+                into[kind][key] = into[kind].get(key, 0) + value
+            elif key in into[kind] and len(into[kind][key]) == len(value):
+                into[kind][key] = [a + b for a, b in zip(into[kind][key], value)]
+            else:
+                into[kind][key] = list(value)
+
+
+def _read(path):
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _retire_dead():
+    with interprocess_lock("metrics"):
+        metrics_dir = _metrics_dir()
+        dead = [p for p in metrics_dir.glob("[0-9]*.json") if not _alive(int(p.stem))]
+        if not dead:
+            return
+        totals = {"counters": {}, "histograms": {}}
+        for p in [metrics_dir / RETIRED, *dead]:
+            _merge(totals, _read(p))
+        _write(metrics_dir / RETIRED, _encode(totals["counters"], totals["histograms"]))
+        for p in dead:
+            p.unlink(missing_ok=True)
+
+
+def collect():
+    """Summed {"counters": {...}, "histograms": {...}} over every process on the box."""
+    flush()
+    totals = {"counters": {}, "histograms": {}}
+    with interprocess_lock("metrics"):
+        for p in sorted(_metrics_dir().glob("*.json")):
+            _merge(totals, _read(p))
+    return totals
+
+
+def _fmt_labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _fmt_num(v):
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+
+def render():
+    """Prometheus text exposition (version 0.0.4) of collect()."""
+    totals = collect()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        series = totals["counters" if kind == "counter" else "histograms"]
+        keys = sorted(k for k in series if k[0] == name)
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key in keys:
+            labels = key[1]
+            if kind == "counter":
+                lines.append(f"{name}{_fmt_labels(labels)} {_fmt_num(series[key])}")
+                continue
+            values = series[key]
+            for bound, count in zip(buckets, values):
+                lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', _fmt_num(bound))])} {count}")
+            lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', '+Inf')])} {values[-2]}")
+            lines.append(f"{name}_sum{_fmt_labels(labels)} {values[-1]!r}")
+            lines.append(f"{name}_count{_fmt_labels(labels)} {values[-2]}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Records http_request_duration_seconds and http_response_size_bytes per view."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        return self._record(request, self.get_response(request), started)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        return self._record(request, await self.get_response(request), started)
+
+    def _record(self, request, response, started):
+        match = getattr(request, "resolver_match", None)
+        view = (match.url_name or match.view_name) if match else "unmatched"
+        if view == "metrics":
+            return response
+        observe("http_request_duration_seconds", time.perf_counter() - started,
+                view=view, method=request.method, status=response.status_code)
+
+        if not response.streaming:
+            observe("http_response_size_bytes", len(response.content), view=view)
+        elif response.has_header("Content-Length"):
+            observe("http_response_size_bytes", int(response["Content-Length"]), view=view)
+        elif response.is_async:
+            response.streaming_content = _acounted(response.streaming_content, view)
+        else:
+            response.streaming_content = _counted(response.streaming_content, view)
+        return response
+
+
+def _counted(chunks, view):
+    size = 0
+    try:
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+    finally:
+        observe("http_response_size_bytes", size, view=view)
+
+
+async def _acounted(chunks, view):
+    size = 0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+    finally:
+        observe("http_response_size_bytes", size, view=view)
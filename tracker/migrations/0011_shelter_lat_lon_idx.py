@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-17 04:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0010_datasetversion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shelter',
+            index=models.Index(fields=['latitude', 'longitude'], name='shelter_lat_lon_idx'),
+        ),
+    ]
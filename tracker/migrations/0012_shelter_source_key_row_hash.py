@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-17 04:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0011_shelter_lat_lon_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shelter',
+            name='row_hash',
+            field=models.CharField(blank=True, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='shelter',
+            name='source_key',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.4 on 2026-10-17 05:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0012_shelter_source_key_row_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Advisory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('storm_id', models.CharField(max_length=8)),
+                ('kind', models.CharField(max_length=10)),
+                ('advisory', models.CharField(max_length=5)),
+                ('advisory_rank', models.IntegerField()),
+                ('issue_time', models.DateTimeField()),
+                ('storm_name', models.CharField(blank=True, max_length=100)),
+                ('geojson', models.BinaryField()),
+                ('digest', models.CharField(max_length=40)),
+                ('archived_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='advisory',
+            index=models.Index(fields=['storm_id', 'advisory_rank'], name='advisory_storm_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='advisory',
+            index=models.Index(fields=['issue_time'], name='advisory_issue_time_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='advisory',
+            constraint=models.UniqueConstraint(fields=('storm_id', 'kind', 'advisory'), name='advisory_storm_kind_adv_uniq'),
+        ),
+        # Bounding boxes in (lon, lat, issue time as epoch seconds), kept in
+        # step by tracker.archive; the trigger drops entries for deleted rows
+        migrations.RunSQL(
+            sql=[
+                "CREATE VIRTUAL TABLE tracker_advisory_rtree USING rtree("
+                "id, min_lon, max_lon, min_lat, max_lat, min_t, max_t)",
+                "CREATE TRIGGER tracker_advisory_rtree_delete AFTER DELETE ON tracker_advisory "
+                "BEGIN DELETE FROM tracker_advisory_rtree WHERE id = old.id; END",
+            ],
+            reverse_sql=[
+                "DROP TRIGGER tracker_advisory_rtree_delete",
+                "DROP TABLE tracker_advisory_rtree",
+            ],
+        ),
+    ]
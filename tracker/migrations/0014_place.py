@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-17 05:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0013_advisory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Place',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=12)),
+                ('name', models.CharField(max_length=100)),
+                ('county', models.CharField(blank=True, max_length=100)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('min_lat', models.FloatField()),
+                ('min_lon', models.FloatField()),
+                ('max_lat', models.FloatField()),
+                ('max_lon', models.FloatField()),
+                ('shelter_count', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='place',
+            index=models.Index(fields=['kind', 'name'], name='place_kind_name_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-17 05:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0014_place'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodeResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.CharField(max_length=200, unique=True)),
+                ('results', models.JSONField()),
+                ('fetched_at', models.DateTimeField()),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.2.4 on 2026-10-17 05:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0015_geocoderesult'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shelter',
+            name='flood_risk',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='shelter',
+            name='flood_zone',
+            field=models.CharField(blank=True, max_length=8),
+        ),
+        migrations.AddField(
+            model_name='shelter',
+            name='generator_kw',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='shelter',
+            name='has_generator',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='shelter',
+            name='is_ehpa',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='shelter',
+            name='is_special_needs',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='shelter',
+            name='rain_risk_100yr',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='shelter',
+            name='rain_risk_500yr',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='shelter',
+            name='risk_capacity',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='shelter',
+            name='surge_risk_100yr',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='shelter',
+            name='surge_risk_500yr',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='shelter',
+            name='surge_zone',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='shelter',
+            index=models.Index(fields=['county', 'surge_zone', 'risk_capacity'], name='shelter_county_surge_cap_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shelter',
+            index=models.Index(fields=['surge_zone', 'surge_risk_100yr', 'has_generator', 'risk_capacity'], name='shelter_surge_risk_cap_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shelter',
+            index=models.Index(fields=['has_generator', 'risk_capacity'], name='shelter_generator_cap_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shelter',
+            index=models.Index(fields=['surge_risk_100yr', 'risk_capacity'], name='shelter_risk100_cap_idx'),
+        ),
+    ]
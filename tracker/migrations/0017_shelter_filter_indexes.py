@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-17 06:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0016_shelter_risk'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='shelter',
+            name='shelter_surge_risk_cap_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='shelter',
+            name='shelter_generator_cap_idx',
+        ),
+        migrations.AddIndex(
+            model_name='shelter',
+            index=models.Index(fields=['surge_zone', 'surge_risk_100yr', 'risk_capacity'], name='shelter_surge_risk_cap_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shelter',
+            index=models.Index(fields=['rain_risk_100yr', 'risk_capacity'], name='shelter_rain100_cap_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shelter',
+            index=models.Index(fields=['risk_capacity'], name='shelter_risk_cap_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shelter',
+            index=models.Index(condition=models.Q(('has_generator', True)), fields=['risk_capacity'], name='shelter_generator_cap_idx'),
+        ),
+    ]
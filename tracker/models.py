@@ -1,3 +1,6 @@
+import json
+import zlib
+
 from django.db import models
 
 class Shelter(models.Model):
@@ -13,6 +16,132 @@ class Shelter(models.Model):
     notes = models.TextField(blank=True)
     shelter_type = models.CharField(max_length=100, blank=True)
     status = models.CharField(max_length=100, blank=True)
+    # Risk attributes from the inventory (see tracker.shelter_risk). Flood
+    # risk levels are 0-3 (not affected, low, medium, high), null when blank.
+    surge_zone = models.PositiveSmallIntegerField(null=True, blank=True)  # hurricane category, 0 = outside
+    flood_zone = models.CharField(max_length=8, blank=True)  # FEMA zone ("AE", "0.2%"), "" = none
+    is_ehpa = models.BooleanField(default=False)
+    is_special_needs = models.BooleanField(default=False)
+    has_generator = models.BooleanField(default=False)
+    generator_kw = models.PositiveIntegerField(null=True, blank=True)
+    risk_capacity = models.PositiveIntegerField(null=True, blank=True)  # general-population capacity
+    surge_risk_100yr = models.PositiveSmallIntegerField(null=True, blank=True)
+    surge_risk_500yr = models.PositiveSmallIntegerField(null=True, blank=True)
+    rain_risk_100yr = models.PositiveSmallIntegerField(null=True, blank=True)
+    rain_risk_500yr = models.PositiveSmallIntegerField(null=True, blank=True)
+    flood_risk = models.BigIntegerField(default=0)  # every scenario, 3 bits each
+    # Stable identity from the source inventory ("Asset ID|Building") and a
+    # hash of the imported values, so re-imports only touch changed rows.
+    source_key = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    row_hash = models.CharField(max_length=40, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["latitude", "longitude"], name="shelter_lat_lon_idx"),
+            # /api/shelters filters: equality columns first, the capacity range last
+            models.Index(fields=["county", "surge_zone", "risk_capacity"], name="shelter_county_surge_cap_idx"),
+            models.Index(fields=["surge_zone", "surge_risk_100yr", "risk_capacity"], name="shelter_surge_risk_cap_idx"),
+            models.Index(fields=["surge_risk_100yr", "risk_capacity"], name="shelter_risk100_cap_idx"),
+            models.Index(fields=["rain_risk_100yr", "risk_capacity"], name="shelter_rain100_cap_idx"),
+            models.Index(fields=["risk_capacity"], name="shelter_risk_cap_idx"),
+            # has_generator=True compiles to a bare column test, which only a
+            # partial index with the same condition can serve. The other flags
+            # (ehpa, special_needs, pet_friendly) and generator=0 have no index
+            # and are checked row by row, alone or after one of the above.
+            models.Index(fields=["risk_capacity"], condition=models.Q(has_generator=True),
+                         name="shelter_generator_cap_idx"),
+        ]
 
     def __str__(self):
         return self.name
+
+
+class DatasetVersion(models.Model):
+    """
+    Monotonic version per dataset (e.g. "shelters"), bumped by importers so
+    caches keyed on it turn over when new data lands.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def current(cls, name):
+        return cls.objects.filter(name=name).values_list("version", flat=True).first() or 0
+
+    @classmethod
+    def bump(cls, name):
+        obj, _ = cls.objects.get_or_create(name=name)
+        cls.objects.filter(pk=obj.pk).update(version=models.F("version") + 1)
+        return cls.current(name)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+
+class Place(models.Model):
+    """
+    Gazetteer entry (ZIP, city, county or municipality) derived from the
+    shelter inventory by import_shelters; see tracker.gazetteer.
+    """
+    kind = models.CharField(max_length=12)
+    name = models.CharField(max_length=100)
+    county = models.CharField(max_length=100, blank=True)  # the county it lies in ("" for counties)
+    latitude = models.FloatField()  # mean of its shelters' coordinates
+    longitude = models.FloatField()
+    min_lat = models.FloatField()
+    min_lon = models.FloatField()
+    max_lat = models.FloatField()
+    max_lon = models.FloatField()
+    shelter_count = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["kind", "name"], name="place_kind_name_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.kind})"
+
+
+class GeocodeResult(models.Model):
+    """Cached answer from the remote geocoder for one normalized query (tracker.geocoder)."""
+    query = models.CharField(max_length=200, unique=True)
+    results = models.JSONField()
+    fetched_at = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.query
+
+
+class Advisory(models.Model):
+    """
+    One archived advisory layer (cone, track or points), kept after the storm
+    leaves the feed. Written by tracker.archive, which also maintains the
+    tracker_advisory_rtree spatial index (lon, lat, issue time) keyed on id.
+    """
+    storm_id = models.CharField(max_length=8)
+    kind = models.CharField(max_length=10)
+    advisory = models.CharField(max_length=5)  # as issued, e.g. "012A"
+    advisory_rank = models.IntegerField()  # sortable form: "012A" -> 1201
+    issue_time = models.DateTimeField()
+    storm_name = models.CharField(max_length=100, blank=True)
+    geojson = models.BinaryField()  # zlib-compressed FeatureCollection
+    digest = models.CharField(max_length=40)  # sha1 of the uncompressed GeoJSON
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["storm_id", "kind", "advisory"], name="advisory_storm_kind_adv_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["storm_id", "advisory_rank"], name="advisory_storm_rank_idx"),
+            models.Index(fields=["issue_time"], name="advisory_issue_time_idx"),
+        ]
+
+    def feature_collection(self):
+        return json.loads(zlib.decompress(self.geojson))
+
+    def __str__(self):
+        return f"{self.storm_id} {self.kind} {self.advisory}"
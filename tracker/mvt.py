@@ -0,0 +1,187 @@
+"""
+Minimal Mapbox Vector Tile (spec v2.1) encoder.
+
+Only what /tiles needs: points, lines and polygons already projected into
+integer tile coordinates, with flat scalar properties. Written against the
+protobuf wire format directly so we don't pull in protobuf for one message.
+"""
+import struct
+
+POINT, LINESTRING, POLYGON = 1, 2, 3
+MOVE_TO, LINE_TO, CLOSE_PATH = 1, 2, 7
+
+
+def _varint(n):
+    out = bytearray()
+    while True:
+        b = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+
+def _zigzag(n):
+    return (n << 1) ^ (n >> 63)
+
+
+def _key(field, wire_type):
+    return _varint((field << 3) | wire_type)
+
+
+def _bytes_field(field, payload):
+    return _key(field, 2) + _varint(len(payload)) + payload
+
+
+def _packed(field, values):
+    return _bytes_field(field, b"".join(_varint(v) for v in values))
+
+
+def _command(cmd, count):
+    return (cmd & 0x7) | (count << 3)
+
+
+def _ring_area(ring):
+    """Shoelace area in tile space (y down): positive means clockwise on screen."""
+    a = 0
+    for (x0, y0), (x1, y1) in zip(ring, ring[1:] + ring[:1]):
+        a += x0 * y1 - x1 * y0
+    return a / 2
+
+
+def _encode_path(path, cursor, close):
+    """MoveTo + LineTo(s) [+ ClosePath] for one point sequence."""
+    geom = []
+    x0, y0 = path[0]
+    geom += [_command(MOVE_TO, 1), _zigzag(x0 - cursor[0]), _zigzag(y0 - cursor[1])]
+    cursor = (x0, y0)
+    rest = path[1:]
+    if rest:
+        geom.append(_command(LINE_TO, len(rest)))
+        for x, y in rest:
+            geom += [_zigzag(x - cursor[0]), _zigzag(y - cursor[1])]
+            cursor = (x, y)
+    if close:
+        geom.append(_command(CLOSE_PATH, 1))
+    return geom, cursor
+
+
+def _dedupe(path):
+    out = [path[0]]
+    for p in path[1:]:
+        if p != out[-1]:
+            out.append(p)
+    return out
+
+
+def encode_geometry(geom_type, parts):
+    """
+    parts:
+      POINT      -> [(x, y), ...]
+      LINESTRING -> [[(x, y), ...], ...]
+      POLYGON    -> [[exterior, hole, ...], ...]   (rings unclosed or closed)
+    Returns the command/parameter integers, or [] if nothing survives.
+    """
+    cursor = (0, 0)
+    geom = []
+    if geom_type == POINT:
+        if not parts:
+            return []
+        geom.append(_command(MOVE_TO, len(parts)))
+        for x, y in parts:
+            geom += [_zigzag(x - cursor[0]), _zigzag(y - cursor[1])]
+            cursor = (x, y)
+        return geom
+
+    if geom_type == LINESTRING:
+        for line in parts:
+            line = _dedupe(line)
+            if len(line) < 2:
+                continue
+            g, cursor = _encode_path(line, cursor, close=False)
+            geom += g
+        return geom
+
+    for polygon in parts:
+        rings = []
+        for i, ring in enumerate(polygon):
+            ring = _dedupe(ring)
+            if len(ring) > 1 and ring[0] == ring[-1]:
+                ring = ring[:-1]
+            if len(ring) < 3 or _ring_area(ring) == 0:
+                if i == 0:
+                    break  # exterior collapsed; drop the whole polygon
+                continue
+            # exterior rings clockwise on screen, holes counter-clockwise
+            clockwise = _ring_area(ring) > 0
+            if clockwise != (i == 0):
+                ring = ring[::-1]
+            rings.append(ring)
+        for ring in rings:
+            g, cursor = _encode_path(ring, cursor, close=True)
+            geom += g
+    return geom
+
+
+def _encode_value(v):
+    if isinstance(v, bool):
+        return _key(7, 0) + _varint(int(v))
+    if isinstance(v, int):
+        if v >= 0:
+            return _key(5, 0) + _varint(v)
+        return _key(6, 0) + _varint(_zigzag(v))
+    if isinstance(v, float):
+        return _key(3, 1) + struct.pack("<d", v)
+    return _bytes_field(1, str(v).encode("utf-8"))
+
+
+def encode_layer(name, features, extent=4096):
+    """
+    features: iterable of dicts with "type" (POINT/LINESTRING/POLYGON),
+    "geometry" (encode_geometry() parts), "properties" and optional "id".
+    """
+    keys, key_index = [], {}
+    values, value_index = [], {}
+    body = bytearray()
+
+    for feat in features:
+        geometry = encode_geometry(feat["type"], feat["geometry"])
+        if not geometry:
+            continue
+        tags = []
+        for k, v in (feat.get("properties") or {}).items():
+            if v is None:
+                continue
+            if k not in key_index:
+                key_index[k] = len(keys)
+                keys.append(k)
+            vkey = (type(v), v)
+            if vkey not in value_index:
+                value_index[vkey] = len(values)
+                values.append(v)
+            tags += [key_index[k], value_index[vkey]]
+
+        msg = bytearray()
+        if feat.get("id") is not None:
+            msg += _key(1, 0) + _varint(int(feat["id"]))
+        if tags:
+            msg += _packed(2, tags)
+        msg += _key(3, 0) + _varint(feat["type"])
+        msg += _packed(4, geometry)
+        body += _bytes_field(2, bytes(msg))
+
+    if not body:
+        return b""
+
+    layer = bytearray()
+    layer += _key(15, 0) + _varint(2)
+    layer += _bytes_field(1, name.encode("utf-8"))
+    layer += body
+    for k in keys:
+        layer += _bytes_field(3, k.encode("utf-8"))
+    for v in values:
+        layer += _bytes_field(4, _encode_value(v))
+    layer += _key(5, 0) + _varint(extent)
+    return _bytes_field(3, bytes(layer))
@@ -0,0 +1,301 @@
+"""
+Shared client for https://www.nhc.noaa.gov/CurrentStorms.json
+
+Every view goes through current_storms() instead of calling NHC itself:
+  - the parsed storm list lives in the Django cache (file-based, so all
+    gunicorn workers see the same copy) for settings.NHC_CACHE_TTL seconds
+  - concurrent misses are coalesced: one thread per process, and one process
+    per box, goes upstream while the others wait for its result
+  - upstream calls reuse one pooled requests.Session per process
+  - every good payload is also kept without expiry, and served marked stale
+    when NHC fails; after repeated failures a circuit breaker stops requests
+    going upstream at all, and one background probe at a time checks for
+    recovery (state shared by all workers through the cache)
+
+Async views use acurrent_storms(), which shares the same cache keys and
+interprocess lock but goes upstream through a pooled httpx.AsyncClient
+(tracker.http, one per event loop) and never blocks the loop while waiting.
+Concurrent misses in a process share one in-flight task.
+"""
+import asyncio
+import logging
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+from .http import async_client, in_thread, outcome
+from .locks import ainterprocess_lock, interprocess_lock
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "hurricane-tracker (+https://hurricane-tracker.onrender.com)"
+CACHE_KEY = "nhc:current_storms"
+LAST_GOOD_KEY = "nhc:current_storms:last_good"  # {"storms": [...], "fetched_at": epoch}, never expires
+BREAKER_KEY = "nhc:breaker"  # {"failures": consecutive failed fetches, "retry_at": epoch}
+FILL_LOCK = "nhc-current-storms"
+
+_session = None
+_session_lock = threading.Lock()
+_fetch_lock = threading.Lock()
+_async_inflight = weakref.WeakKeyDictionary()  # loop -> Task filling the cache
+
+
+class UpstreamUnavailable(Exception):
+    """NHC could not be reached and there is no earlier copy to fall back on."""
+
+
+def get_session():
+    """One pooled HTTP session per process."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=0)
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                s.headers["User-Agent"] = USER_AGENT
+                _session = s
+    return _session
+
+
+def normalize_storms(obj):
+    """Accept either {"activeStorms": [...]} or a raw list [...]."""
+    if isinstance(obj, dict):
+        arr = obj.get("activeStorms", [])
+    elif isinstance(obj, list):
+        arr = obj
+    else:
+        arr = []
+    return [s for s in arr if isinstance(s, dict)]
+
+
+def _fetch():
+    url = settings.NHC_CURRENT_STORMS_URL
+    session = get_session()
+    try:
+        r = session.get(url, timeout=settings.NHC_TIMEOUT)
+    except requests.exceptions.SSLError:
+        if not settings.DEBUG:
+            raise
+        # One retry for dev SSL hiccups
+        r = session.get(url, timeout=settings.NHC_TIMEOUT, verify=False)
+        logger.warning("succeeded on retry with verify=False (dev-only)")
+    r.raise_for_status()
+    return normalize_storms(r.json())
+
+
+class CurrentStorms(list):
+    """
+    The storm list returned by current_storms(). When NHC can't be reached
+    it's the last good copy instead, with .stale set and .fetched_at the
+    epoch seconds it was fetched at.
+    """
+
+    def __init__(self, storms, stale=False, fetched_at=None):
+        super().__init__(storms)
+        self.stale = stale
+        self.fetched_at = fetched_at
+
+
+def _breaker():
+    return cache.get(BREAKER_KEY) or {"failures": 0, "retry_at": 0}
+
+
+def _stale():
+    """The last good copy, or UpstreamUnavailable if there has never been one."""
+    last = cache.get(LAST_GOOD_KEY)
+    if last is None:
+        metrics.inc("nhc_cache_lookups_total", result="failed_recently")
+        raise UpstreamUnavailable("upstream failing and no earlier copy")
+    metrics.inc("nhc_cache_lookups_total", result="stale")
+    return CurrentStorms(last["storms"], stale=True, fetched_at=last["fetched_at"])
+
+
+def _cached():
+    """Fresh storms, the last good copy while upstream is cooling down, or None if it's time to fetch."""
+    storms = cache.get(CACHE_KEY)
+    if storms is not None:
+        metrics.inc("nhc_cache_lookups_total", result="hit")
+        return CurrentStorms(storms)
+    if time.time() < _breaker()["retry_at"]:
+        return _stale()
+    return None
+
+
+def _next_step():
+    """
+    Decide, holding the fill lock, what a cache miss does:
+    ("coalesced", storms), ("fetch", None), ("probe", None) or ("wait", None).
+    """
+    storms = cache.get(CACHE_KEY)
+    if storms is not None:
+        return "coalesced", storms
+    breaker = _breaker()
+    if time.time() < breaker["retry_at"]:
+        return "wait", None
+    if breaker["failures"] >= settings.NHC_BREAKER_FAILURES:
+        # Circuit open: claim this cooldown's single probe for the whole box
+        cache.set(BREAKER_KEY, {**breaker, "retry_at": time.time() + settings.NHC_BREAKER_COOLDOWN}, None)
+        metrics.inc("nhc_breaker_events_total", event="probe")
+        return "probe", None
+    return "fetch", None
+
+
+def _failed(exc, started):
+    """Record a failed fetch; call with the fill lock held."""
+    metrics.observe("nhc_fetch_duration_seconds", time.perf_counter() - started, outcome=outcome(exc))
+    breaker = _breaker()
+    failures = breaker["failures"] + 1
+    tripped = failures >= settings.NHC_BREAKER_FAILURES
+    wait = settings.NHC_BREAKER_COOLDOWN if tripped else settings.NHC_FAILURE_TTL
+    cache.set(BREAKER_KEY, {"failures": failures, "retry_at": time.time() + wait}, None)
+    logger.warning("fetch failed: %s", exc)
+    if tripped and breaker["failures"] < settings.NHC_BREAKER_FAILURES:
+        metrics.inc("nhc_breaker_events_total", event="open")
+        logger.warning("circuit open after %d failures; serving the last good copy", failures)
+
+
+def _succeeded(storms, started):
+    """Store a good fetch and close the circuit; call with the fill lock held."""
+    metrics.observe("nhc_fetch_duration_seconds", time.perf_counter() - started, outcome="ok")
+    cache.set(CACHE_KEY, storms, settings.NHC_CACHE_TTL)
+    cache.set(LAST_GOOD_KEY, {"storms": storms, "fetched_at": time.time()}, None)
+    failures = _breaker()["failures"]
+    if failures:
+        cache.delete(BREAKER_KEY)
+    if failures >= settings.NHC_BREAKER_FAILURES:
+        metrics.inc("nhc_breaker_events_total", event="close")
+        logger.info("upstream recovered; circuit closed")
+
+
+def _start_probe():
+    # A thread rather than a task, so it outlives the throwaway event loop
+    # async views get when served under WSGI
+    threading.Thread(target=_probe, name="nhc-probe", daemon=True).start()
+
+
+def _probe():
+    started = time.perf_counter()
+    try:
+        storms = _fetch()
+    except Exception as e:
+        with interprocess_lock(FILL_LOCK):
+            _failed(e, started)
+        return
+    with interprocess_lock(FILL_LOCK):
+        _succeeded(storms, started)
+
+
+def current_storms():
+    """
+    Return the list of active storm dicts from CurrentStorms.json, as a
+    CurrentStorms list.
+
+    If NHC can't be reached, returns the last good copy marked .stale, and
+    callers queued behind the failure don't each wait out their own
+    timeout: no one retries for settings.NHC_FAILURE_TTL seconds. After
+    settings.NHC_BREAKER_FAILURES failures in a row the circuit opens:
+    requests get the last good copy straight away and a single background
+    probe per settings.NHC_BREAKER_COOLDOWN checks whether NHC is back.
+    Raises UpstreamUnavailable only when there's no earlier copy to serve.
+    """
+    storms = _cached()
+    if storms is not None:
+        return storms
+
+    with _fetch_lock:
+        with interprocess_lock(FILL_LOCK):
+            # Someone else may have filled the cache (or failed) while we waited
+            step, storms = _next_step()
+            if step == "coalesced":
+                metrics.inc("nhc_cache_lookups_total", result="coalesced")
+                return CurrentStorms(storms)
+            if step == "fetch":
+                metrics.inc("nhc_cache_lookups_total", result="miss")
+                started = time.perf_counter()
+                try:
+                    storms = _fetch()
+                except Exception as e:
+                    _failed(e, started)
+                else:
+                    _succeeded(storms, started)
+                    return CurrentStorms(storms)
+            elif step == "probe":
+                _start_probe()
+            return _stale()
+
+
+def get_async_client():
+    """The pooled httpx.AsyncClient for NHC on the running event loop."""
+    return async_client(
+        "nhc",
+        headers={"User-Agent": USER_AGENT},
+        limits=httpx.Limits(max_connections=8, max_keepalive_connections=4),
+        timeout=settings.NHC_TIMEOUT,
+    )
+
+
+async def _afetch():
+    url = settings.NHC_CURRENT_STORMS_URL
+    try:
+        r = await get_async_client().get(url)
+    except httpx.ConnectError as e:
+        if not settings.DEBUG or "CERTIFICATE" not in str(e).upper():
+            raise
+        # One retry for dev SSL hiccups
+        async with httpx.AsyncClient(verify=False, timeout=settings.NHC_TIMEOUT) as insecure:
+            r = await insecure.get(url)
+        logger.warning("succeeded on retry with verify=False (dev-only)")
+    r.raise_for_status()
+    return normalize_storms(r.json())
+
+
+async def acurrent_storms():
+    """
+    current_storms() for async views; same cache, same circuit, same errors.
+    Concurrent misses in one process await a single shared task instead of
+    queueing.
+    """
+    storms = await in_thread(_cached)()
+    if storms is not None:
+        return storms
+
+    loop = asyncio.get_running_loop()
+    task = _async_inflight.get(loop)
+    if task is None:
+        task = _async_inflight[loop] = loop.create_task(_afill())
+        task.add_done_callback(lambda _: _async_inflight.pop(loop, None))
+    else:
+        metrics.inc("nhc_cache_lookups_total", result="coalesced")
+    # shield: one impatient client disconnecting mustn't cancel everyone's fetch
+    return await asyncio.shield(task)
+
+
+async def _afill():
+    async with ainterprocess_lock(FILL_LOCK):
+        # Another worker may have filled the cache (or failed) while we waited
+        step, storms = await in_thread(_next_step)()
+        if step == "coalesced":
+            metrics.inc("nhc_cache_lookups_total", result="coalesced")
+            return CurrentStorms(storms)
+        if step == "fetch":
+            metrics.inc("nhc_cache_lookups_total", result="miss")
+            started = time.perf_counter()
+            try:
+                storms = await _afetch()
+            except Exception as e:
+                await in_thread(_failed)(e, started)
+            else:
+                await in_thread(_succeeded)(storms, started)
+                return CurrentStorms(storms)
+        elif step == "probe":
+            _start_probe()
+        return await in_thread(_stale)()
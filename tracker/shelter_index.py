@@ -0,0 +1,132 @@
+"""
+Per-process spatial index over Shelter coordinates.
+
+Rows are held in NumPy arrays sorted by latitude, so a radius query is a
+binary search for the latitude band, a longitude mask over that band and a
+vectorized haversine over what's left. Polygon queries go through an STRtree
+of the same points, built on first use. The index is rebuilt when the
+"shelters" DatasetVersion changes (i.e. after an import).
+"""
+import math
+import threading
+
+import numpy as np
+import shapely
+from shapely import STRtree
+
+from .models import DatasetVersion, Shelter
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEG_LAT = 111.32
+
+_index = None
+_index_lock = threading.Lock()
+
+
+class ShelterIndex:
+    def __init__(self, version, ids, lat, lon, pets):
+        order = np.argsort(lat, kind="stable")
+        self.version = version
+        self.ids = ids[order]
+        self.lat = lat[order]
+        self.lon = lon[order]
+        self.pets = pets[order]
+        self._tree = None
+        self._tree_lock = threading.Lock()
+
+    @classmethod
+    def build(cls, version):
+        rows = list(
+            Shelter.objects.filter(latitude__isnull=False, longitude__isnull=False)
+            .values_list("id", "latitude", "longitude", "is_pet_friendly")
+            .iterator(chunk_size=5000)
+        )
+        if rows:
+            ids, lat, lon, pets = (np.asarray(col) for col in zip(*rows))
+        else:
+            ids, lat, lon, pets = np.empty(0, np.int64), np.empty(0), np.empty(0), np.empty(0, bool)
+        return cls(
+            version,
+            ids.astype(np.int64),
+            lat.astype(np.float64),
+            lon.astype(np.float64),
+            pets.astype(bool),
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def nearby(self, lat, lon, radius_km, k=None, pet_friendly=None):
+        """
+        Shelters within radius_km of (lat, lon), nearest first.
+        Returns (ids, distances_km) as NumPy arrays, at most k long.
+        """
+        dlat = radius_km / KM_PER_DEG_LAT
+        lo, hi = np.searchsorted(self.lat, [lat - dlat, lat + dlat + 1e-12])
+        if lo == hi:
+            return self.ids[:0], np.empty(0)
+
+        cand_lat = self.lat[lo:hi]
+        cand_lon = self.lon[lo:hi]
+        mask = np.ones(hi - lo, dtype=bool)
+
+        cos_lat = math.cos(math.radians(min(abs(lat) + dlat, 89.9)))
+        dlon = radius_km / (KM_PER_DEG_LAT * cos_lat)
+        if dlon < 180:
+            # wrap-aware longitude difference
+            mask &= np.abs((cand_lon - lon + 180) % 360 - 180) <= dlon
+        if pet_friendly is not None:
+            mask &= self.pets[lo:hi] == pet_friendly
+
+        idx = np.nonzero(mask)[0]
+        if not len(idx):
+            return self.ids[:0], np.empty(0)
+
+        dist = haversine_km(lat, lon, cand_lat[idx], cand_lon[idx])
+        keep = dist <= radius_km
+        idx, dist = idx[keep], dist[keep]
+
+        if k is not None and k < len(dist):
+            part = np.argpartition(dist, k)[:k]
+            idx, dist = idx[part], dist[part]
+        order = np.argsort(dist, kind="stable")
+        return self.ids[lo:hi][idx[order]], dist[order]
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            with self._tree_lock:
+                if self._tree is None:
+                    self._tree = STRtree(shapely.points(self.lon, self.lat))
+        return self._tree
+
+    def within(self, area):
+        """Ids of shelters inside (or on the edge of) a lon/lat geometry."""
+        if area.is_empty or not len(self):
+            return self.ids[:0]
+        shapely.prepare(area)
+        hits = self.tree.query(area, predicate="intersects")
+        return self.ids[np.sort(hits)]
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distance from one point to arrays of points."""
+    phi1 = math.radians(lat)
+    phi2 = np.radians(lats)
+    dphi = phi2 - phi1
+    dlmb = np.radians(lons - lon)
+    a = np.sin(dphi / 2) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def get_index():
+    """The index for the current shelter import, built on first use."""
+    global _index
+    version = DatasetVersion.current("shelters")
+    idx = _index
+    if idx is not None and idx.version == version:
+        return idx
+    with _index_lock:
+        if _index is None or _index.version != version:
+            _index = ShelterIndex.build(version)
+        return _index
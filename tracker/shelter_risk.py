@@ -0,0 +1,135 @@
+"""
+Risk attributes of the FDEM shelter inventory, as stored on Shelter.
+
+risk_shelters.csv rates every site under 21 flood scenarios (coastal tidal,
+100/500-year storm surge and 100/500-year rainfall, now and under sea-level
+projections) as Not Affected / Low / Medium / High. Those levels are stored
+as small ints (LEVELS order, None when the cell is blank):
+
+  - the four present-day scenarios people filter on get their own indexed
+    columns (Shelter.surge_risk_100yr, ... ; COLUMN_SCENARIOS)
+  - all 21 are packed 3 bits each into Shelter.flood_risk (pack/unpack),
+    so the projections ride along in one BIGINT instead of 21 columns
+
+SURGE_ZONE is the lowest hurricane category whose surge reaches the site
+(0 when it's outside every surge zone).
+"""
+import re
+
+LEVELS = ("not_affected", "low", "medium", "high")
+
+# (key, CSV column); the order fixes each scenario's bits in Shelter.flood_risk
+SCENARIOS = (
+    ("coastal_2020", "Coastal Tidal Flood Risk - 2020"),
+    ("coastal_2040_int_low", "Coastal Tidal Flood Risk - 2040 Intermediate-Low"),
+    ("coastal_2040_int", "Coastal Tidal Flood Risk - 2040 Intermediate"),
+    ("coastal_2070_int_low", "Coastal Tidal Flood Risk - 2070 Intermediate-Low"),
+    ("coastal_2070_int", "Coastal Tidal Flood Risk - 2070 Intermediate"),
+    ("surge_100yr", "Storm Surge Flood Risk - 100-Year Current"),
+    ("surge_100yr_2040_int_low", "Storm Surge Flood Risk - 100-Year 2040 Intermediate-Low"),
+    ("surge_100yr_2040_int", "Storm Surge Flood Risk - 100-Year 2040 Intermediate"),
+    ("surge_100yr_2070_int_low", "Storm Surge Flood Risk - 100-Year 2070 Intermediate-Low"),
+    ("surge_100yr_2070_int", "Storm Surge Flood Risk - 100-Year 2070 Intermediate"),
+    ("surge_500yr", "Storm Surge Flood Risk - 500-Year Current"),
+    ("surge_500yr_2040_int_low", "Storm Surge Flood Risk - 500-Year 2040 Intermediate-Low"),
+    ("surge_500yr_2040_int", "Storm Surge Flood Risk - 500-Year 2040 Intermediate"),
+    ("surge_500yr_2070_int_low", "Storm Surge Flood Risk - 500-Year 2070 Intermediate-Low"),
+    ("surge_500yr_2070_int", "Storm Surge Flood Risk - 500-Year 2070 Intermediate"),
+    ("rain_100yr", "Rainfall-Induced Flood Risk - 100-Year 2020"),
+    ("rain_100yr_2040", "Rainfall-Induced Flood Risk - 100-Year 2040"),
+    ("rain_100yr_2070", "Rainfall-Induced Flood Risk - 100-Year 2070"),
+    ("rain_500yr", "Rainfall-Induced Flood Risk - 500-Year 2020"),
+    ("rain_500yr_2040", "Rainfall-Induced Flood Risk - 500-Year 2040"),
+    ("rain_500yr_2070", "Rainfall-Induced Flood Risk - 500-Year 2070"),
+)
+COLUMN_SCENARIOS = {  # Shelter field -> scenario key
+    "surge_risk_100yr": "surge_100yr",
+    "surge_risk_500yr": "surge_500yr",
+    "rain_risk_100yr": "rain_100yr",
+    "rain_risk_500yr": "rain_500yr",
+}
+BITS = 3  # 0 = blank, else level + 1; 21 * 3 = 63 bits fits a signed BIGINT
+
+KW_RE = re.compile(r"(\d[\d,]*)\s*kw", re.IGNORECASE)
+
+
+def parse_level(text):
+    """'Not Affected' / 'low' / '2' -> 0..3, None for blank; ValueError otherwise."""
+    text = str(text or "").strip().lower().replace(" ", "_").replace("-", "_")
+    if not text:
+        return None
+    if text.isdigit() and int(text) < len(LEVELS):
+        return int(text)
+    try:
+        return LEVELS.index(text)
+    except ValueError:
+        raise ValueError(f"unknown flood risk level {text!r} (expected one of {', '.join(LEVELS)})") from None
+
+
+def level_name(level):
+    return None if level is None else LEVELS[level]
+
+
+def pack(levels):
+    """{scenario key: level or None} -> the Shelter.flood_risk integer."""
+    packed = 0
+    for i, (key, _) in enumerate(SCENARIOS):
+        level = levels.get(key)
+        if level is not None:
+            packed |= (level + 1) << (i * BITS)
+    return packed
+
+
+def unpack(packed):
+    """Shelter.flood_risk -> {scenario key: level name or None}."""
+    packed = packed or 0
+    out = {}
+    for i, (key, _) in enumerate(SCENARIOS):
+        code = (packed >> (i * BITS)) & ((1 << BITS) - 1)
+        out[key] = LEVELS[code - 1] if code else None
+    return out
+
+
+def parse_surge_zone(text):
+    """SURGE_ZONE -> 0 (no zone), 1..5, or None when blank."""
+    text = str(text or "").strip().lower()
+    if not text:
+        return None
+    if text in ("no", "none", "0"):
+        return 0
+    if text == "5-apr":
+        return 4  # "4-5" after a trip through Excel; the lower category is the one that floods it
+    zone = int(text.split("-")[0])
+    if not 1 <= zone <= 5:
+        raise ValueError(f"surge zone {text!r} out of range")
+    return zone
+
+
+def parse_generator(text):
+    """Generator_ -> (has_generator, kW or None): "230 KW for campus" -> (True, 230)."""
+    text = str(text or "").strip()
+    if not text or text.lower() in ("no", "none"):
+        return False, None
+    m = KW_RE.search(text)
+    return True, int(m.group(1).replace(",", "")) if m else None
+
+
+def row_values(row):
+    """The risk fields of Shelter for one risk_shelters.csv row."""
+    levels = {key: parse_level(row.get(column)) for key, column in SCENARIOS}
+    has_generator, generator_kw = parse_generator(row.get("Generator_"))
+    flood_zone = (row.get("FLOOD_ZONE") or "").strip()
+    risk_capacity = (row.get("Risk_Capac") or "").strip()
+    values = {
+        "surge_zone": parse_surge_zone(row.get("SURGE_ZONE")),
+        "flood_zone": "" if flood_zone.lower() == "no" else flood_zone.replace("0.20%", "0.2%"),
+        "is_ehpa": (row.get("EHPA") or "").strip().lower() == "yes",
+        "is_special_needs": (row.get("SPECIAL_NE") or "").strip().lower() == "yes",
+        "has_generator": has_generator,
+        "generator_kw": generator_kw,
+        "risk_capacity": int(risk_capacity) if risk_capacity.isdigit() else None,
+        "flood_risk": pack(levels),
+    }
+    for field, key in COLUMN_SCENARIOS.items():
+        values[field] = levels[key]
+    return values
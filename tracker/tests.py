@@ -1,3 +1,1994 @@
-from django.test import TestCase
+import asyncio
+import csv
+import datetime as dt
+import functools
+import gzip
+import io
+import json
+import math
+import os
+import re
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import requests
+import shapely
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import FileResponse, QueryDict
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+import download_storms
+from benchmarks.fake_geocoder import FakeGeocoder
+
+from . import (advisories, archive, columnar, events, gazetteer, geocoder, http, ingest, metrics, mvt, nhc,
+               shelter_index, tiles, views)
+from .models import Advisory, DatasetVersion, GeocodeResult, Place, Shelter
+
+
+def setUpModule():
+    # What the views under test record goes to a scratch directory, not the real METRICS_DIR
+    tmp = tempfile.TemporaryDirectory()
+    unittest.addModuleCleanup(tmp.cleanup)
+    scratch = override_settings(METRICS_DIR=Path(tmp.name))
+    scratch.enable()
+    unittest.addModuleCleanup(scratch.disable)
+    unittest.addModuleCleanup(metrics.flush)  # cleanups run last-in first-out: before the override goes
+
+
+def _point(name, lon=-80.0, lat=25.0):
+    return {"type": "Feature", "geometry": {"type": "Point", "coordinates": [lon, lat]},
+            "properties": {"name": name}}
+
+
+def _write_geojson(path, *features):
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": list(features)}), encoding="utf-8")
+
+
+class FeatureCacheTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.path = self.dir / "al012025_cone_001.geojson"
+        _write_geojson(self.path, _point("AAAA"))
+        self.cache = advisories.FeatureCache(max_bytes=1 << 20)
+
+    def lookup(self, name_lookup=None):
+        timings = {}
+        features = self.cache.features(self.path, name_lookup or {}, {}, timings)
+        return features, "parse" in timings
+
+    def test_unchanged_file_is_not_parsed_again(self):
+        first, parsed = self.lookup()
+        self.assertTrue(parsed)
+        second, parsed = self.lookup()
+        self.assertFalse(parsed)
+        self.assertIs(first, second)
+
+    def test_atomic_replace_with_same_size_and_mtime_is_reloaded(self):
+        self.lookup()
+        st = self.path.stat()
+        tmp = self.dir / "replacement.tmp"
+        _write_geojson(tmp, _point("BBBB"))
+        os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.replace(tmp, self.path)
+        self.assertEqual(self.path.stat().st_size, st.st_size)
+
+        features, parsed = self.lookup()
+        self.assertTrue(parsed)
+        self.assertEqual(features[0]["properties"]["name"], "BBBB")
+
+    def test_rewrite_in_place_is_reloaded(self):
+        self.lookup()
+        _write_geojson(self.path, _point("CCCC"), _point("DDDD"))
+        features, parsed = self.lookup()
+        self.assertTrue(parsed)
+        self.assertEqual(len(features), 2)
+
+    def test_new_storm_name_reenriches_without_parsing(self):
+        self.lookup()
+        features, parsed = self.lookup({"al012025": {"name": "Andrea", "type": "TS"}})
+        self.assertFalse(parsed)
+        self.assertEqual(features[0]["properties"]["stormName"], "AAAA")
+        self.assertEqual(features[0]["properties"]["status"], "TS")
+
+    def test_eviction_keeps_size_under_limit(self):
+        cost = self.path.stat().st_size * advisories.FeatureCache.PARSED_SIZE_FACTOR
+        cache = advisories.FeatureCache(max_bytes=cost * 2)
+        for i in range(5):
+            path = self.dir / f"al0{i}2025_track_001.geojson"
+            _write_geojson(path, _point("EEEE"))
+            cache.features(path, {}, {})
+        self.assertLessEqual(cache.size, cache.max_bytes)
+        self.assertEqual(len(cache), 2)
+
+
+class LegacyStormMapTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        for name in ("al012025_cone_002", "al012025_cone_010", "al012025_cone_009",
+                     "al012025_track_009", "al012025_track_002"):
+            _write_geojson(self.dir / f"{name}.geojson", _point(name))
+        patcher = mock.patch.object(views, "STORMS_DIR", self.dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_newest_file_per_kind_regardless_of_listing_order(self):
+        storm = views._legacy_storm_map([{"id": "AL012025", "name": "Andrea"}])["al012025"]
+        self.assertEqual(storm["name"], "Andrea")
+        self.assertEqual(storm["advisory"], "010")
+        self.assertEqual(storm["cone"], "/static/tracker/data/al012025_cone_010.geojson")
+        self.assertEqual(storm["track"], "/static/tracker/data/al012025_track_009.geojson")
+
+    def test_points_at_published_copies(self):
+        manifest = advisories.publish_files(self.dir)
+        storm = views._legacy_storm_map([])["al012025"]
+        self.assertEqual(storm["name"], "Unnamed Storm (AL012025)")
+        self.assertEqual(storm["cone"], reverse("storm_file", args=[manifest["al012025_cone_010.geojson"]["file"]]))
+
+
+def _shelter(name, **values):
+    defaults = {"address": "1 Main St", "city": "Fort Myers", "zip_code": "33901", "county": "Lee",
+                "latitude": 26.6, "longitude": -81.9}
+    return Shelter.objects.create(name=name, **{**defaults, **values})
+
+
+class ShelterFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        _shelter("A", surge_zone=0, has_generator=True, risk_capacity=800, surge_risk_100yr=0, rain_risk_100yr=3)
+        _shelter("B", surge_zone=3, has_generator=False, risk_capacity=1600, surge_risk_100yr=2, is_ehpa=True)
+        _shelter("C", county="Miami-Dade", surge_zone=0, has_generator=True, risk_capacity=200)
+        _shelter("D", county="LEE", risk_capacity=None)
+        DatasetVersion.bump("shelters")
+
+    def setUp(self):
+        patcher = mock.patch.object(views, "_counties", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def names(self, query):
+        qs = views._shelter_filters(QueryDict(query), Shelter.objects.order_by("name"))
+        return list(qs.values_list("name", flat=True))
+
+    def test_each_filter(self):
+        self.assertEqual(self.names("generator=1"), ["A", "C"])
+        self.assertEqual(self.names("generator=no"), ["B", "D"])
+        self.assertEqual(self.names("ehpa=1"), ["B"])
+        self.assertEqual(self.names("min_capacity=800"), ["A", "B"])
+        self.assertEqual(self.names("surge_zone=none"), ["A", "C"])
+        self.assertEqual(self.names("surge_zone=3,5"), ["B"])
+        self.assertEqual(self.names("surge_risk_100yr=medium,high"), ["B"])
+        self.assertEqual(self.names("rain_risk_100yr=high"), ["A"])
+
+    def test_filters_combine(self):
+        self.assertEqual(self.names("county=lee&surge_zone=none&generator=1&min_capacity=500"), ["A"])
+
+    def test_county_matches_every_stored_spelling(self):
+        self.assertEqual(self.names("county=lee"), ["A", "B", "D"])
+        self.assertEqual(self.names("county=miami-dade,nowhere"), ["C"])
+        self.assertEqual(self.names("county=nowhere"), [])
+
+    def test_county_list_follows_the_import_version(self):
+        self.assertEqual(self.names("county=collier"), [])
+        _shelter("E", county="Collier")
+        self.assertEqual(self.names("county=collier"), [])  # same import: cached list
+        DatasetVersion.bump("shelters")
+        self.assertEqual(self.names("county=collier"), ["E"])
+
+    def test_bad_values_are_400s(self):
+        client = Client()
+        for query, message in [
+            ("surge_zone=7", "surge_zone"),
+            ("surge_risk_100yr=severe", "unknown flood risk level"),
+            ("generator=maybe", "generator must be 1 or 0"),
+            ("min_capacity=lots", "min_capacity must be an integer"),
+        ]:
+            with self.subTest(query=query):
+                resp = client.get(f"/api/shelters/?{query}", secure=True)
+                self.assertEqual(resp.status_code, 400)
+                self.assertIn(message, resp.json()["error"])
+
+    def test_list_endpoint_applies_filters(self):
+        resp = Client().get("/api/shelters/?generator=1&fields=name,has_generator", secure=True)
+        self.assertEqual(resp.status_code, 200)
+        rows = json.loads(b"".join(resp.streaming_content))
+        self.assertEqual(sorted(r["name"] for r in rows), ["A", "C"])
+
+
+class ShelterListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ids = [
+            _shelter("Naples", latitude=26.14, longitude=-81.79, capacity=300, is_pet_friendly=True).id,
+            _shelter("Tampa", latitude=27.95, longitude=-82.46, capacity=1200, surge_zone=2).id,
+            _shelter("Miami", latitude=25.76, longitude=-80.19, capacity=None).id,
+            _shelter("Tallahassee", latitude=30.44, longitude=-84.28, capacity=800).id,
+        ]
+        DatasetVersion.bump("shelters")
+
+    def get(self, query="", **headers):
+        return Client().get(f"/api/shelters/?{query}", secure=True, headers=headers)
+
+    def rows(self, resp):
+        self.assertTrue(resp.streaming)
+        body = b"".join(resp.streaming_content)
+        if resp.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        return json.loads(body)
+
+    def test_streams_every_public_field_in_id_order(self):
+        rows = self.rows(self.get())
+        self.assertEqual([r["name"] for r in rows], ["Naples", "Tampa", "Miami", "Tallahassee"])
+        self.assertEqual(set(rows[0]), set(views.SHELTER_FIELDS))
+        self.assertEqual((rows[0]["capacity"], rows[0]["is_pet_friendly"]), (300, True))
+
+    def test_empty_result_is_an_empty_array(self):
+        self.assertEqual(self.rows(self.get("bbox=0,0,1,1")), [])
+
+    def test_stream_is_valid_json_across_batches(self):
+        rows = list(views._stream_json_rows(("id",), ((i,) for i in range(7)), batch=3))
+        self.assertEqual(json.loads("".join(rows)), [{"id": i} for i in range(7)])
+
+    def test_fields_projection(self):
+        rows = self.rows(self.get("fields=id,name,surge_zone"))
+        self.assertEqual(rows[1], {"id": self.ids[1], "name": "Tampa", "surge_zone": 2})
+        resp = self.get("fields=name,password")
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("password", resp.json()["error"])
+        self.assertEqual(self.get("fields=,").status_code, 400)
+
+    def test_bbox(self):
+        rows = self.rows(self.get("bbox=-83,25.5,-81,28&fields=name"))
+        self.assertEqual([r["name"] for r in rows], ["Naples", "Tampa"])
+        self.assertEqual(self.get("bbox=-83,25.5,-81").status_code, 400)
+
+    def test_cursor_pages_through_everything(self):
+        names, query, pages = [], "limit=3&fields=name", 0
+        while query is not None:
+            resp = self.get(query)
+            names += [r["name"] for r in self.rows(resp)]
+            pages += 1
+            link = resp.get("Link")
+            query = re.search(r"\?([^>]*)>", link).group(1) if link else None
+            if link:
+                self.assertEqual(resp["X-Next-Cursor"], str(self.ids[2]))
+        self.assertEqual(pages, 2)
+        self.assertEqual(names, ["Naples", "Tampa", "Miami", "Tallahassee"])
+
+    def test_exact_last_page_has_no_next_link(self):
+        resp = self.get("limit=4")
+        self.assertEqual(len(self.rows(resp)), 4)
+        self.assertNotIn("Link", resp)
+
+    def test_bad_paging_is_400(self):
+        for query in ("limit=0", "limit=10001", "limit=ten", "cursor=abc"):
+            with self.subTest(query=query):
+                self.assertEqual(self.get(query).status_code, 400)
+
+    def test_etag_follows_the_import_version(self):
+        resp = self.get()
+        etag = resp["ETag"]
+        self.assertEqual(etag, f'"shelters-v{DatasetVersion.current("shelters")}"')
+        self.assertEqual(self.get(**{"If-None-Match": etag}).status_code, 304)
+        DatasetVersion.bump("shelters")
+        self.assertEqual(self.get(**{"If-None-Match": etag}).status_code, 200)
+
+    def test_gzip(self):
+        resp = self.get(**{"Accept-Encoding": "gzip"})
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", resp["Vary"])
+        self.assertEqual(len(self.rows(resp)), 4)
+        # The weakened ETag gzip leaves still revalidates
+        self.assertTrue(resp["ETag"].startswith("W/"))
+        self.assertEqual(self.get(**{"Accept-Encoding": "gzip", "If-None-Match": resp["ETag"]}).status_code, 304)
+        self.assertNotIn("Content-Encoding", self.get())
+
+
+def _decode_columns(body):
+    """tracker/columnar.py payload -> {"version": N, "rows": [dict, ...]}, as the page decodes it."""
+    pos = 0
+
+    def varint():
+        nonlocal pos
+        v = shift = 0
+        while True:
+            b = body[pos]
+            pos += 1
+            v |= (b & 0x7F) << shift
+            shift += 7
+            if not b & 0x80:
+                return v
+
+    def strings():
+        nonlocal pos
+        lengths = [varint() for _ in range(varint())]
+        size = varint()
+        text = body[pos:pos + size].decode("utf-8")
+        pos += size
+        out, at = [], 0
+        for length in lengths:  # UTF-16 units; the test data is BMP-only
+            out.append(text[at:at + length])
+            at += length
+        return out
+
+    assert body[:4] == columnar.MAGIC
+    n, version, columns = struct.unpack_from("<IIB", body, 4)
+    pos = 13
+    rows = [{} for _ in range(n)]
+    for _ in range(columns):
+        name = body[pos + 1:pos + 1 + body[pos]].decode("ascii")
+        pos += 1 + len(name)
+        kind, size = struct.unpack_from("<BI", body, pos)
+        pos += 5
+        pos += -pos % 4
+        end = pos + size
+        if kind == columnar.F32:
+            values = list(struct.unpack_from(f"<{n}f", body, pos))
+        elif kind == columnar.DICT:
+            entries = strings()
+            values = [entries[varint()] for _ in range(n)]
+        elif kind == columnar.STR:
+            values = strings()
+        elif kind == columnar.BITS:
+            values = [bool(body[pos + i // 8] >> (i % 8) & 1) for i in range(n)]
+        elif kind == columnar.VARINT:
+            values = [v - 1 if v else None for v in (varint() for _ in range(n))]
+        else:
+            values, v = [], 0
+            for _ in range(n):
+                z = varint()
+                v += -(z + 1) // 2 if z % 2 else z // 2
+                values.append(v / columnar.E5_SCALE if kind == columnar.E5 else v)
+        for row, value in zip(rows, values):
+            row[name] = value
+        pos = end
+    return {"version": version, "rows": rows}
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                                       "LOCATION": "columnar-tests"}})
+class ColumnarTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.a = _shelter("Alpha", latitude=27.123456, longitude=-82.5, capacity=300, is_pet_friendly=True)
+        cls.b = _shelter("Bravo", city="Tampa", latitude=25.000004, longitude=-80.1, capacity=None)
+        cls.c = _shelter("Charlie é", notes="", latitude=26.5, longitude=-81.99999, capacity=0)
+        DatasetVersion.bump("shelters")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_round_trip_of_every_column_type(self):
+        fields = tuple(columnar.COLUMN_TYPES)
+        rows = list(Shelter.objects.order_by("id").values_list(*fields))
+        decoded = _decode_columns(columnar.encode(fields, rows, version=7))
+        self.assertEqual(decoded["version"], 7)
+        # Rows go out by position (latitude, longitude), not id
+        self.assertEqual([r["name"] for r in decoded["rows"]], ["Bravo", "Charlie é", "Alpha"])
+        expected = {row[0]: dict(zip(fields, row)) for row in rows}
+        for row in decoded["rows"]:
+            want = expected[row["id"]]
+            for field in ("latitude", "longitude"):
+                self.assertAlmostEqual(row[field], want[field], delta=0.5 / columnar.E5_SCALE)
+            self.assertEqual({k: v for k, v in row.items() if k not in ("latitude", "longitude")},
+                             {k: v for k, v in want.items() if k not in ("latitude", "longitude")})
+
+    def test_float32_column(self):
+        with mock.patch.dict(columnar.COLUMN_TYPES, latitude=columnar.F32):
+            body = columnar.encode(("latitude",), [(27.5,), (25.25,)])
+        self.assertEqual([r["latitude"] for r in _decode_columns(body)["rows"]], [27.5, 25.25])
+
+    def test_map_payload_is_map_fields_only(self):
+        resp = Client().get("/api/shelters/?format=columnar", secure=True)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], "application/octet-stream")
+        self.assertEqual(resp["ETag"], f'"shelters-v{DatasetVersion.current("shelters")}"')
+        decoded = _decode_columns(resp.content)
+        self.assertEqual(decoded["version"], DatasetVersion.current("shelters"))
+        self.assertEqual(set(decoded["rows"][0]), set(columnar.MAP_FIELDS))
+        by_id = {r["id"]: r for r in decoded["rows"]}
+        self.assertEqual(by_id[self.a.id]["capacity"], 300)
+        self.assertTrue(by_id[self.a.id]["is_pet_friendly"])
+        self.assertIsNone(by_id[self.b.id]["capacity"])
+        self.assertEqual(by_id[self.c.id]["capacity"], 0)
+
+    def test_encoded_once_per_import_version(self):
+        with mock.patch.object(columnar, "encode", wraps=columnar.encode) as encode:
+            Client().get("/api/shelters/?format=columnar", secure=True)
+            Client().get("/api/shelters/?format=columnar", secure=True)
+            self.assertEqual(encode.call_count, 1)
+            DatasetVersion.bump("shelters")
+            Client().get("/api/shelters/?format=columnar", secure=True)
+            self.assertEqual(encode.call_count, 2)
+
+    def test_fields_and_filters(self):
+        resp = Client().get("/api/shelters/?format=columnar&fields=id,city&pet_friendly=0", secure=True)
+        rows = _decode_columns(resp.content)["rows"]
+        self.assertEqual(sorted((r["id"], r["city"]) for r in rows),
+                         [(self.b.id, "Tampa"), (self.c.id, "Fort Myers")])
+
+    def test_bad_format_and_fields_are_400s(self):
+        for query in ("format=csv", "format=columnar&fields=surge_zone"):
+            with self.subTest(query=query):
+                self.assertEqual(Client().get(f"/api/shelters/?{query}", secure=True).status_code, 400)
+
+    def test_popup_detail(self):
+        resp = Client().get(f"/api/shelters/{self.a.id}", secure=True)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["name"], "Alpha")
+        self.assertEqual(set(resp.json()), {"id", *views.SHELTER_FIELDS})
+        self.assertEqual(Client().get("/api/shelters/999999", secure=True).status_code, 404)
+
+
+class ShelterIndexTests(SimpleTestCase):
+    def index(self, *points, pets=None):
+        lat, lon = (np.array(col, dtype=float) for col in zip(*points))
+        pets = np.array(pets if pets is not None else [False] * len(points))
+        return shelter_index.ShelterIndex(1, np.arange(1, len(points) + 1), lat, lon, pets)
+
+    def test_haversine(self):
+        # A degree of latitude, a quarter of the equator, and the far side of the globe
+        km = shelter_index.haversine_km(0.0, 0.0, np.array([1.0, 0.0, 0.0]), np.array([0.0, 90.0, 180.0]))
+        r = shelter_index.EARTH_RADIUS_KM
+        np.testing.assert_allclose(km, [math.pi * r / 180, math.pi * r / 2, math.pi * r])
+
+    def test_nearby_nearest_first_within_radius(self):
+        index = self.index((26.0, -80.0), (26.3, -80.0), (26.1, -80.0), (24.0, -80.0), pets=[True, True, False, True])
+        ids, dists = index.nearby(26.0, -80.0, 50)
+        self.assertEqual(ids.tolist(), [1, 3, 2])
+        self.assertEqual(dists.tolist(), sorted(dists.tolist()))
+        self.assertEqual(index.nearby(26.0, -80.0, 50, k=2)[0].tolist(), [1, 3])
+        self.assertEqual(index.nearby(26.0, -80.0, 50, pet_friendly=True)[0].tolist(), [1, 2])
+        self.assertEqual(index.nearby(26.0, -80.0, 50, pet_friendly=False)[0].tolist(), [3])
+        self.assertEqual(index.nearby(30.0, -80.0, 50)[0].tolist(), [])
+
+    def test_nearby_measures_a_circle_not_a_box(self):
+        # 30 km north and east are in; the corner of the 30 km box (~42 km) isn't
+        step = 30 / 111.195
+        index = self.index((26.0 + step, -80.0), (26.0, -80.0 + step / math.cos(math.radians(26))),
+                           (26.0 + step, -80.0 + step / math.cos(math.radians(26))))
+        self.assertEqual(sorted(index.nearby(26.0, -80.0, 30.1)[0].tolist()), [1, 2])
+
+    def test_nearby_across_the_antimeridian(self):
+        index = self.index((0.0, 179.95), (0.0, -179.95), (0.0, 170.0))
+        ids, dists = index.nearby(0.0, -179.99, 20)
+        self.assertEqual(ids.tolist(), [2, 1])
+        self.assertAlmostEqual(dists[1], 6.67, delta=0.01)
+
+    def test_empty_index(self):
+        index = shelter_index.ShelterIndex(1, np.empty(0, np.int64), np.empty(0), np.empty(0), np.empty(0, bool))
+        ids, dists = index.nearby(26.0, -80.0, 50)
+        self.assertEqual((ids.tolist(), dists.tolist()), ([], []))
+        self.assertEqual(index.within(shapely.box(-81, 25, -79, 27)).tolist(), [])
+
+
+class SheltersNearTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        _shelter("Here", latitude=26.0, longitude=-80.0)
+        _shelter("North", latitude=26.09, longitude=-80.0)  # ~10 km
+        _shelter("East", latitude=26.0, longitude=-79.8, is_pet_friendly=True)  # ~20 km
+        _shelter("Far", latitude=27.0, longitude=-80.0)  # ~111 km
+        DatasetVersion.bump("shelters")
+
+    def setUp(self):
+        patcher = mock.patch.object(shelter_index, "_index", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, query):
+        return self.client.get(f"/api/shelters/near?lat=26&lon=-80{query}", secure=True)
+
+    def names(self, query=""):
+        resp = self.get(query)
+        self.assertEqual(resp.status_code, 200)
+        return [row["name"] for row in resp.json()]
+
+    def test_nearest_first_within_the_radius(self):
+        rows = self.get("").json()
+        self.assertEqual([row["name"] for row in rows], ["Here", "North", "East"])
+        self.assertEqual([row["distance_km"] for row in rows[:1]], [0.0])
+        self.assertAlmostEqual(rows[1]["distance_km"], 10.0, delta=0.05)
+        self.assertAlmostEqual(rows[2]["distance_km"], 20.0, delta=0.05)
+        self.assertEqual(set(rows[0]), {"distance_km", *views.SHELTER_FIELDS})
+        self.assertEqual(self.names("&radius_km=200"), ["Here", "North", "East", "Far"])
+        self.assertEqual(self.names("&radius_km=15"), ["Here", "North"])
+
+    def test_k_and_pet_friendly(self):
+        self.assertEqual(self.names("&k=2"), ["Here", "North"])
+        self.assertEqual(self.names("&pet_friendly=1"), ["East"])
+        self.assertEqual(self.names("&pet_friendly=no&k=1"), ["Here"])
+        self.assertEqual(self.names("&pet_friendly=maybe"), ["Here", "North", "East"])
+
+    def test_a_new_import_rebuilds_the_index(self):
+        self.assertEqual(self.names("&radius_km=5"), ["Here"])
+        _shelter("Next door", latitude=26.01, longitude=-80.0)
+        DatasetVersion.bump("shelters")
+        self.assertEqual(self.names("&radius_km=5"), ["Here", "Next door"])
+
+    def test_bad_values_are_400s(self):
+        required = "lat and lon are required numbers"
+        out_of_range = "lat/lon, radius_km (0-1000] or k (0-5000] out of range"
+        for query, message in [
+            ("/api/shelters/near?lon=-80", required),
+            ("/api/shelters/near?lat=north&lon=-80", required),
+            ("/api/shelters/near?lat=26&lon=-80&k=1.5", required),
+            ("/api/shelters/near?lat=91&lon=-80", out_of_range),
+            ("/api/shelters/near?lat=nan&lon=-80", out_of_range),
+            ("/api/shelters/near?lat=26&lon=-80&radius_km=0", out_of_range),
+            ("/api/shelters/near?lat=26&lon=-80&radius_km=inf", out_of_range),
+            ("/api/shelters/near?lat=26&lon=-80&k=5001", out_of_range),
+        ]:
+            with self.subTest(query=query):
+                resp = self.client.get(query, secure=True)
+                self.assertEqual(resp.status_code, 400)
+                self.assertEqual(resp.json(), {"error": message})
+
+
+def _cone(lon, lat, size=1.0):
+    return {"type": "Feature", "geometry": _square(lon, lat, size), "properties": {}}
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                                       "LOCATION": "storm-shelters-tests"}})
+class StormSheltersTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        _shelter("Inside", latitude=26.0, longitude=-80.0, capacity=300, is_pet_friendly=True)
+        _shelter("Also inside", latitude=25.6, longitude=-80.4, capacity=None)
+        _shelter("Outside", latitude=26.0, longitude=-79.3, capacity=50)  # ~20 km east of the cone
+        _shelter("Far", latitude=30.0, longitude=-84.0)
+        DatasetVersion.bump("shelters")
+
+    def setUp(self):
+        cache.clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        _write_geojson(self.dir / "al012025_cone_001.geojson", _cone(-88, 29))
+        _write_geojson(self.dir / "al012025_cone_002.geojson", _cone(-80.5, 25.5))
+        _write_geojson(self.dir / "al012025_track_002.geojson", _point("track"))
+        patchers = [mock.patch.object(views, "STORMS_DIR", self.dir), mock.patch.object(shelter_index, "_index", None)]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get(self, storm_id="al012025", query=""):
+        return self.client.get(f"/api/storms/{storm_id}/shelters{query}", secure=True)
+
+    def test_shelters_in_the_latest_cone(self):
+        resp = self.get("AL012025")
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual({k: v for k, v in data.items() if k != "shelters"}, {
+            "stormId": "al012025", "advisory": "002", "buffer_km": 0.0,
+            "count": 2, "total_capacity": 300, "pet_friendly_count": 1,
+        })
+        self.assertEqual([s["name"] for s in data["shelters"]], ["Also inside", "Inside"])
+        self.assertEqual(set(data["shelters"][0]), {"id", *views.SHELTER_FIELDS})
+
+    def test_buffer_grows_the_cone(self):
+        data = self.get(query="?buffer_km=30").json()
+        self.assertEqual(data["buffer_km"], 30.0)
+        self.assertEqual([s["name"] for s in data["shelters"]], ["Also inside", "Inside", "Outside"])
+        self.assertEqual(data["total_capacity"], 350)
+        self.assertEqual(self.get(query="?buffer_km=10").json()["count"], 2)
+
+    def test_answers_are_cached_per_cone_and_import(self):
+        with mock.patch.object(advisories, "load_area", wraps=advisories.load_area) as load_area:
+            self.assertEqual(self.get().json()["count"], 2)
+            self.assertEqual(self.get().json()["count"], 2)
+            self.assertEqual(load_area.call_count, 1)
+            # A new import or a new advisory is a new answer
+            _shelter("New", latitude=26.2, longitude=-80.2)
+            DatasetVersion.bump("shelters")
+            self.assertEqual(self.get().json()["count"], 3)
+            _write_geojson(self.dir / "al012025_cone_003.geojson", _cone(-88, 29))
+            data = self.get().json()
+            self.assertEqual((data["advisory"], data["count"]), ("003", 0))
+            self.assertEqual(load_area.call_count, 3)
+
+    def test_missing_cones_are_404s(self):
+        resp = self.get("ep052025")
+        self.assertEqual(resp.status_code, 404)
+        self.assertEqual(resp.json(), {"error": "no forecast cone for ep052025"})
+        # Listed, then gone before it could be read
+        gone = ("002", self.dir / "al012025_cone_009.geojson")
+        with mock.patch.object(advisories, "latest_file", return_value=gone):
+            resp = self.get()
+        self.assertEqual(resp.status_code, 404)
+        self.assertEqual(resp.json(), {"error": "no forecast cone for al012025"})
+        with mock.patch.object(advisories, "load_area", side_effect=FileNotFoundError):
+            self.assertEqual(self.get().status_code, 404)
+
+    def test_bad_buffer_is_a_400(self):
+        for query, message in [("?buffer_km=wide", "buffer_km must be a number"),
+                               ("?buffer_km=-1", "buffer_km must be between 0 and 500"),
+                               ("?buffer_km=501", "buffer_km must be between 0 and 500"),
+                               ("?buffer_km=nan", "buffer_km must be between 0 and 500")]:
+            with self.subTest(query=query):
+                resp = self.get(query=query)
+                self.assertEqual(resp.status_code, 400)
+                self.assertEqual(resp.json(), {"error": message})
+
+def _protobuf(buf):
+    """Wire-format fields of one message: [(field number, value)], values as int or bytes."""
+    fields, pos = [], 0
+
+    def varint():
+        nonlocal pos
+        v = shift = 0
+        while True:
+            b = buf[pos]
+            pos += 1
+            v |= (b & 0x7F) << shift
+            shift += 7
+            if not b & 0x80:
+                return v
+
+    while pos < len(buf):
+        key = varint()
+        wire = key & 7
+        if wire == 0:
+            value = varint()
+        elif wire == 1:
+            value, pos = buf[pos:pos + 8], pos + 8
+        elif wire == 2:
+            size = varint()
+            value, pos = buf[pos:pos + size], pos + size
+        else:
+            raise AssertionError(f"unexpected wire type {wire}")
+        fields.append((key >> 3, value))
+    return fields
+
+
+def _varints(buf):
+    """A packed repeated field: varints back to back."""
+    out, v, shift = [], 0, 0
+    for b in buf:
+        v |= (b & 0x7F) << shift
+        shift += 7
+        if not b & 0x80:
+            out.append(v)
+            v = shift = 0
+    return out
+
+
+def _unzigzag(n):
+    return (n >> 1) ^ -(n & 1)
+
+
+def _decode_geometry(commands):
+    """MVT command integers -> [(command name, [(x, y), ...])], coordinates absolute."""
+    out, i, x, y = [], 0, 0, 0
+    names = {mvt.MOVE_TO: "move", mvt.LINE_TO: "line", mvt.CLOSE_PATH: "close"}
+    while i < len(commands):
+        cmd, count = commands[i] & 7, commands[i] >> 3
+        i += 1
+        if cmd == mvt.CLOSE_PATH:
+            out.append(("close", []))
+            continue
+        points = []
+        for _ in range(count):
+            x += _unzigzag(commands[i])
+            y += _unzigzag(commands[i + 1])
+            points.append((x, y))
+            i += 2
+        out.append((names[cmd], points))
+    return out
+
+
+def _decode_tile(body):
+    """{layer name: {"extent", "features": [{"id", "type", "geometry", "properties"}]}}"""
+    layers = {}
+    for field, raw in _protobuf(body):
+        assert field == 3
+        layer = dict(_protobuf(raw))
+        keys = [v.decode("utf-8") for f, v in _protobuf(raw) if f == 3]
+        values = []
+        for f, v in _protobuf(raw):
+            if f == 4:
+                (kind, value), = _protobuf(v)
+                if kind == 1:
+                    value = value.decode("utf-8")
+                elif kind == 3:
+                    value = struct.unpack("<d", value)[0]
+                elif kind == 6:
+                    value = _unzigzag(value)
+                elif kind == 7:
+                    value = bool(value)
+                values.append(value)
+        features = []
+        for f, v in _protobuf(raw):
+            if f != 2:
+                continue
+            feat = dict(_protobuf(v))
+            tags = _varints(feat.get(2, b""))
+            features.append({
+                "id": feat.get(1),
+                "type": feat[3],
+                "geometry": _decode_geometry(_varints(feat[4])),
+                "properties": {keys[k]: values[t] for k, t in zip(tags[::2], tags[1::2])},
+            })
+        assert layer[15] == 2
+        layers[layer[1].decode("utf-8")] = {"extent": layer[5], "features": features}
+    return layers
+
+
+def _screen_area(ring):
+    """Shoelace area with y pointing down: positive is clockwise on screen."""
+    return sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(ring, ring[1:] + ring[:1])) / 2
+
+
+class VectorTileEncodingTests(SimpleTestCase):
+    def decode(self, *features):
+        return _decode_tile(mvt.encode_layer("test", features, extent=4096))["test"]
+
+    def test_points_lines_and_properties(self):
+        layer = self.decode(
+            {"id": 7, "type": mvt.POINT, "geometry": [(10, 20), (5, 5)],
+             "properties": {"name": "Alpha", "capacity": 300, "offset": -4, "score": 0.5, "pets": True,
+                            "missing": None}},
+            {"type": mvt.LINESTRING, "geometry": [[(0, 0), (0, 0), (100, 0), (100, 50)], [(1, 1)]],
+             "properties": {"name": "Alpha"}},
+        )
+        self.assertEqual(layer["extent"], 4096)
+        point, line = layer["features"]
+        self.assertEqual(point["id"], 7)
+        self.assertEqual(point["type"], mvt.POINT)
+        self.assertEqual(point["geometry"], [("move", [(10, 20), (5, 5)])])
+        self.assertEqual(point["properties"],
+                         {"name": "Alpha", "capacity": 300, "offset": -4, "score": 0.5, "pets": True})
+        self.assertIsNone(line["id"])
+        # Repeated vertices dropped, single-point lines skipped
+        self.assertEqual(line["geometry"], [("move", [(0, 0)]), ("line", [(100, 0), (100, 50)])])
+
+    def test_polygon_rings_are_wound_per_spec(self):
+        exterior = [(0, 0), (0, 100), (100, 100), (100, 0), (0, 0)]  # counter-clockwise on screen
+        hole = [(20, 20), (40, 20), (40, 40), (20, 40)]  # clockwise on screen
+        self.assertLess(_screen_area(exterior[:-1]), 0)
+        self.assertGreater(_screen_area(hole), 0)
+
+        (feature,) = self.decode({"type": mvt.POLYGON, "geometry": [[exterior, hole]], "properties": {}})["features"]
+        commands = [c for c, _ in feature["geometry"]]
+        self.assertEqual(commands, ["move", "line", "close", "move", "line", "close"])
+        rings = [feature["geometry"][0][1] + feature["geometry"][1][1],
+                 feature["geometry"][3][1] + feature["geometry"][4][1]]
+        self.assertEqual(len(rings[0]), 4)  # closing vertex left to ClosePath
+        self.assertGreater(_screen_area(rings[0]), 0)  # exterior clockwise
+        self.assertLess(_screen_area(rings[1]), 0)  # hole counter-clockwise
+        self.assertEqual(set(rings[0]), set(exterior))
+        self.assertEqual(set(rings[1]), set(hole))
+
+    def test_degenerate_geometry_is_dropped(self):
+        self.assertEqual(mvt.encode_layer("test", [
+            {"type": mvt.POLYGON, "geometry": [[[(0, 0), (10, 10), (20, 20)]]], "properties": {}},
+            {"type": mvt.POINT, "geometry": [], "properties": {}},
+        ]), b"")
+
+
+class VectorTileEndpointTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.shelter = _shelter("Alpha", latitude=26.6, longitude=-81.9, capacity=300)
+        DatasetVersion.bump("shelters")
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache_dir = Path(tmp.name)
+        patcher = override_settings(TILE_CACHE_DIR=self.cache_dir)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        self.addCleanup(tiles._sources.clear)
+
+    def tile(self, z, x, y):
+        return Client().get(f"/tiles/shelters/{z}/{x}/{y}.mvt", secure=True)
+
+    def test_tile_with_data_is_rendered_and_cached(self):
+        resp = self.tile(4, 4, 6)  # Florida
+        self.assertEqual(resp.status_code, 200)
+        (feature,) = _decode_tile(resp.content)["shelters"]["features"]
+        self.assertEqual(feature["id"], self.shelter.id)
+        self.assertEqual(feature["properties"]["name"], "Alpha")
+        ((command, [(x, y)]),) = feature["geometry"]
+        west, south, east, north = tiles.tile_bounds(4, 4, 6)
+        self.assertAlmostEqual(x / 4096, (-81.9 - west) / (east - west), places=3)
+        self.assertTrue(0 < y < 4096)
+        self.assertEqual(len(list(self.cache_dir.rglob("*.mvt"))), 1)
+
+    def test_empty_tiles_are_204s_and_not_cached(self):
+        for z, x, y in [(4, 0, 0), (16, 1234, 5678), (12, 4095, 4095)]:
+            with self.subTest(tile=(z, x, y)):
+                self.assertEqual(self.tile(z, x, y).status_code, 204)
+        self.assertEqual(list(self.cache_dir.rglob("*.mvt")), [])
+
+    def test_out_of_range_is_404(self):
+        for z, x, y in [(17, 0, 0), (4, 16, 0), (4, 0, 16)]:
+            with self.subTest(tile=(z, x, y)):
+                self.assertEqual(self.tile(z, x, y).status_code, 404)
+
+
+IMPORT_COLUMNS = ["Asset ID", "Building", "Name", "Address", "City", "Zip", "COUNTY", "Y", "X",
+                  "EHPA_Capac", "Pet_Friend", "SURGE_ZONE", "Generator_"]
+
+
+def _csv_row(asset, building, name, capacity="100", generator="No"):
+    return [asset, building, name, "1 Main St", "Fort Myers", "33901", "Lee", "26.6", "-81.9",
+            capacity, "No", "No", generator]
+
+
+class ImportSheltersTests(TestCase):
+    ROWS = [
+        _csv_row("RSI_1", "Main", "Alpha"),
+        _csv_row("RSI_2", "Main", "Bravo Gym"),
+        _csv_row("RSI_2", "Main", "Bravo Cafeteria"),  # same Asset ID|Building
+        _csv_row("RSI_3", "", "Charlie"),
+    ]
+
+    def run_import(self, rows):
+        # With a byte order mark, as Excel writes it: both passes over the file must skip it
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", newline="", encoding="utf-8-sig", delete=False) as f:
+            writer = csv.writer(f)
+            writer.writerow(IMPORT_COLUMNS)
+            writer.writerows(rows)
+        self.addCleanup(os.unlink, f.name)
+        out, err = io.StringIO(), io.StringIO()
+        call_command("import_shelters", f.name, stdout=out, stderr=err)
+        counts = {label: int(n) for n, label in re.findall(
+            r"(\d+) (inserted|updated|unchanged|deleted|duplicates|errors)", out.getvalue())}
+        return counts, err.getvalue()
+
+    def test_first_import_inserts_everything(self):
+        counts, _ = self.run_import(self.ROWS)
+        self.assertEqual((counts["inserted"], counts["unchanged"], counts["deleted"]), (4, 0, 0))
+        self.assertEqual(Shelter.objects.count(), 4)
+        self.assertEqual(DatasetVersion.current("shelters"), 1)
+
+    def test_same_file_is_unchanged(self):
+        self.run_import(self.ROWS)
+        ids = dict(Shelter.objects.values_list("name", "id"))
+        counts, _ = self.run_import(self.ROWS)
+        self.assertEqual((counts["inserted"], counts["updated"], counts["unchanged"]), (0, 0, 4))
+        self.assertEqual(dict(Shelter.objects.values_list("name", "id")), ids)
+        self.assertEqual(DatasetVersion.current("shelters"), 1)
+
+    def test_reordered_duplicates_keep_their_keys(self):
+        self.run_import(self.ROWS)
+        keys = dict(Shelter.objects.values_list("name", "source_key"))
+        counts, _ = self.run_import(self.ROWS[::-1])
+        self.assertEqual((counts["inserted"], counts["updated"], counts["unchanged"]), (0, 0, 4))
+        self.assertEqual(dict(Shelter.objects.values_list("name", "source_key")), keys)
+        self.assertEqual(keys["Alpha"], "RSI_1|Main")
+        self.assertTrue(keys["Bravo Gym"].startswith("RSI_2|Main#"))
+
+    def test_changes_and_removals(self):
+        self.run_import(self.ROWS)
+        rows = [_csv_row("RSI_1", "Main", "Alpha", capacity="250", generator="Yes"), *self.ROWS[1:3]]
+        counts, _ = self.run_import(rows)
+        self.assertEqual((counts["inserted"], counts["updated"], counts["unchanged"], counts["deleted"]),
+                         (0, 1, 2, 1))
+        alpha = Shelter.objects.get(name="Alpha")
+        self.assertEqual((alpha.capacity, alpha.has_generator), (250, True))
+        self.assertFalse(Shelter.objects.filter(name="Charlie").exists())
+        self.assertEqual(DatasetVersion.current("shelters"), 2)
+
+    def test_identical_rows_are_imported_once(self):
+        counts, err = self.run_import([*self.ROWS, self.ROWS[1]])
+        self.assertEqual((counts["inserted"], counts["duplicates"]), (4, 1))
+        self.assertIn("duplicate", err)
+
+    def test_bad_rows_are_counted_not_fatal(self):
+        broken = _csv_row("RSI_9", "", "Broken")
+        broken[IMPORT_COLUMNS.index("Y")] = "not a latitude"
+        counts, err = self.run_import([*self.ROWS, broken])
+        self.assertEqual((counts["inserted"], counts["errors"]), (4, 1))
+        self.assertIn("Broken", err)
+
+
+# (zip, city, county, municipality, lat, lon), one per shelter
+GAZETTEER_POINTS = [
+    ("33301", "Fort Lauderdale", "Broward", "Fort Lauderdale", 26.1, -80.1),
+    ("33301", "Fort Lauderdale", "Broward", "", 26.1, -80.2),
+    ("33304", "Ft. Lauderdale", "Broward", "", 26.2, -80.1),
+    ("33313", "Lauderhill", "Broward", "", 26.15, -80.2),
+    ("34952", "Port St. Lucie", "St. Lucie", "Port St Lucie", 27.3, -80.3),
+    ("34952", "Port St. Lucie", "St. Lucie", "", 27.2, -80.4),
+    ("34953", "Port St Lucie", "St. Lucie", "", 27.25, -80.35),
+    ("33101", "Miami", "Miami-Dade", "", 25.8, -80.2),
+    ("33101", "Miami", "Miami-Dade", "", 25.7, -80.3),
+    ("33139", "Miami Beach", "Miami-Dade", "", 25.8, -80.1),
+    ("32301", "Tallahassee", "Leon", "Leon County Unincorporated", 30.4, -84.3),
+]
+
+
+class GazetteerTests(SimpleTestCase):
+    def setUp(self):
+        self.gazetteer = gazetteer.Gazetteer(1, gazetteer.build_places(GAZETTEER_POINTS))
+
+    def search(self, query, limit=8):
+        return [(r["name"], r["kind"]) for r in self.gazetteer.search(query, limit)]
+
+    def test_build_places_merges_spellings(self):
+        places = {(p["kind"], p["name"]): p for p in gazetteer.build_places(GAZETTEER_POINTS)}
+        # "Ft. Lauderdale" and "Port St Lucie" fold into the more common spelling
+        self.assertEqual(places["city", "Fort Lauderdale"]["shelter_count"], 3)
+        self.assertEqual(places["city", "Port St. Lucie"]["shelter_count"], 3)
+        self.assertNotIn(("city", "Ft. Lauderdale"), places)
+        self.assertNotIn(("city", "Port St Lucie"), places)
+        # A municipality that's also the county's city is only the city
+        self.assertNotIn(("municipality", "Port St Lucie"), places)
+        self.assertNotIn(("municipality", "Fort Lauderdale"), places)
+        self.assertIn(("municipality", "Leon County Unincorporated"), places)
+        lauderdale = places["city", "Fort Lauderdale"]
+        self.assertEqual((lauderdale["latitude"], lauderdale["longitude"]), (26.133333, -80.133333))
+        self.assertEqual((lauderdale["min_lat"], lauderdale["max_lat"], lauderdale["min_lon"], lauderdale["max_lon"]),
+                         (26.1, 26.2, -80.2, -80.1))
+        self.assertEqual(places["county", "St. Lucie"]["county"], "")
+
+    def test_prefix_and_word_start_matches(self):
+        # Names starting with the query before names with a later word that does
+        self.assertEqual(self.search("laud"), [("Lauderhill", "city"), ("Fort Lauderdale", "city")])
+        self.assertEqual(self.search("LAUDERDALE"), [("Fort Lauderdale", "city")])
+        self.assertEqual(self.search("tallahassee, FL"), [("Tallahassee", "city")])
+        self.assertEqual(self.search("uninc"), [("Leon County Unincorporated", "municipality")])
+        self.assertEqual(self.search("naples"), [])
+
+    def test_abbreviations_match_either_way(self):
+        self.assertEqual(self.search("ft laud"), [("Fort Lauderdale", "city")])
+        self.assertEqual(self.search("fort lauderdale"), [("Fort Lauderdale", "city")])
+        for query in ("st lucie", "St. Lucie", "saint lu"):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query), [("St. Lucie", "county"), ("Port St. Lucie", "city")])
+        # Still being typed: "s" could be the start of a word, not South
+        self.assertEqual(self.search("port s"), [("Port St. Lucie", "city")])
+
+    def test_ranking(self):
+        # Exact before prefix, then the place with more shelters
+        self.assertEqual(self.search("miami"),
+                         [("Miami", "city"), ("Miami-Dade", "county"), ("Miami Beach", "city")])
+        self.assertEqual(self.search("miami", limit=2), [("Miami", "city"), ("Miami-Dade", "county")])
+        self.assertEqual(self.search("leon county"), [("Leon", "county"), ("Leon County Unincorporated", "municipality")])
+        # Digits mean a ZIP; the busier ZIP first
+        self.assertEqual(self.search("3330"), [("33301", "zip"), ("33304", "zip")])
+        result = self.gazetteer.search("33313")[0]
+        self.assertEqual(result, {"name": "33313", "kind": "zip", "county": "Broward", "lat": 26.15, "lon": -80.2,
+                                  "bbox": [-80.2, 26.15, -80.2, 26.15], "shelters": 1})
+
+    def test_empty_queries_match_nothing(self):
+        for query in ("", "   ", "--", ", FL", "Florida", " county"):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query), [])
+
+
+class GeocodeViewTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(gazetteer, "_gazetteer", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        Place.objects.bulk_create(Place(**p) for p in gazetteer.build_places(GAZETTEER_POINTS))
+        DatasetVersion.bump("shelters")
+
+    def get(self, query):
+        return self.client.get(f"/api/geocode{query}", secure=True)
+
+    def test_results(self):
+        resp = self.get("?q=laud")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Cache-Control"], "public, max-age=300")
+        body = resp.json()
+        self.assertEqual(body["query"], "laud")
+        self.assertEqual([r["name"] for r in body["results"]], ["Lauderhill", "Fort Lauderdale"])
+        self.assertEqual([r["name"] for r in self.get("?q=miami&limit=1").json()["results"]], ["Miami"])
+
+    def test_empty_query(self):
+        self.assertEqual(self.get("").json(), {"query": "", "results": []})
+        self.assertEqual(self.get("?q=%20%20").json()["results"], [])
+
+    def test_bad_limit_is_a_400(self):
+        for query, message in [("?q=a&limit=ten", "limit must be an integer"),
+                               ("?q=a&limit=0", "limit must be between 1 and 20"),
+                               ("?q=a&limit=21", "limit must be between 1 and 20")]:
+            with self.subTest(query=query):
+                resp = self.get(query)
+                self.assertEqual(resp.status_code, 400)
+                self.assertEqual(resp.json(), {"error": message})
+
+    def test_a_new_import_rebuilds_the_index(self):
+        self.assertEqual(self.get("?q=naples").json()["results"], [])
+        Place.objects.create(kind="city", name="Naples", county="Collier", latitude=26.14, longitude=-81.79,
+                             min_lat=26.14, min_lon=-81.79, max_lat=26.14, max_lon=-81.79, shelter_count=4)
+        # The index is kept until the shelters dataset moves on
+        self.assertEqual(self.get("?q=naples").json()["results"], [])
+        DatasetVersion.bump("shelters")
+        self.assertEqual([r["name"] for r in self.get("?q=naples").json()["results"]], ["Naples"])
+
+def _closing_clients(test):
+    """Close the test's event loop's pooled upstream clients when it ends."""
+    @functools.wraps(test)
+    async def wrapper(*args, **kwargs):
+        try:
+            await test(*args, **kwargs)
+        finally:
+            await http.aclose_clients()
+    return wrapper
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "geocode-tests"}},
+    GEOCODE_RATE=1000, GEOCODE_BURST=1000, GEOCODE_MAX_WAIT=3,
+    GEOCODE_CACHE_TTL=3600, GEOCODE_EMPTY_TTL=60,
+)
+class RemoteGeocodeTests(TestCase):
+    """tracker.geocoder against benchmarks.fake_geocoder on a local port."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.upstream = FakeGeocoder().start()
+        cls.addClassCleanup(cls.upstream.stop)
+
+    def setUp(self):
+        cache.clear()
+        self.upstream.hits = 0
+        self.upstream.latency = 0.0
+        self.upstream.failure_rate = 0.0
+        patcher = override_settings(GEOCODE_UPSTREAM_URL=self.upstream.url)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+
+    async def get(self, q):
+        return await self.async_client.get("/api/geocode/remote", {"q": q}, secure=True)
+
+    @_closing_clients
+    async def test_concurrent_lookups_share_one_upstream_call(self):
+        self.upstream.latency = 0.2
+        answers = await asyncio.gather(*(geocoder.alookup(q) for q in ["Tampa", "tampa, FL", "TAMPA"] * 3))
+        self.assertEqual(self.upstream.hits, 1)
+        self.assertEqual({key for key, _, _ in answers}, {"tampa"})
+        self.assertEqual(len({json.dumps(results) for _, results, _ in answers}), 1)
+
+    @_closing_clients
+    async def test_answers_are_cached_until_they_expire(self):
+        first = (await self.get("Tampa")).json()
+        self.assertFalse(first["cached"])
+        second = (await self.get("tampa fl")).json()
+        self.assertTrue(second["cached"])
+        self.assertEqual(second["results"], first["results"])
+        self.assertEqual(self.upstream.hits, 1)
+
+        await GeocodeResult.objects.filter(query="tampa").aupdate(expires_at=timezone.now())
+        self.assertFalse((await self.get("Tampa")).json()["cached"])
+        self.assertEqual(self.upstream.hits, 2)
+
+    @_closing_clients
+    async def test_empty_answers_are_cached_for_less(self):
+        self.assertEqual((await self.get("Nowhere")).json()["results"], [])
+        row = await GeocodeResult.objects.aget(query="nowhere")
+        self.assertLessEqual(row.expires_at - row.fetched_at, timedelta(seconds=60))
+        self.assertTrue((await self.get("Nowhere")).json()["cached"])
+
+    @_closing_clients
+    async def test_spent_budget_is_a_429(self):
+        with override_settings(GEOCODE_RATE=0.1, GEOCODE_BURST=1, GEOCODE_MAX_WAIT=0):
+            self.assertEqual((await self.get("Tampa")).status_code, 200)
+            resp = await self.get("Orlando")
+            self.assertEqual(resp.status_code, 429)
+            self.assertEqual(resp["Retry-After"], "10")
+            # Cached answers don't need a token
+            self.assertEqual((await self.get("Tampa")).status_code, 200)
+        self.assertEqual(self.upstream.hits, 1)
+
+    @_closing_clients
+    async def test_upstream_failure_is_a_502_and_not_cached(self):
+        self.upstream.failure_rate = 1.0
+        with self.assertLogs("tracker.geocoder", "WARNING"):
+            resp = await self.get("Tampa")
+        self.assertEqual(resp.status_code, 502)
+        self.assertFalse(await GeocodeResult.objects.filter(query="tampa").aexists())
+
+        self.upstream.failure_rate = 0.0
+        self.assertEqual((await self.get("Tampa")).status_code, 200)
+
+    @_closing_clients
+    async def test_empty_query_is_a_400(self):
+        self.assertEqual((await self.get(" , FL ")).status_code, 400)
+        self.assertEqual(self.upstream.hits, 0)
+
+    def test_lookup_locks_are_a_fixed_pool(self):
+        with mock.patch.object(geocoder, "ainterprocess_lock", wraps=geocoder.ainterprocess_lock) as lock, \
+                mock.patch.object(geocoder, "_afetch", mock.AsyncMock(return_value=[])):
+            for i in range(200):
+                async_to_sync(geocoder.alookup)(f"query {i}")
+        names = {c.args[0] for c in lock.call_args_list}
+        self.assertLessEqual(len(names), geocoder.LOCK_SLOTS)
+        self.assertTrue(all(re.fullmatch(r"geocode-\d+", n) for n in names))
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "nhc-tests"}},
+    NHC_CACHE_TTL=120, NHC_FAILURE_TTL=15, NHC_BREAKER_FAILURES=3, NHC_BREAKER_COOLDOWN=60,
+)
+class NhcBreakerTests(SimpleTestCase):
+    STORMS = [{"id": "al012025", "name": "Andrea"}]
+
+    def setUp(self):
+        cache.clear()
+        self.now = 1_000_000.0
+        self.upstream = mock.Mock(return_value=self.STORMS)
+        self.probes = []
+        patchers = [
+            mock.patch.object(nhc.time, "time", lambda: self.now),
+            mock.patch.object(nhc, "_fetch", self.upstream),
+            mock.patch.object(nhc, "_start_probe", lambda: self.probes.append(True)),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def fail(self):
+        self.upstream.side_effect = requests.ConnectionError("down")
+
+    def recover(self):
+        self.upstream.side_effect = None
+
+    def test_no_copy_to_fall_back_on(self):
+        self.fail()
+        with self.assertRaises(nhc.UpstreamUnavailable), self.assertLogs("tracker.nhc", "WARNING") as logs:
+            nhc.current_storms()
+        self.assertEqual(logs.output, ["WARNING:tracker.nhc:fetch failed: down"])
+
+    def test_failure_serves_the_last_good_copy(self):
+        fetched_at = self.now
+        self.assertFalse(nhc.current_storms().stale)
+        self.now += 121  # past NHC_CACHE_TTL
+        self.fail()
+        with self.assertLogs("tracker.nhc", "WARNING"):
+            storms = nhc.current_storms()
+        self.assertEqual(list(storms), self.STORMS)
+        self.assertTrue(storms.stale)
+        self.assertEqual(storms.fetched_at, fetched_at)
+        # Nobody retries until NHC_FAILURE_TTL has passed
+        nhc.current_storms()
+        self.assertEqual(self.upstream.call_count, 2)
+
+    def test_circuit_opens_probes_and_closes(self):
+        nhc.current_storms()
+        self.fail()
+        with self.assertLogs("tracker.nhc", "WARNING") as logs:
+            for _ in range(3):
+                self.now += 121
+                self.assertTrue(nhc.current_storms().stale)
+        self.assertEqual(self.upstream.call_count, 4)
+        self.assertIn("circuit open after 3 failures", logs.output[-1])
+        self.assertGreaterEqual(nhc._breaker()["failures"], 3)
+
+        # Open: the last good copy straight away, nothing goes upstream
+        self.now += 30
+        self.assertTrue(nhc.current_storms().stale)
+        self.assertEqual((self.upstream.call_count, self.probes), (4, []))
+
+        # Cooldown over: exactly one caller starts a probe, the others keep waiting
+        self.now += 31
+        self.assertTrue(nhc.current_storms().stale)
+        self.assertTrue(nhc.current_storms().stale)
+        self.assertEqual(len(self.probes), 1)
+
+        # A failed probe keeps it open for another cooldown
+        with self.assertLogs("tracker.nhc", "WARNING"):
+            nhc._probe()
+        self.assertEqual(self.upstream.call_count, 5)
+        self.now += 61
+        nhc.current_storms()
+        self.assertEqual(len(self.probes), 2)
+
+        # A good probe closes it and refills the cache
+        self.recover()
+        with self.assertLogs("tracker.nhc", "INFO") as logs:
+            nhc._probe()
+        self.assertEqual(logs.output, ["INFO:tracker.nhc:upstream recovered; circuit closed"])
+        storms = nhc.current_storms()
+        self.assertFalse(storms.stale)
+        self.assertEqual(nhc._breaker()["failures"], 0)
+        self.assertEqual(self.upstream.call_count, 6)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "nhc-fill-tests"}},
+    NHC_CACHE_TTL=120,
+)
+class NhcSingleFlightTests(SimpleTestCase):
+    STORMS = [{"id": "al012025", "name": "Andrea"}]
+    CALLERS = 8
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def slow_fetch(self):
+        self.calls += 1
+        time.sleep(0.2)
+        return self.STORMS
+
+    async def aslow_fetch(self):
+        self.calls += 1
+        await asyncio.sleep(0.2)
+        return self.STORMS
+
+    def test_concurrent_misses_share_one_fetch(self):
+        with mock.patch.object(nhc, "_fetch", self.slow_fetch), \
+                ThreadPoolExecutor(max_workers=self.CALLERS) as pool:
+            results = list(pool.map(lambda _: nhc.current_storms(), range(self.CALLERS)))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual([list(r) for r in results], [self.STORMS] * self.CALLERS)
+        self.assertFalse(any(r.stale for r in results))
+
+    async def test_concurrent_async_misses_share_one_fetch(self):
+        with mock.patch.object(nhc, "_afetch", self.aslow_fetch):
+            results = await asyncio.gather(*(nhc.acurrent_storms() for _ in range(self.CALLERS)))
+            self.assertEqual(self.calls, 1)
+            # The next miss after the fill is a plain cache hit
+            self.assertEqual(list(await nhc.acurrent_storms()), self.STORMS)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual([list(r) for r in results], [self.STORMS] * self.CALLERS)
+
+
+def _utc(hour, minute=0):
+    return dt.datetime(2025, 9, 10, hour, minute, tzinfo=dt.timezone.utc)
+
+
+class IngestScheduleTests(SimpleTestCase):
+    def test_fast_polls_inside_advisory_windows(self):
+        # 15 minutes before to 45 minutes after 03/09/15/21 UTC
+        for now in (_utc(8, 45), _utc(9), _utc(9, 44), _utc(20, 50), _utc(3, 30)):
+            with self.subTest(now=now):
+                self.assertEqual(ingest.scheduled_delay(now, 60, 900), 60)
+
+    def test_slow_polls_between_windows_stop_at_the_next_one(self):
+        self.assertEqual(ingest.scheduled_delay(_utc(9, 45), 60, 900), 900)
+        self.assertEqual(ingest.scheduled_delay(_utc(14, 35), 60, 900), 600)  # window opens 14:45
+        # Across midnight: 21:45 -> the 02:45 window, capped at the slow interval
+        self.assertEqual(ingest.scheduled_delay(_utc(23, 59), 60, 900), 900)
+        self.assertEqual(ingest.scheduled_delay(_utc(2, 40), 60, 900), 300)
+
+    def test_backoff_doubles_up_to_the_cap(self):
+        self.assertEqual([ingest.backoff_delay(n, 60, 1800) for n in range(1, 8)],
+                         [60, 120, 240, 480, 960, 1800, 1800])
+
+    def test_jitter_stays_in_bounds(self):
+        delays = [ingest.jittered(100, 0.1) for _ in range(200)]
+        self.assertTrue(all(90 <= d <= 110 for d in delays))
+        self.assertEqual(ingest.jittered(0.2, 0.1), 1.0)
+
+
+class IngestOverrunTests(SimpleTestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def stuck_run_once(self, deadline=None):
+        self.release.wait(5)
+        return {"status": "updated"}
+
+    def test_cycle_within_budget_returns_its_stats(self):
+        with mock.patch.object(download_storms, "run_once", return_value={"status": "unchanged"}):
+            stats = ingest.run_cycle(timeout=1, grace=1)
+        self.assertEqual(stats["status"], "unchanged")
+        self.assertIn("total_ms", stats)
+
+    def test_errors_are_failed_cycles(self):
+        with mock.patch.object(download_storms, "run_once", side_effect=OSError("disk full")):
+            stats = ingest.run_cycle(timeout=1, grace=1)
+        self.assertEqual((stats["status"], stats["error"]), ("error", "OSError: disk full"))
+
+    def test_overrun_is_abandoned_not_fatal(self):
+        on_overrun = mock.Mock()
+        with mock.patch.object(download_storms, "run_once", self.stuck_run_once), \
+                self.assertRaises(ingest.CycleOverrun) as cm:
+            ingest.run_cycle(timeout=0.05, grace=0.05, on_overrun=on_overrun)
+        on_overrun.assert_called_once_with(0.1)
+        self.assertTrue(cm.exception.cycle.is_alive())
+        self.release.set()
+        cm.exception.cycle.join(5)
+        self.assertFalse(cm.exception.cycle.is_alive())
+
+    def test_in_process_scheduler_hands_the_lock_on(self):
+        cycle = threading.Thread(target=self.release.wait)
+        cycle.start()
+        turns = []
+
+        def run(stop, log):
+            turns.append(len(turns))
+            if len(turns) == 1:
+                self.release.set()  # the stuck cycle lets go later on
+                raise ingest.CycleOverrun(0.1, cycle)
+            stop.set()
+
+        # A second turn means the lock was released and taken again (a lock
+        # still held would block it: flock locks are per open file)
+        with mock.patch.object(ingest, "run", run), mock.patch.object(ingest, "_stop", threading.Event()), \
+                self.assertLogs("tracker.ingest", "ERROR") as logs:
+            ingest._lead()
+        self.assertEqual(turns, [0, 1])
+        self.assertIn("handing the schedule to another worker", logs.output[0])
+
+
+
+class MetricsTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        scratch = self.settings(METRICS_DIR=self.dir, METRICS_TOKEN="")
+        scratch.enable()
+        self.addCleanup(scratch.disable)
+        # This process's own series start empty
+        for name in ("_counters", "_histograms"):
+            patcher = mock.patch.object(metrics, name, {})
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def write(self, name, counters=(), histograms=()):
+        (self.dir / name).write_text(json.dumps({"counters": list(counters), "histograms": list(histograms)}),
+                                     encoding="utf-8")
+
+    def dead_pid(self):
+        proc = subprocess.Popen(["true"])
+        proc.wait()
+        return proc.pid
+
+    def test_collect_sums_every_process(self):
+        hit = ["nhc_cache_lookups_total", [["result", "hit"]]]
+        fetch = ["nhc_fetch_duration_seconds", [["outcome", "ok"]]]
+        self.write("101.json", [hit + [2]], [fetch + [[1] * 12 + [1, 0.5]]])
+        self.write("102.json", [hit + [3], ["nhc_cache_lookups_total", [["result", "miss"]], 1]],
+                   [fetch + [[0] * 11 + [2, 2, 12.0]]])
+        self.write(metrics.RETIRED, [hit + [5]])
+        (self.dir / "103.json").write_text("{", encoding="utf-8")  # caught mid-write: skipped
+        metrics.inc("nhc_cache_lookups_total", result="hit")
+        totals = metrics.collect()
+        self.assertEqual(totals["counters"], {
+            ("nhc_cache_lookups_total", (("result", "hit"),)): 11,
+            ("nhc_cache_lookups_total", (("result", "miss"),)): 1,
+        })
+        self.assertEqual(totals["histograms"], {("nhc_fetch_duration_seconds", (("outcome", "ok"),)):
+                                                [1] * 11 + [3, 3, 12.5]})
+        # collect() flushed this process's own file first
+        self.assertTrue((self.dir / f"{os.getpid()}.json").exists())
+
+    def test_dead_processes_are_retired(self):
+        dead_pid = self.dead_pid()
+        hit = ["nhc_cache_lookups_total", [["result", "hit"]]]
+        self.write(metrics.RETIRED, [hit + [5]])
+        self.write(f"{dead_pid}.json", [hit + [4]])
+        self.write(f"{os.getppid()}.json", [hit + [1]])
+        before = metrics.collect()["counters"]
+        metrics._retire_dead()
+        self.assertFalse((self.dir / f"{dead_pid}.json").exists())
+        self.assertTrue((self.dir / f"{os.getppid()}.json").exists())
+        self.assertEqual(json.loads((self.dir / metrics.RETIRED).read_text())["counters"], [hit + [9]])
+        # Totals don't go backwards when a worker is replaced
+        self.assertEqual(metrics.collect()["counters"], before)
+
+    def test_render(self):
+        metrics.inc("nhc_cache_lookups_total", 2, result="hit")
+        metrics.inc("storms_geojson_responses_total", source='a"b\\c\nd')
+        metrics.observe("nhc_fetch_duration_seconds", 0.25, outcome="ok")
+        metrics.observe("nhc_fetch_duration_seconds", 0.5, outcome="ok")
+        lines = metrics.render().splitlines()
+        for line in [
+            "# HELP nhc_cache_lookups_total " + metrics.METRICS["nhc_cache_lookups_total"][1],
+            "# TYPE nhc_cache_lookups_total counter",
+            'nhc_cache_lookups_total{result="hit"} 2',
+            'storms_geojson_responses_total{source="a\\"b\\\\c\\nd"} 1',
+            "# TYPE nhc_fetch_duration_seconds histogram",
+            'nhc_fetch_duration_seconds_bucket{outcome="ok",le="0.1"} 0',
+            'nhc_fetch_duration_seconds_bucket{outcome="ok",le="0.25"} 1',
+            'nhc_fetch_duration_seconds_bucket{outcome="ok",le="0.5"} 2',
+            'nhc_fetch_duration_seconds_bucket{outcome="ok",le="30"} 2',
+            'nhc_fetch_duration_seconds_bucket{outcome="ok",le="+Inf"} 2',
+            'nhc_fetch_duration_seconds_sum{outcome="ok"} 0.75',
+            'nhc_fetch_duration_seconds_count{outcome="ok"} 2',
+        ]:
+            with self.subTest(line=line):
+                self.assertIn(line, lines)
+        # Metrics nothing has recorded yet are still declared
+        self.assertIn("# TYPE geocode_lookups_total counter", lines)
+
+    def test_metrics_view(self):
+        self.client.get("/api/shelters/near", secure=True)  # a 400
+        resp = self.client.get("/metrics", secure=True)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        lines = resp.content.decode().splitlines()
+        self.assertIn('http_request_duration_seconds_count{method="GET",status="400",view="shelters_near"} 1', lines)
+        self.assertIn('http_response_size_bytes_count{view="shelters_near"} 1', lines)
+        # Scrapes aren't counted themselves
+        self.assertFalse([line for line in lines if 'view="metrics"' in line])
+
+    def test_metrics_view_token(self):
+        with self.settings(METRICS_TOKEN="s3cret"):
+            self.assertEqual(self.client.get("/metrics", secure=True).status_code, 401)
+            resp = self.client.get("/metrics", secure=True, headers={"authorization": "Bearer wrong"})
+            self.assertEqual(resp.status_code, 401)
+            resp = self.client.get("/metrics", secure=True, headers={"authorization": "Bearer s3cret"})
+            self.assertEqual(resp.status_code, 200)
+
+class ChangeJournalTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+
+    def layer(self, name, *features):
+        path = self.dir / f"{name}.geojson"
+        _write_geojson(path, *(features or [_point(name)]))
+        return path
+
+    def test_first_fold_starts_a_journal(self):
+        journal = advisories.fold_changes(None, [self.layer("al012025_cone_001")], {}, {})
+        self.assertEqual(journal["seq"], 1)
+        self.assertEqual(journal["layers"]["al012025/cone"]["advisory"], "001")
+        self.assertEqual(journal["layers"]["al012025/cone"]["seq"], 1)
+
+    def test_unchanged_files_fold_to_none(self):
+        paths = [self.layer("al012025_cone_001"), self.layer("al012025_track_001")]
+        journal = advisories.fold_changes(None, paths, {}, {})
+        self.assertIsNone(advisories.fold_changes(journal, paths, {}, {}))
+
+    def test_only_changed_layers_get_the_new_seq(self):
+        cone, track = self.layer("al012025_cone_001"), self.layer("al012025_track_001")
+        journal = advisories.fold_changes(None, [cone, track], {}, {})
+        cursor = advisories.format_cursor(journal)
+        journal = advisories.fold_changes(journal, [self.layer("al012025_cone_002"), track], {}, {})
+        self.assertEqual(advisories.changes_since(journal, cursor), (False, ["al012025/cone"], []))
+        # A new storm name re-enriches the layers, so they're sent again
+        journal = advisories.fold_changes(journal, [self.layer("al012025_cone_002"), track],
+                                          {"al012025": {"name": "Andrea", "type": "TS"}}, {})
+        self.assertEqual(advisories.changes_since(journal, cursor)[1], ["al012025/cone", "al012025/track"])
+
+    def test_removed_layers_leave_tombstones(self):
+        cone, track = self.layer("al012025_cone_001"), self.layer("al012025_track_001")
+        journal = advisories.fold_changes(None, [cone, track], {}, {})
+        cursor = advisories.format_cursor(journal)
+        journal = advisories.fold_changes(journal, [cone], {}, {})
+        self.assertEqual(journal["removed"], {"al012025/track": 2})
+        self.assertEqual(advisories.changes_since(journal, cursor), (False, [], ["al012025/track"]))
+        # Up to date: nothing to send
+        self.assertEqual(advisories.changes_since(journal, advisories.format_cursor(journal)), (False, [], []))
+        # A layer that comes back drops its tombstone
+        journal = advisories.fold_changes(journal, [cone, track], {}, {})
+        self.assertEqual(journal["removed"], {})
+
+    def test_unusable_cursors_reset(self):
+        journal = advisories.fold_changes(None, [self.layer("al012025_cone_001")], {}, {})
+        everything = (True, ["al012025/cone"], [])
+        for cursor in (None, "", "garbage", f"{journal['epoch']}:x", "otherepoch:1",
+                       f"{journal['epoch']}:{journal['seq'] + 1}"):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(advisories.changes_since(journal, cursor), everything)
+        # A new journal (epoch change) resets even a cursor that was current
+        fresh = advisories.fold_changes(None, [self.layer("al012025_cone_001")], {}, {})
+        self.assertEqual(advisories.changes_since(fresh, advisories.format_cursor(journal)), everything)
+
+    def test_pruned_tombstones_raise_the_floor(self):
+        paths = [self.layer(f"al{i:02d}2025_cone_001") for i in range(1, 5)]
+        journal = advisories.fold_changes(None, paths, {}, {})
+        stale = advisories.format_cursor(journal)
+        with mock.patch.object(advisories, "TOMBSTONES_KEPT", 2):
+            for i in range(3):
+                journal = advisories.fold_changes(journal, paths[:3 - i], {}, {})
+        self.assertEqual(len(journal["removed"]), 2)
+        self.assertEqual(journal["floor"], 2)
+        # The client at seq 1 missed a pruned tombstone: it has to start over
+        self.assertTrue(advisories.changes_since(journal, stale)[0])
+        reset, _, removed = advisories.changes_since(journal, f"{journal['epoch']}:2")
+        self.assertFalse(reset)
+        self.assertEqual(removed, ["al022025/cone", "al032025/cone"])
+
+
+
+class StormStreamTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        settings = self.settings(STORM_DATA_DIR=self.dir, STORM_STREAM_POLL=0.01, STORM_STREAM_HEARTBEAT=0.2,
+                                 STORM_STREAM_RETRY_MS=1500)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def ingest(self, *names):
+        paths = []
+        for name in names:
+            paths.append(self.dir / f"{name}.geojson")
+            _write_geojson(paths[-1], _point(name))
+        return advisories.format_cursor(advisories.update_changes(self.dir, paths, {}, {}))
+
+    def test_changes_event(self):
+        first = self.ingest("al012025_cone_001", "al012025_track_001", "ep052025_cone_010")
+        second = self.ingest("al012025_cone_002", "al012025_track_001")
+        journal = advisories.read_changes(self.dir)
+        self.assertEqual(events.changes_event(journal, first), {
+            "cursor": second, "reset": False,
+            "layers": [{"stormId": "al012025", "kind": "cone", "advisory": "002"}],
+            "removed": ["ep052025"],
+        })
+        self.assertIsNone(events.changes_event(journal, second))
+        everything = events.changes_event(journal, None)
+        self.assertTrue(everything["reset"])
+        self.assertEqual([layer["kind"] for layer in everything["layers"]], ["cone", "track"])
+        # A storm that still has a layer isn't gone, only the layer is
+        self.ingest("al012025_cone_002")
+        self.assertEqual(events.changes_event(advisories.read_changes(self.dir), second)["removed"], [])
+
+    def test_format_event(self):
+        self.assertEqual(events.format_event("changes", {"cursor": "e:1", "layers": []}, "e:1"),
+                         b'id: e:1\nevent: changes\ndata: {"cursor":"e:1","layers":[]}\n\n')
+        self.assertEqual(events.format_event("ping"), b"event: ping\ndata: null\n\n")
+
+    def test_wsgi_answers_once_with_a_catch_up(self):
+        resp = self.client.get("/api/storms/stream?since=x:1", secure=True)
+        self.assertEqual(resp.content, b"retry: 1500\n\n")  # no journal yet
+        self.assertEqual(resp["Content-Type"], "text/event-stream")
+        self.assertEqual(resp["Cache-Control"], "no-cache")
+        first = self.ingest("al012025_cone_001")
+        second = self.ingest("al012025_cone_002")
+        body = self.client.get(f"/api/storms/stream?since={first}", secure=True).content.decode()
+        self.assertTrue(body.startswith("retry: 1500\n\nid: " + second + "\nevent: changes\n"))
+        # Last-Event-ID (an EventSource reconnecting) wins over ?since=
+        resp = self.client.get(f"/api/storms/stream?since={first}", secure=True, headers={"last-event-id": second})
+        self.assertEqual(resp.content, b"retry: 1500\n\n")
+        self.assertEqual(self.client.get("/api/storms/stream", secure=True).content, b"retry: 1500\n\n")
+
+    async def next_event(self, stream):
+        return (await asyncio.wait_for(anext(stream), 2)).decode()
+
+    async def test_stream_pushes_each_ingest(self):
+        first = self.ingest("al012025_cone_001")
+        stream = events.stream(first)
+        try:
+            self.assertEqual(await self.next_event(stream), "retry: 1500\n\n")
+            broadcaster = events._broadcaster()
+            self.assertEqual(len(broadcaster.queues), 1)
+            second = self.ingest("al012025_cone_002")
+            event = await self.next_event(stream)
+            self.assertTrue(event.startswith(f"id: {second}\nevent: changes\ndata: "))
+            data = json.loads(event.split("data: ", 1)[1])
+            self.assertEqual(data["layers"], [{"stormId": "al012025", "kind": "cone", "advisory": "002"}])
+            # Nothing new: a heartbeat comment keeps the connection alive
+            self.assertEqual(await self.next_event(stream), ": ping\n\n")
+        finally:
+            await stream.aclose()
+        # The last client gone, the poller stops
+        self.assertEqual(broadcaster.queues, set())
+        await asyncio.wait_for(broadcaster.task, 1)
+
+    async def test_stream_catches_up_a_stale_cursor(self):
+        first = self.ingest("al012025_cone_001")
+        second = self.ingest("al012025_cone_002")
+        for cursor, expected in [(first, f"id: {second}\n"), (second, ": ping"), (None, ": ping")]:
+            with self.subTest(cursor=cursor):
+                stream = events.stream(cursor)
+                try:
+                    self.assertEqual(await self.next_event(stream), "retry: 1500\n\n")
+                    self.assertTrue((await self.next_event(stream)).startswith(expected))
+                finally:
+                    await stream.aclose()
+
+    async def test_stuck_client_is_dropped(self):
+        self.ingest("al012025_cone_001")
+        stream = events.stream()
+        try:
+            with mock.patch.object(events, "QUEUE_SIZE", 1):
+                await self.next_event(stream)
+            broadcaster = events._broadcaster()
+            for name in ("al012025_cone_002", "al012025_cone_003"):
+                self.ingest(name)
+                await asyncio.sleep(0.1)
+            # Its backlog was swapped for a hang-up; EventSource reconnects and catches up
+            with self.assertRaises(StopAsyncIteration):
+                await asyncio.wait_for(anext(stream), 2)
+            self.assertEqual(broadcaster.queues, set())
+        finally:
+            await stream.aclose()
+
+    async def test_asgi_view_holds_the_stream_open(self):
+        first = self.ingest("al012025_cone_001")
+        second = self.ingest("al012025_cone_002")
+        resp = await self.async_client.get("/api/storms/stream", secure=True, headers={"last-event-id": first})
+        self.assertEqual(resp["Content-Type"], "text/event-stream")
+        self.assertEqual(resp["X-Accel-Buffering"], "no")
+        chunks = aiter(resp.streaming_content)
+        try:
+            self.assertEqual(await self.next_event(chunks), "retry: 1500\n\n")
+            self.assertTrue((await self.next_event(chunks)).startswith(f"id: {second}\n"))
+        finally:
+            await chunks.aclose()
+
+class DownloadZipTests(SimpleTestCase):
+    URL = "https://www.nhc.noaa.gov/gis/forecast/archive/al012025_5day_010.zip"
+    VALIDATORS = {"url": URL, "etag": '"abc"', "last_modified": None}
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.session = mock.Mock()
+        patchers = [
+            mock.patch.object(download_storms, "DATA_DIR", tmp.name),
+            mock.patch.object(download_storms, "get_session", lambda: self.session),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def download(self):
+        return download_storms.download_and_convert_zip("al012025", "010", self.URL, self.VALIDATORS)
+
+    def test_304_with_the_files_on_disk_is_not_modified(self):
+        for path in download_storms.output_paths("al012025", "010").values():
+            Path(path).touch()
+        self.session.get.return_value = mock.Mock(status_code=304)
+        with self.assertLogs("download_storms", "INFO"):
+            self.assertEqual(self.download(), ("not_modified", self.VALIDATORS))
+        self.assertEqual(self.session.get.call_args.kwargs["headers"], {"If-None-Match": '"abc"'})
+
+    def test_304_without_the_files_downloads_again(self):
+        again = mock.Mock(status_code=500)
+        again.raise_for_status.side_effect = requests.HTTPError("500")
+        self.session.get.side_effect = [mock.Mock(status_code=304), again]
+        with self.assertLogs("download_storms", "INFO") as logs:
+            status, _ = self.download()
+        self.assertEqual(status, "failed")  # not "not_modified": the run isn't ok
+        self.assertIn("downloading it again", logs.output[1])
+        self.assertEqual(self.session.get.call_count, 2)
+        self.assertNotIn("headers", self.session.get.call_args.kwargs)
+
+
+class StormsGeojsonTestCase(SimpleTestCase):
+    """A temporary STORMS_DIR with two storms, and NHC unreachable."""
+
+    FILES = ("al012025_cone_001", "al012025_cone_002", "al012025_track_001", "al012025_track_002",
+             "ep052025_cone_010", "ep052025_track_009")
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        for name in self.FILES:
+            _write_geojson(self.dir / f"{name}.geojson", _point(name))
+        patchers = [
+            mock.patch.object(views, "STORMS_DIR", self.dir),
+            mock.patch.object(nhc, "acurrent_storms", mock.AsyncMock(side_effect=nhc.UpstreamUnavailable)),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = Client()
+
+    def get(self, query, **headers):
+        resp = self.client.get(f"/api/storms.geojson{query}", secure=True, headers=headers)
+        self.addCleanup(resp.close)  # snapshots are sent as open files
+        return resp
+
+    def names(self, resp):
+        body = b"".join(resp.streaming_content) if resp.streaming else resp.content
+        return sorted(f["properties"]["name"] for f in json.loads(body)["features"])
+
+
+class StormFilterTests(StormsGeojsonTestCase):
+    def filters(self, query):
+        return views._storm_filters(RequestFactory().get(f"/api/storms.geojson{query}"))
+
+    def test_parsing(self):
+        self.assertEqual(self.filters(""), {})
+        self.assertEqual(self.filters("?latest=yes&storm=AL012025&kind=Cone&advisory_min=2&advisory_max=010A"),
+                         {"latest": True, "storm": "al012025", "kind": "cone",
+                          "advisory_min": "2", "advisory_max": "010A"})
+        self.assertEqual(self.filters("?latest=0&storm=%20&kind="), {})
+
+    def test_bad_values_are_400s(self):
+        for query, message in [
+            ("?kind=polygon", "kind must be"),
+            ("?advisory_min=first", "advisory_min must be an advisory number"),
+            ("?advisory_max=1-2", "advisory_max must be an advisory number"),
+            ("?tolerance=5", "tolerance must be in"),
+            ("?tolerance=fine", "tolerance must be in (0, 1] degrees"),
+            ("?tolerance=nan", "tolerance must be in (0, 1] degrees"),
+            ("?zoom=close", "zoom must be an integer"),
+            ("?zoom=4.5", "zoom must be an integer"),
+        ]:
+            with self.subTest(query=query):
+                resp = self.get(query)
+                self.assertEqual(resp.status_code, 400)
+                self.assertIn(message, resp.json()["error"])
+
+    def test_filters_select_files(self):
+        self.assertEqual(self.names(self.get("?latest=1&kind=cone")), ["al012025_cone_002", "ep052025_cone_010"])
+        self.assertEqual(self.names(self.get("?storm=al012025&advisory_max=1")),
+                         ["al012025_cone_001", "al012025_track_001"])
+        self.assertEqual(self.names(self.get("?kind=track&advisory_min=5")), ["ep052025_track_009"])
+        self.assertEqual(self.names(self.get("?storm=al992025")), [])
+
+
+
+def _vertices(fc, name):
+    geom = next(f["geometry"] for f in fc["features"] if f["properties"]["name"] == name)
+    return geom["coordinates"][0]
+
+
+class StormDetailTests(StormsGeojsonTestCase):
+    def setUp(self):
+        super().setUp()
+        circle = shapely.geometry.mapping(shapely.Point(-80, 25).buffer(2, quad_segs=64))
+        _write_geojson(self.dir / "al012025_cone_002.geojson",
+                       {"type": "Feature", "geometry": circle, "properties": {"name": "circle"}})
+
+    def detail(self, query):
+        return views._storm_detail(RequestFactory().get(f"/api/storms.geojson{query}"))
+
+    def collection(self, query):
+        resp = self.get(query)
+        self.assertEqual(resp.status_code, 200)
+        try:
+            return json.loads(b"".join(resp.streaming_content) if resp.streaming else resp.content)
+        finally:
+            resp.close()
+
+    def test_parsing(self):
+        self.assertIsNone(self.detail(""))
+        self.assertEqual(self.detail("?zoom=2"), (3, 0.05, 2))  # below the coarsest level
+        self.assertEqual(self.detail("?zoom=6"), (5, 0.02, 3))
+        self.assertEqual(self.detail("?zoom=9"), (9, 0.001, 4))
+        self.assertIsNone(self.detail(f"?zoom={advisories.FULL_DETAIL_ZOOM}"))
+        self.assertEqual(self.detail("?tolerance=0.01"), (None, 0.01, 3))
+        self.assertEqual(self.detail("?tolerance=0.2&zoom=9"), (None, 0.2, 2))  # tolerance wins
+
+    def test_simplify_geometry(self):
+        line = {"type": "LineString", "coordinates": [[-80 + i / 100, 25 + (i % 2) / 10000] for i in range(101)]}
+        simplified = advisories.simplify_geometry(line, 0.01, 3)
+        self.assertEqual(simplified, {"type": "LineString", "coordinates": [[-80.0, 25.0], [-79.0, 25.0]]})
+        point = {"type": "Point", "coordinates": [-80.123456, 25.987654]}
+        self.assertEqual(advisories.simplify_geometry(point, 0.5, 2)["coordinates"], [-80.12, 25.99])
+        # Smaller than the grid it's snapped to: gone
+        speck = _square(-80, 25, 0.001)
+        self.assertIsNone(advisories.simplify_geometry(speck, 0.05, 2))
+        self.assertIsNone(advisories.simplify_geometry(None, 0.05, 2))
+
+    def test_simplify_collection_copies(self):
+        fc = {"type": "FeatureCollection", "features": [
+            {"type": "Feature", "geometry": _square(-80.00001, 25, 1), "properties": {"name": "square"}},
+            {"type": "Feature", "geometry": {"type": "Polygon", "coordinates": "bad"}, "properties": {"name": "bad"}},
+        ]}
+        before = json.dumps(fc)
+        out = advisories.simplify_collection(fc, 0.05)
+        self.assertEqual(json.dumps(fc), before)
+        self.assertIn([-80.0, 25.0], out["features"][0]["geometry"]["coordinates"][0])
+        # What can't be simplified goes out as it came in
+        self.assertEqual(out["features"][1]["geometry"], fc["features"][1]["geometry"])
+
+    def test_zoom_levels_coarsen_the_geometry(self):
+        full = _vertices(self.collection(""), "circle")
+        self.assertEqual(len(full), 257)
+        counts = [len(_vertices(self.collection(f"?zoom={zoom}"), "circle")) for zoom in (3, 5, 7, 9)]
+        self.assertEqual(counts, sorted(counts))
+        self.assertLess(counts[-1], len(full))
+        self.assertLess(counts[0], 40)
+        coarse = _vertices(self.collection("?zoom=3"), "circle")
+        self.assertTrue(all(round(c, 2) == c for vertex in coarse for c in vertex))
+        self.assertEqual(_vertices(self.collection("?zoom=12"), "circle"), full)
+
+    def test_snapshot_levels_match_live_builds(self):
+        live = {zoom: _vertices(self.collection(f"?zoom={zoom}"), "circle") for zoom in (4, 8)}
+        advisories.build_snapshot(self.dir)
+        for zoom, vertices in live.items():
+            with self.subTest(zoom=zoom):
+                resp = self.get(f"?zoom={zoom}")
+                try:
+                    self.assertIsInstance(resp, FileResponse)
+                    fc = json.loads(b"".join(resp.streaming_content))
+                finally:
+                    resp.close()
+                self.assertEqual(_vertices(fc, "circle"), vertices)
+
+class StormSnapshotTests(StormsGeojsonTestCase):
+    def setUp(self):
+        super().setUp()
+        self.digest, _ = advisories.build_snapshot(self.dir)
+
+    def test_snapshot_has_a_strong_etag(self):
+        resp = self.get("")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["ETag"], f'"{self.digest}"')
+        self.assertEqual(resp["Cache-Control"], "no-cache")
+        self.assertEqual(len(self.names(resp)), len(self.FILES))
+
+    def test_matching_etag_is_a_304(self):
+        for if_none_match in (f'"{self.digest}"', f'"stale", "{self.digest}"', "*"):
+            with self.subTest(if_none_match=if_none_match):
+                resp = self.get("", if_none_match=if_none_match)
+                self.assertEqual(resp.status_code, 304)
+                self.assertEqual(resp["ETag"], f'"{self.digest}"')
+        self.assertEqual(self.get("", if_none_match='"stale"').status_code, 200)
+
+    def test_new_ingest_changes_the_etag(self):
+        _write_geojson(self.dir / "al012025_cone_003.geojson", _point("al012025_cone_003"))
+        digest, _ = advisories.build_snapshot(self.dir)
+        self.assertNotEqual(digest, self.digest)
+        resp = self.get("", if_none_match=f'"{self.digest}"')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["ETag"], f'"{digest}"')
+
+    def test_management_command_builds_from_the_data_dir(self):
+        _write_geojson(self.dir / "al012025_cone_003.geojson", _point("al012025_cone_003"))
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with self.settings(STORM_DATA_DIR=self.dir), \
+                mock.patch.object(nhc, "current_storms", side_effect=nhc.UpstreamUnavailable):
+            call_command("build_storm_snapshot", stdout=stdout, stderr=stderr)
+        digest, _ = advisories.current_snapshot(self.dir, "storms")
+        self.assertNotEqual(digest, self.digest)
+        self.assertEqual(stdout.getvalue(), f"Storm snapshot {digest[:12]} ({len(self.FILES) + 1} features)\n")
+        self.assertIn("NHC unavailable", stderr.getvalue())
+
+    def test_latest_snapshot_and_precompressed_variants(self):
+        resp = self.get("?latest=1", accept_encoding="gzip")
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        self.assertEqual(resp["Vary"], "Accept-Encoding")
+        body = gzip.decompress(b"".join(resp.streaming_content))
+        names = sorted(f["properties"]["name"] for f in json.loads(body)["features"])
+        self.assertEqual(names, ["al012025_cone_002", "al012025_track_002", "ep052025_cone_010", "ep052025_track_009"])
+        etag = resp["ETag"]
+        self.assertNotEqual(etag, f'"{self.digest}"')
+        self.assertEqual(self.get("?latest=1", if_none_match=etag).status_code, 304)
+
+
+def _layer(name, advdate, *geometries):
+    features = [{"type": "Feature", "geometry": g, "properties": {"name": name, "ADVDATE": advdate}}
+                for g in geometries]
+    return json.dumps({"type": "FeatureCollection", "features": features}).encode("utf-8")
+
+
+def _square(lon, lat, size=1.0):
+    return {"type": "Polygon", "coordinates": [[[lon, lat], [lon + size, lat], [lon + size, lat + size],
+                                                [lon, lat + size], [lon, lat]]]}
+
+
+# archive.store() commits through the raw sqlite3 connection, which a
+# TestCase's wrapping transaction wouldn't survive
+class AdvisoryArchiveTests(TransactionTestCase):
+    AL01 = "500 PM AST Mon Aug 11 2025"  # 21:00 UTC
+    EP05 = "200 AM MST Tue Aug 12 2025"  # 09:00 UTC
+
+    def setUp(self):
+        connection.ensure_connection()
+        self.conn = connection.connection
+        # Florida, and one of the points well out in the Atlantic
+        self.store("al012025", "cone", "001", _layer("al01 cone", self.AL01, _square(-82, 25)))
+        self.store("al012025", "points", "001", _layer("al01 points", self.AL01, _point("")["geometry"],
+                                                       {"type": "Point", "coordinates": [-60.0, 30.0]}))
+        self.store("ep052025", "cone", "010", _layer("ep05 cone", self.EP05, _square(-110, 15)))
+
+    def store(self, storm_id, kind, advisory, body):
+        return archive.store(self.conn, storm_id, kind, advisory, body)
+
+    def get(self, query=""):
+        return self.client.get(f"/api/advisories{query}", secure=True)
+
+    def features(self, query=""):
+        resp = self.get(query)
+        self.assertEqual(resp.status_code, 200)
+        body = resp.json()
+        names = [f["properties"]["name"] + ("@{},{}".format(*f["geometry"]["coordinates"])
+                                            if f["geometry"]["type"] == "Point" else "")
+                 for f in body["features"]]
+        return sorted(names), body["truncated"]
+
+    def test_store_reports_what_changed(self):
+        body = _layer("al01 cone", self.AL01, _square(-82, 25))
+        self.assertEqual(self.store("al012025", "cone", "001", body), "unchanged")
+        self.assertEqual(self.store("AL012025", "cone", "001", _layer("al01 cone", self.AL01, _square(-83, 25))),
+                         "replaced")
+        self.assertEqual(self.store("al012025", "cone", "002A", body), "archived")
+        row = Advisory.objects.get(storm_id="al012025", kind="cone", advisory="002A")
+        self.assertEqual(row.advisory_rank, 201)
+        self.assertEqual(row.issue_time, dt.datetime(2025, 8, 11, 21, tzinfo=dt.timezone.utc))
+        self.assertEqual(row.feature_collection()["features"][0]["properties"]["name"], "al01 cone")
+        # The R-tree follows the replacement, and rows deleted through the ORM
+        self.assertEqual(self.features("?bbox=-81.9,25,-81.1,26&advisory_max=1")[0], [])
+        Advisory.objects.filter(advisory="002A").delete()
+        with connection.cursor() as cur:
+            cur.execute(f"SELECT count(*) FROM {archive.RTREE}")
+            self.assertEqual(cur.fetchone()[0], 3)
+
+    def test_advdate_and_rank_parsing(self):
+        self.assertEqual(archive.parse_advdate("1100 AM EDT Sat Sep 27 2025"),
+                         dt.datetime(2025, 9, 27, 15, tzinfo=dt.timezone.utc))
+        self.assertEqual(archive.parse_advdate("1200 AM CST Wed Oct 01 2025"),
+                         dt.datetime(2025, 10, 1, 6, tzinfo=dt.timezone.utc))
+        for text in (None, "", "500 PM XYZ Mon Aug 11 2025", "1300 PM AST Mon Aug 11 2025",
+                     "500 PM AST Mon Feb 30 2025"):
+            with self.subTest(text=text):
+                self.assertIsNone(archive.parse_advdate(text))
+        self.assertEqual([archive.advisory_rank(a) for a in ("7", "012A", "12B")], [700, 1201, 1202])
+        with self.assertRaises(ValueError):
+            archive.advisory_rank("first")
+
+    def test_everything_oldest_first(self):
+        resp = self.get()
+        self.assertEqual(resp["Cache-Control"], "public, max-age=300")
+        props = [f["properties"] for f in resp.json()["features"]]
+        self.assertEqual([(p["stormId"], p["kind"], p["advisory"]) for p in props],
+                         [("al012025", "cone", "001"), ("al012025", "points", "001"),
+                          ("al012025", "points", "001"), ("ep052025", "cone", "010")])
+        self.assertEqual(props[0]["issueTime"], "2025-08-11T21:00:00+00:00")
+
+    def test_bbox_selects_layers_and_features(self):
+        features, truncated = self.features("?bbox=-87.6,24.4,-80,31")
+        self.assertEqual(features, ["al01 cone", "al01 points@-80.0,25.0"])
+        self.assertFalse(truncated)
+        self.assertEqual(self.features("?bbox=-61,29,-59,31")[0], ["al01 points@-60.0,30.0"])
+        self.assertEqual(self.features("?bbox=-180,-90,180,90&kind=cone")[0], ["al01 cone", "ep05 cone"])
+        self.assertEqual(self.features("?bbox=0,0,1,1")[0], [])
+
+    def test_time_window(self):
+        self.assertEqual(self.features("?start=2025-08-12")[0], ["ep05 cone"])
+        # A bare end date takes in the whole day
+        self.assertEqual(len(self.features("?end=2025-08-11")[0]), 3)
+        self.assertEqual(self.features("?start=2025-08-11T20:00&end=2025-08-11T21:30:00Z&kind=cone")[0],
+                         ["al01 cone"])
+        self.assertEqual(self.features("?start=2025-08-11T17:01:00-04:00&kind=cone")[0], ["ep05 cone"])
+        # Through the R-tree's time axis as well
+        self.assertEqual(self.features("?bbox=-180,-90,180,90&start=2025-08-12T00:00")[0], ["ep05 cone"])
+        self.assertEqual(self.features("?bbox=-180,-90,180,90&end=2025-08-11&kind=cone")[0], ["al01 cone"])
+
+    def test_storm_and_advisory_filters(self):
+        self.assertEqual(self.features("?storm=EP052025")[0], ["ep05 cone"])
+        self.assertEqual(self.features("?advisory_min=2")[0], ["ep05 cone"])
+        self.assertEqual(self.features("?advisory_max=1&kind=cone")[0], ["al01 cone"])
+
+    def test_limit_counts_layers(self):
+        features, truncated = self.features("?limit=1")
+        self.assertEqual(features, ["al01 cone"])
+        self.assertTrue(truncated)
+        self.assertFalse(self.features("?limit=3")[1])
+        with mock.patch.object(views, "ARCHIVE_LIMIT", 2):
+            self.assertEqual(self.features(), (["al01 cone", "al01 points@-60.0,30.0",
+                                                                "al01 points@-80.0,25.0"], True))
+
+    def test_bad_values_are_400s(self):
+        bbox = "bbox must be min_lon,min_lat,max_lon,max_lat"
+        limit = f"limit must be between 1 and {views.ARCHIVE_MAX_LIMIT}"
+        for query, message in [
+            ("?bbox=1,2,3", bbox),
+            ("?bbox=a,b,c,d", bbox),
+            ("?bbox=10,0,0,10", bbox),
+            ("?bbox=nan,0,1,1", bbox),
+            ("?start=yesterday", "'yesterday' is not an ISO date or datetime"),
+            ("?end=2025-08-11T25:00", "'2025-08-11T25:00' is not an ISO date or datetime"),
+            ("?limit=0", limit),
+            ("?limit=ten", limit),
+            (f"?limit={views.ARCHIVE_MAX_LIMIT + 1}", limit),
+            ("?latest=1", "latest is not supported on the archive"),
+            ("?kind=polygon", "kind must be 'cone', 'track' or 'points'"),
+        ]:
+            with self.subTest(query=query):
+                resp = self.get(query)
+                self.assertEqual(resp.status_code, 400)
+                self.assertEqual(resp.json(), {"error": message})
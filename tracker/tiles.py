@@ -0,0 +1,208 @@
+"""
+Vector tiles for /tiles/<layer>/<z>/<x>/<y>.mvt
+
+Layers:
+  cones, tracks  latest advisory per storm, from the GeoJSON data directory
+  shelters       Shelter points
+
+Source features are loaded once per data version per process and indexed
+with an STRtree; each tile is clipped with shapely in tile space. Rendered
+tiles are kept on disk under settings.TILE_CACHE_DIR/<layer>/<version>/, and
+<version> changes whenever a new advisory or shelter import lands, which
+retires the old tiles. Empty tiles are not written: only tiles that touch
+the data are, so requests for arbitrary coordinates can't fill the disk.
+"""
+from pathlib import Path
+import hashlib
+import math
+import os
+import shutil
+import threading
+
+import numpy as np
+import shapely
+from shapely import STRtree
+from shapely.geometry import Point, shape
+from django.conf import settings
+
+from . import advisories, mvt
+from .models import DatasetVersion, Shelter
+
+EXTENT = 4096
+BUFFER = 64  # tile units of overlap so strokes don't seam at tile edges
+MAX_ZOOM = 16
+MAX_LAT = 85.0511287798
+LAYERS = {"cones": "cone", "tracks": "track", "shelters": None}
+
+_sources = {}
+_sources_lock = threading.Lock()
+
+
+def _storms_dir():
+    return Path(settings.STORM_DATA_DIR)
+
+
+def layer_version(layer):
+    """Opaque token that changes whenever the layer's source data changes."""
+    if layer == "shelters":
+        return f"v{DatasetVersion.current('shelters')}"
+
+    data_dir = _storms_dir()
+    paths = advisories.select_files(advisories.index_storm_files(data_dir), kind=LAYERS[layer], latest=True)
+    names_file = data_dir / "storm_names.json"
+    h = hashlib.sha1()
+    for p in [*paths, names_file]:
+        try:
+            st = p.stat()
+        except OSError:
+            continue
+        h.update(f"{p.name}:{st.st_mtime_ns}:{st.st_size};".encode())
+    return h.hexdigest()[:16]
+
+
+def _load_storm_layer(layer):
+    data_dir = _storms_dir()
+    name_lookup = advisories.load_name_lookup(data_dir)
+    paths = advisories.select_files(advisories.index_storm_files(data_dir), kind=LAYERS[layer], latest=True)
+    geoms, props = [], []
+    for feat in advisories.build_feature_collection(paths, name_lookup, {})["features"]:
+        if not feat.get("geometry"):
+            continue
+        geoms.append(shape(feat["geometry"]))
+        props.append({k: v for k, v in feat["properties"].items() if isinstance(v, (str, int, float, bool))})
+    return geoms, props, [None] * len(geoms)
+
+
+def _load_shelter_layer():
+    geoms, props, ids = [], [], []
+    rows = Shelter.objects.values_list(
+        "id", "longitude", "latitude", "name", "city", "county", "capacity", "is_pet_friendly"
+    )
+    for pk, lon, lat, name, city, county, capacity, pets in rows.iterator(chunk_size=2000):
+        if lat is None or lon is None:
+            continue
+        geoms.append(Point(lon, lat))
+        props.append({
+            "name": name, "city": city, "county": county,
+            "capacity": capacity, "is_pet_friendly": pets,
+        })
+        ids.append(pk)
+    return geoms, props, ids
+
+
+def _source(layer, version):
+    """(geoms, props, ids, STRtree) for `layer` at `version`, loaded once per process."""
+    cached = _sources.get(layer)
+    if cached and cached[0] == version:
+        return cached[1]
+    with _sources_lock:
+        cached = _sources.get(layer)
+        if cached and cached[0] == version:
+            return cached[1]
+        if layer == "shelters":
+            geoms, props, ids = _load_shelter_layer()
+        else:
+            geoms, props, ids = _load_storm_layer(layer)
+        src = (geoms, props, ids, STRtree(geoms))
+        _sources[layer] = (version, src)
+        return src
+
+
+def tile_bounds(z, x, y):
+    """(west, south, east, north) in degrees for a slippy-map tile."""
+    n = 2 ** z
+
+    def lat(ty):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / n))))
+
+    return x / n * 360 - 180, lat(y + 1), (x + 1) / n * 360 - 180, lat(y)
+
+
+def _to_tile(z, x, y):
+    n = 2 ** z
+
+    def project(coords):
+        lon = coords[:, 0]
+        lat = np.radians(np.clip(coords[:, 1], -MAX_LAT, MAX_LAT))
+        px = ((lon + 180) / 360 * n - x) * EXTENT
+        py = ((1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / math.pi) / 2 * n - y) * EXTENT
+        return np.column_stack([px, py])
+
+    return project
+
+
+def _ints(coords):
+    return [(int(round(cx)), int(round(cy))) for cx, cy in coords]
+
+
+def _mvt_parts(g):
+    """Split a clipped tile-space geometry into (mvt type, parts)."""
+    points, lines, polygons = [], [], []
+    for part in shapely.get_parts(g):
+        t = part.geom_type
+        if t == "Point":
+            points.append(_ints(part.coords)[0])
+        elif t == "LineString":
+            lines.append(_ints(part.coords))
+        elif t == "Polygon":
+            polygons.append([_ints(part.exterior.coords), *(_ints(r.coords) for r in part.interiors)])
+        elif t.startswith("Multi") or t == "GeometryCollection":
+            sub_type, sub_parts = _mvt_parts(part)
+            {mvt.POINT: points, mvt.LINESTRING: lines, mvt.POLYGON: polygons}.get(sub_type, []).extend(sub_parts)
+    if polygons:
+        return mvt.POLYGON, polygons
+    if lines:
+        return mvt.LINESTRING, lines
+    return mvt.POINT, points
+
+
+def render_tile(layer, z, x, y, version):
+    geoms, props, ids, tree = _source(layer, version)
+    west, south, east, north = tile_bounds(z, x, y)
+    pad_x = (east - west) * BUFFER / EXTENT
+    pad_y = (north - south) * BUFFER / EXTENT
+    bbox = shapely.box(west - pad_x, south - pad_y, east + pad_x, north + pad_y)
+
+    project = _to_tile(z, x, y)
+    features = []
+    for i in sorted(tree.query(bbox, predicate="intersects")):
+        g = shapely.transform(geoms[i], project)
+        if g.geom_type != "Point":
+            g = shapely.clip_by_rect(g, -BUFFER, -BUFFER, EXTENT + BUFFER, EXTENT + BUFFER)
+            g = g.simplify(0.5, preserve_topology=True)
+        if g.is_empty:
+            continue
+        geom_type, parts = _mvt_parts(g)
+        features.append({"id": ids[i], "type": geom_type, "geometry": parts, "properties": props[i]})
+    return mvt.encode_layer(layer, features, extent=EXTENT)
+
+
+def get_tile(layer, z, x, y):
+    """
+    Return (tile bytes, version), rendering into the disk cache on a miss;
+    the bytes are b"" for a tile with no features.
+    """
+    version = layer_version(layer)
+    layer_dir = Path(settings.TILE_CACHE_DIR) / layer
+    version_dir = layer_dir / version
+    path = version_dir / str(z) / str(x) / f"{y}.mvt"
+    try:
+        return path.read_bytes(), version
+    except OSError:
+        pass
+
+    if not version_dir.exists():
+        # New data landed: drop tiles rendered for older versions
+        if layer_dir.exists():
+            for old in layer_dir.iterdir():
+                if old.name != version:
+                    shutil.rmtree(old, ignore_errors=True)
+
+    body = render_tile(layer, z, x, y, version)
+    if not body:
+        return body, version
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(body)
+    os.replace(tmp, path)
+    return body, version
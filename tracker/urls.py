@@ -4,7 +4,18 @@ from . import views
 urlpatterns = [
     path("", views.index, name="index"),
     path("api/shelters/", views.shelter_list, name="shelter_list"),
+    path("api/shelters/<int:shelter_id>", views.shelter_detail, name="shelter_detail"),
+    path("api/shelters/near", views.shelters_near, name="shelters_near"),
+    path("api/geocode", views.geocode, name="geocode"),
+    path("api/geocode/remote", views.geocode_remote, name="geocode_remote"),
     path("api/storms/", views.storms_api, name="storms_api"),
     path("api/storms.geojson", views.storms_geojson, name="storms_geojson"),
+    path("api/storms/changes", views.storm_changes, name="storm_changes"),
+    path("api/storms/stream", views.storm_stream, name="storm_stream"),
+    path("api/storms/files/<str:name>", views.storm_file, name="storm_file"),
+    path("api/storms/<str:storm_id>/shelters", views.storm_shelters, name="storm_shelters"),
     path("api/nhc/current", views.nhc_current, name="nhc_current"),
+    path("api/advisories", views.advisory_archive, name="advisory_archive"),
+    path("metrics", views.metrics_view, name="metrics"),
+    path("tiles/<str:layer>/<int:z>/<int:x>/<int:y>.mvt", views.vector_tile, name="vector_tile"),
 ]
@@ -1,279 +1,905 @@
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+import hashlib
+import logging
+import math
 import os
 import json
-import requests
+import threading
 
+import shapely
 from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
-from django.http import JsonResponse
+from django.db.models.expressions import RawSQL
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.urls import reverse
+from django.utils.dateparse import parse_date, parse_datetime
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST, require_GET
-from .models import Shelter
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition, require_POST, require_GET
+from shapely.geometry import shape
+
+from . import advisories, archive, columnar, events, gazetteer, geocoder, metrics, nhc, shelter_index, shelter_risk, tiles
+from .http import in_thread
+from .models import Advisory, DatasetVersion, Shelter
+
+logger = logging.getLogger(__name__)
 
 def index(request):
     shelters = Shelter.objects.all()
     return render(request, "index.html", {"shelters": shelters})
 
 
+SHELTER_FIELDS = (
+    "name", "address", "city", "county", "zip_code", "latitude", "longitude",
+    "capacity", "is_pet_friendly", "notes", "shelter_type", "status",
+)
+# Selectable with fields=; levels come back as names, flood_risk as {scenario: level}
+SHELTER_RISK_FIELDS = (
+    "surge_zone", "flood_zone", "is_ehpa", "is_special_needs", "has_generator", "generator_kw",
+    "risk_capacity", "surge_risk_100yr", "surge_risk_500yr", "rain_risk_100yr", "rain_risk_500yr",
+    "flood_risk",
+)
+SHELTER_DECODERS = {
+    **{field: shelter_risk.level_name for field in shelter_risk.COLUMN_SCENARIOS},
+    "flood_risk": shelter_risk.unpack,
+}
+SHELTER_COLUMNAR_TTL = 24 * 3600  # keys carry the import version; this only bounds disk use
+
+
+def _parse_bool(value):
+    value = (value or "").strip().lower()
+    if value in ("1", "true", "yes", "y"):
+        return True
+    if value in ("0", "false", "no", "n"):
+        return False
+    return None
+
+
+_counties = None  # (shelters version, {lower-case name: [stored spellings]})
+_counties_lock = threading.Lock()
+
+
+def _csv_param(value, parse):
+    return [parse(v.strip()) for v in value.split(",") if v.strip()]
+
+
+def _county_spellings():
+    """
+    {lower-case county: its stored spellings}, built once per shelter import
+    (the "shelters" DatasetVersion) like the gazetteer.
+    """
+    global _counties
+    version = DatasetVersion.current("shelters")
+    counties = _counties
+    if counties is not None and counties[0] == version:
+        return counties[1]
+    with _counties_lock:
+        if _counties is None or _counties[0] != version:
+            spellings = {}
+            for county in Shelter.objects.values_list("county", flat=True).distinct():
+                spellings.setdefault(county.lower(), []).append(county)
+            _counties = (version, spellings)
+        return _counties[1]
+
+
+def _shelter_filters(q, qs):
+    """
+    Apply the attribute filters of /api/shelters. Every one is an equality
+    (or IN) test or the capacity range, so they combine into a scan of one
+    of Shelter's composite indexes; see Shelter.Meta.indexes for which
+    combinations have one. Raises ValueError with a message for the client.
+    """
+    if q.get("county"):
+        spellings = _county_spellings()
+        # Map to the stored spelling so the lookup stays an exact (indexed) match
+        counties = [c for name in _csv_param(q["county"], str) for c in spellings.get(name.lower(), ())]
+        qs = qs.filter(county__in=counties)
+    if q.get("surge_zone"):
+        try:
+            zones = _csv_param(q["surge_zone"], shelter_risk.parse_surge_zone)
+        except ValueError:
+            raise ValueError("surge_zone must be none or 1-5 (comma-separated for several)")
+        qs = qs.filter(surge_zone__in=zones)
+    for field in shelter_risk.COLUMN_SCENARIOS:
+        if q.get(field):
+            qs = qs.filter(**{f"{field}__in": _csv_param(q[field], shelter_risk.parse_level)})
+    for param, field in (("generator", "has_generator"), ("ehpa", "is_ehpa"),
+                         ("special_needs", "is_special_needs"), ("pet_friendly", "is_pet_friendly")):
+        if q.get(param):
+            value = _parse_bool(q[param])
+            if value is None:
+                raise ValueError(f"{param} must be 1 or 0")
+            qs = qs.filter(**{field: value})
+    if q.get("min_capacity"):
+        try:
+            qs = qs.filter(risk_capacity__gte=int(q["min_capacity"]))
+        except ValueError:
+            raise ValueError("min_capacity must be an integer")
+    return qs
+
+
+def _decode_rows(fields, rows):
+    decoders = [SHELTER_DECODERS.get(f) for f in fields]
+    for row in rows:
+        yield tuple(d(v) if d else v for d, v in zip(decoders, row))
+
+
+def _shelters_etag(request, *args, **kwargs):
+    # One version per import; the URL (fields/bbox/cursor) keys the rest
+    return f"shelters-v{DatasetVersion.current('shelters')}"
+
+
+def _stream_json_rows(fields, rows, batch=500):
+    """Yield a JSON array of {field: value} objects, a batch of rows at a time."""
+    yield "["
+    first = True
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps(dict(zip(fields, row)), separators=(",", ":")))
+        if len(chunk) >= batch:
+            yield ("" if first else ",") + ",".join(chunk)
+            first, chunk = False, []
+    if chunk:
+        yield ("" if first else ",") + ",".join(chunk)
+    yield "]"
+
+
+@gzip_page
+@require_GET
+@condition(etag_func=_shelters_etag)
 def shelter_list(request):
-    shelters = Shelter.objects.all()
-    data = [
-        {
-            "name": s.name,
-            "address": s.address,
-            "city": s.city,
-            "county": s.county,
-            "zip_code": s.zip_code,
-            "latitude": s.latitude,
-            "longitude": s.longitude,
-            "capacity": s.capacity,
-            "is_pet_friendly": s.is_pet_friendly,
-            "notes": s.notes,
-            "shelter_type": s.shelter_type,
-            "status": s.status,
-        }
-        for s in shelters
-    ]
+    """
+    All shelters as a streamed JSON array.
+
+    Optional:
+      fields=name,latitude,...        projection (default: every public field)
+      bbox=minLon,minLat,maxLon,maxLat
+      limit=N&cursor=<id>             keyset paging; the next cursor comes back
+                                      in X-Next-Cursor / Link when more rows exist
+      format=columnar                 binary columns instead of JSON (tracker/columnar.py),
+                                      columnar.MAP_FIELDS unless fields= says otherwise;
+                                      encoded once per import version and query
+    """
+    q = request.GET
+    fmt = q.get("format", "json")
+    if fmt not in ("json", "columnar"):
+        return JsonResponse({"error": "format must be json or columnar"}, status=400)
+    fields = SHELTER_FIELDS if fmt == "json" else columnar.MAP_FIELDS
+    if q.get("fields"):
+        fields = tuple(f.strip() for f in q["fields"].split(",") if f.strip())
+        if fmt == "json":
+            allowed = set(SHELTER_FIELDS) | set(SHELTER_RISK_FIELDS) | {"id"}
+        else:
+            allowed = set(columnar.COLUMN_TYPES)
+        unknown = set(fields) - allowed
+        if unknown or not fields:
+            return JsonResponse({"error": f"unknown fields: {', '.join(sorted(unknown)) or '(none given)'}"}, status=400)
+
+    qs = Shelter.objects.order_by("id")
+    if q.get("bbox"):
+        try:
+            min_lon, min_lat, max_lon, max_lat = (float(v) for v in q["bbox"].split(","))
+        except ValueError:
+            return JsonResponse({"error": "bbox must be minLon,minLat,maxLon,maxLat"}, status=400)
+        qs = qs.filter(
+            latitude__gte=min_lat, latitude__lte=max_lat,
+            longitude__gte=min_lon, longitude__lte=max_lon,
+        )
+    try:
+        qs = _shelter_filters(q, qs)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    limit = None
+    try:
+        if q.get("cursor"):
+            qs = qs.filter(id__gt=int(q["cursor"]))
+        if q.get("limit"):
+            limit = int(q["limit"])
+            if not 0 < limit <= 10000:
+                raise ValueError
+    except ValueError:
+        return JsonResponse({"error": "cursor must be an id and limit 1-10000"}, status=400)
+
+    next_cursor = None
+    if limit is not None:
+        # Peek one past the page to know whether there's a next one
+        ids = list(qs.values_list("id", flat=True)[: limit + 1])
+        if len(ids) > limit:
+            next_cursor = ids[limit - 1]
+        qs = qs[:limit]
+
+    if fmt == "columnar":
+        version = DatasetVersion.current("shelters")
+        params = sorted((k, v) for k, v in q.lists() if k != "format")
+        key = f"shelters:columnar:v{version}:" + hashlib.sha1(repr((fields, params)).encode("utf-8")).hexdigest()
+        body = cache.get(key)
+        if body is None:
+            body = columnar.encode(fields, qs.values_list(*fields), version)
+            cache.set(key, body, SHELTER_COLUMNAR_TTL)
+        resp = HttpResponse(body, content_type="application/octet-stream")
+    else:
+        rows = qs.values_list(*fields).iterator(chunk_size=2000)
+        if set(fields) & set(SHELTER_DECODERS):
+            rows = _decode_rows(fields, rows)
+        resp = StreamingHttpResponse(_stream_json_rows(fields, rows), content_type="application/json")
+    resp["Cache-Control"] = "public, max-age=60"
+    if next_cursor is not None:
+        params = q.copy()
+        params["cursor"] = next_cursor
+        resp["X-Next-Cursor"] = str(next_cursor)
+        resp["Link"] = f'<{request.path}?{params.urlencode()}>; rel="next"'
+    return resp
+
+
+@gzip_page
+@require_GET
+@condition(etag_func=_shelters_etag)
+def shelter_detail(request, shelter_id):
+    """One shelter in the shelter_list shape; the map's popups load it on open."""
+    row = Shelter.objects.filter(id=shelter_id).values("id", *SHELTER_FIELDS).first()
+    if row is None:
+        return JsonResponse({"error": "unknown shelter"}, status=404)
+    resp = JsonResponse(row)
+    resp["Cache-Control"] = "public, max-age=60"
+    return resp
+
+
+@require_GET
+def shelters_near(request):
+    """
+    Shelters within radius_km (default 50) of lat/lon, nearest first.
+    Optional k (max results, default 500) and pet_friendly=1|0.
+    Each row is the shelter_list shape plus distance_km.
+    """
+    try:
+        lat = float(request.GET["lat"])
+        lon = float(request.GET["lon"])
+        radius_km = float(request.GET.get("radius_km", 50))
+        k = int(request.GET.get("k", 500))
+    except (KeyError, ValueError):
+        return JsonResponse({"error": "lat and lon are required numbers"}, status=400)
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180) or not 0 < radius_km <= 1000 or not 0 < k <= 5000:
+        return JsonResponse({"error": "lat/lon, radius_km (0-1000] or k (0-5000] out of range"}, status=400)
+
+    index = shelter_index.get_index()
+    ids, dists = index.nearby(lat, lon, radius_km, k=k, pet_friendly=_parse_bool(request.GET.get("pet_friendly")))
+
+    ids = ids.tolist()
+    rows = {r.pop("id"): r for r in Shelter.objects.filter(id__in=ids).values("id", *SHELTER_FIELDS)} if ids else {}
+    data = []
+    for pk, d in zip(ids, dists.tolist()):
+        row = rows.get(pk)
+        if row is not None:
+            row["distance_km"] = round(d, 3)
+            data.append(row)
     return JsonResponse(data, safe=False)
 
 
-def storms_api(request):
+@require_GET
+def geocode(request):
     """
-    Legacy mapping: returns {storm_id: {cone: url, track: url, name: ..., advisory: ...}}
-    from files under tracker/static/tracker/data. Kept for backward compatibility.
+    Autocomplete over the local gazetteer (tracker/gazetteer.py): ZIPs,
+    cities, counties and municipalities from the shelter inventory that
+    match the start of ?q= (or of a later word), best first. Optional
+    limit (default 8, max 20). Each hit has lat/lon (mean of the place's
+    shelters), bbox [min_lon, min_lat, max_lon, max_lat] and its shelter
+    count.
     """
-    data_dir = os.path.join(settings.BASE_DIR, "tracker", "static", "tracker", "data")
-    storms = {}
+    try:
+        limit = int(request.GET.get("limit", 8))
+    except ValueError:
+        return JsonResponse({"error": "limit must be an integer"}, status=400)
+    if not 0 < limit <= 20:
+        return JsonResponse({"error": "limit must be between 1 and 20"}, status=400)
+    q = request.GET.get("q", "")[:100]
+
+    places = gazetteer.get_gazetteer()
+    resp = JsonResponse({"query": q, "results": places.search(q, limit)})
+    resp["Cache-Control"] = "public, max-age=300"
+    return resp
+
+
+@require_GET
+async def geocode_remote(request):
+    """
+    ?q= resolved by the remote geocoder (Nominatim, bounded to Florida) for
+    places the local gazetteer doesn't know, through tracker/geocoder.py's
+    cache, coalescing and shared rate limit. Results have the /api/geocode
+    shape; "cached" says whether the answer came from the cache. 429 with
+    Retry-After when the upstream budget is spent.
+    """
+    try:
+        query, results, cached = await geocoder.alookup(request.GET.get("q", ""))
+    except ValueError:
+        return JsonResponse({"error": "q is required"}, status=400)
+    except geocoder.RateLimited as e:
+        resp = JsonResponse({"error": "geocoder busy, try again shortly"}, status=429)
+        resp["Retry-After"] = str(max(1, math.ceil(e.retry_after)))
+        return resp
+    except geocoder.UpstreamUnavailable:
+        return JsonResponse({"error": "geocoder unavailable"}, status=502)
+    resp = JsonResponse({"query": query, "results": results, "cached": cached})
+    resp["Cache-Control"] = "public, max-age=3600"
+    return resp
+
+
+def _mark_stale(resp, nhc_storms):
+    """Flag a response built from the last good NHC copy (upstream down) with when it was fetched."""
+    if getattr(nhc_storms, "stale", False):
+        resp["X-NHC-Stale"] = _isoformat(nhc_storms.fetched_at)
+    return resp
+
+
+def _isoformat(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat(timespec="seconds")
 
-    # Local name mapping (optional)
-    storm_name_file = os.path.join(data_dir, "storm_names.json")
-    name_lookup = {}
-    if os.path.exists(storm_name_file):
-        try:
-            with open(storm_name_file, "r", encoding="utf-8") as f:
-                name_lookup = json.load(f)
-        except Exception:
-            pass
 
+def _legacy_storm_map(nhc_storms):
+    """
+    {storm_id: {"name", "advisory", <kind>: url}} for the newest advisory file
+    of each storm and kind, the same selection as /api/storms.geojson?latest=1.
+    URLs point at the published (hashed, precompressed, immutable) copies once
+    the ingest has made them.
+    """
+    name_lookup = advisories.load_name_lookup(STORMS_DIR)
     # Supplement with live NHC data (best-effort)
+    for storm in nhc_storms:
+        sid = str(storm.get("id") or "").lower()
+        if sid and not name_lookup.get(sid, {}).get("name"):
+            name_lookup[sid] = {"name": storm.get("name") or ""}
+
+    published = advisories.read_manifest(STORMS_DIR)
+    storms = {}
+    for path in advisories.select_files(advisories.index_storm_files(STORMS_DIR), latest=True):
+        storm_id, kind, advisory = path.stem.split("_")
+        storm_id = storm_id.lower()
+        name = (name_lookup.get(storm_id) or {}).get("name") or f"Unnamed Storm ({storm_id.upper()})"
+        storm = storms.setdefault(storm_id, {"name": name, "advisory": advisory})
+        # Kinds can lag (no new track with an intermediate advisory); report the newest
+        if advisories.advisory_key(advisory) > advisories.advisory_key(storm["advisory"]):
+            storm["advisory"] = advisory
+        entry = published.get(path.name)
+        if entry:
+            storm[kind.lower()] = reverse("storm_file", args=[entry["file"]])
+        else:
+            storm[kind.lower()] = f"/static/tracker/data/{path.name}"
+    return storms
+
+
+async def storms_api(request):
+    """
+    Legacy mapping: returns {storm_id: {cone: url, track: url, name: ..., advisory: ...}}
+    from files under tracker/static/tracker/data. Kept for backward compatibility.
+    The URLs are the files' published copies (storm_file), which never change.
+    """
     try:
-        resp = requests.get("https://www.nhc.noaa.gov/CurrentStorms.json", timeout=6)
-        resp.raise_for_status()
-        nhc_data = resp.json()
-        for storm in nhc_data:
-            sid = storm.get("id")
-            nm = storm.get("name")
-            if sid and (sid not in name_lookup or not str(name_lookup[sid]).strip()):
-                name_lookup[sid] = nm
-    except Exception:
-        pass
-
-    # Build the legacy mapping from local files
-    if os.path.isdir(data_dir):
-        for filename in os.listdir(data_dir):
-            if filename.endswith(".geojson"):
-                parts = filename.split("_")
-                if len(parts) == 3:
-                    storm_id, kind, advisory = parts
-                    key = storm_id
-                    storms.setdefault(key, {"advisory": advisory})
-                    storms[key][kind] = f"/static/tracker/data/{filename}"
-
-                    # Friendly name if available
-                    name = name_lookup.get(storm_id)
-                    if not name or not str(name).strip():
-                        name = f"Unnamed Storm ({storm_id.upper()})"
-                    storms[key]["name"] = name
-
-    return JsonResponse(storms)
+        nhc_storms = await nhc.acurrent_storms()
+    except nhc.UpstreamUnavailable:
+        nhc_storms = []
+    return _mark_stale(JsonResponse(await in_thread(_legacy_storm_map)(nhc_storms)), nhc_storms)
+
+
+@require_GET
+async def storm_file(request, name):
+    """
+    One advisory file as published by the ingest (advisories.publish_files):
+    the name carries a hash of the content, so the response is cacheable
+    forever, and it's sent precompressed (br or gzip) when the client takes it.
+    """
+    variants = await in_thread(advisories.published_file)(STORMS_DIR, name)
+    if variants is None:
+        raise Http404("No such published advisory file")
+    digest = advisories.PUBLISHED_NAME_RE.match(name).group("hash")
+    return _snapshot_response(request, digest, variants, content_type="application/geo+json",
+                              cache_control="public, max-age=31536000, immutable")
 
 
 # Directory where your .geojson storm files are written
-STORMS_DIR = Path(settings.BASE_DIR) / "tracker" / "static" / "tracker" / "data"
+STORMS_DIR = Path(settings.STORM_DATA_DIR)
+# Parsed, enriched features per advisory file for live builds, per process
+FEATURE_CACHE = advisories.FeatureCache(settings.STORM_FEATURE_CACHE_MB * 2**20)
+
+
+def _preferred_encoding(request, available):
+    """Pick br > gzip > identity from what the client accepts and what's on disk."""
+    accepted = {}
+    for part in request.headers.get("Accept-Encoding", "").split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if token:
+            accepted[token.lower()] = q
+    for encoding in ("br", "gzip"):
+        if encoding in available and accepted.get(encoding, 0) > 0:
+            return encoding
+    return "identity"
 
 
-def storms_geojson(request):
+def _etag_matches(request, etag):
+    if_none_match = request.headers.get("If-None-Match", "")
+    return etag in [t.strip() for t in if_none_match.split(",")] or if_none_match.strip() == "*"
+
+
+def _open_and_read(path, size):
+    f = open(path, "rb")
+    return f, f.read(size)
+
+
+async def _aread_file(path, chunk_size=256 * 1024):
+    # One thread hop for open + first chunk; a short read means we're done
+    f, chunk = await in_thread(_open_and_read)(path, chunk_size)
+    try:
+        while chunk:
+            yield chunk
+            if len(chunk) < chunk_size:
+                break
+            chunk = await in_thread(f.read)(chunk_size)
+    finally:
+        f.close()
+
+
+def _snapshot_response(request, digest, variants, content_type="application/json", cache_control="no-cache"):
+    """
+    Stream a prebuilt snapshot with a strong ETag; 304 if the client has it.
+    By default clients always revalidate, so unchanged data costs a 304.
+    """
+    etag = f'"{digest}"'
+    if _etag_matches(request, etag):
+        resp = HttpResponseNotModified()
+    else:
+        encoding = _preferred_encoding(request, variants)
+        path = variants[encoding]
+        if isinstance(request, ASGIRequest):
+            # Read in a worker thread per chunk instead of blocking the event loop
+            resp = StreamingHttpResponse(_aread_file(path), content_type=content_type)
+            resp["Content-Length"] = str(os.path.getsize(path))
+        else:
+            resp = FileResponse(open(path, "rb"), content_type=content_type)
+            del resp["Content-Disposition"]
+        if encoding != "identity":
+            resp["Content-Encoding"] = encoding
+    resp["ETag"] = etag
+    resp["Vary"] = "Accept-Encoding"
+    resp["Cache-Control"] = cache_control
+    return resp
+
+
+def _storm_filters(request):
+    """
+    Parse ?latest=1&storm=&kind=&advisory_min=&advisory_max= into kwargs for
+    advisories.select_files(). Raises ValueError on malformed input.
+    """
+    q = request.GET
+    filters = {}
+    if q.get("latest", "").lower() in ("1", "true", "yes"):
+        filters["latest"] = True
+    storm = q.get("storm", "").strip().lower()
+    if storm:
+        filters["storm"] = storm
+    kind = q.get("kind", "").strip().lower()
+    if kind:
+        if kind not in ("cone", "track", "points"):
+            raise ValueError("kind must be 'cone', 'track' or 'points'")
+        filters["kind"] = kind
+    for param in ("advisory_min", "advisory_max"):
+        val = q.get(param, "").strip()
+        if val:
+            if advisories.advisory_key(val) == (-1, ""):
+                raise ValueError(f"{param} must be an advisory number")
+            filters[param] = val
+    return filters
+
+
+def _storm_detail(request):
+    """
+    Parse ?zoom= or ?tolerance= into (level, tolerance, decimals), where
+    level is a precomputed SIMPLIFY_LEVELS key (None for an ad-hoc tolerance).
+    Returns None for full detail. Raises ValueError on malformed input.
+    """
+    tolerance = request.GET.get("tolerance", "").strip()
+    if tolerance:
+        try:
+            tol = float(tolerance)
+        except ValueError:
+            tol = 0
+        if not 0 < tol <= 1:
+            raise ValueError("tolerance must be in (0, 1] degrees")
+        return None, tol, advisories.decimals_for_tolerance(tol)
+    zoom = request.GET.get("zoom", "").strip()
+    if zoom:
+        try:
+            zoom = int(zoom)
+        except ValueError:
+            raise ValueError("zoom must be an integer") from None
+        level = advisories.detail_level(zoom)
+        if level is not None:
+            return (level, *advisories.SIMPLIFY_LEVELS[level])
+    return None
+
+
+def _build_live_collection(filters, detail, name_lookup, nhc_types):
+    with metrics.timer("storms_geojson_phase_seconds", phase="scan"):
+        if filters:
+            files = advisories.select_files(advisories.index_storm_files(STORMS_DIR), **filters)
+        else:
+            files = advisories.storm_files(STORMS_DIR)
+    timings = {}
+    fc = advisories.build_feature_collection(files, name_lookup, nhc_types, timings, cache=FEATURE_CACHE)
+    for phase, seconds in timings.items():
+        metrics.observe("storms_geojson_phase_seconds", seconds, phase=phase)
+    metrics.observe("storms_geojson_files", len(files))
+    if detail is not None:
+        _, tolerance, decimals = detail
+        with metrics.timer("storms_geojson_phase_seconds", phase="simplify"):
+            fc = advisories.simplify_collection(fc, tolerance, decimals)
+
+    logger.debug("storms_geojson files=%d features=%d dir=%s", len(files), len(fc["features"]), STORMS_DIR)
+    with metrics.timer("storms_geojson_phase_seconds", phase="encode"):
+        return JsonResponse(fc)
+
+
+async def storms_geojson(request):
     """
     Combine every *.geojson in STORMS_DIR and enrich with:
       - properties.stormName (friendly name)
       - properties.status   (e.g., "Tropical Storm", "Hurricane Cat 2")
       - properties.title    (e.g., "Tropical Storm Iova")
+
+    Optional filters: latest=1 (newest advisory per storm/kind), storm=,
+    kind=cone|track, advisory_min=, advisory_max=. They are answered from the
+    file-name index, so files that don't match are never opened.
+
+    zoom= (map zoom) or tolerance= (degrees) returns simplified geometries
+    with coordinates quantized to match.
+
+    download_storms.py prebuilds the unfiltered and latest=1 collections (at
+    every zoom detail level) at ingest time; those are sent as files and
+    nothing is parsed per request. Live builds run in a worker thread so the
+    event loop stays free under ASGI, and only parse files that changed
+    since this worker last read them (FEATURE_CACHE).
     """
-    if not STORMS_DIR.exists():
+    try:
+        filters = _storm_filters(request)
+        detail = _storm_detail(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    snapshot_name = {(): "storms", ("latest",): "storms-latest"}.get(tuple(filters))
+    if detail is not None:
+        level = detail[0]
+        snapshot_name = f"{snapshot_name}-z{level}" if snapshot_name and level is not None else None
+    if snapshot_name:
+        snap = await in_thread(advisories.current_snapshot)(STORMS_DIR, snapshot_name)
+        if snap is not None:
+            metrics.inc("storms_geojson_responses_total", source="snapshot")
+            return _snapshot_response(request, *snap)
+
+    metrics.inc("storms_geojson_responses_total", source="live")
+    if not await in_thread(STORMS_DIR.exists)():
         return JsonResponse({"type": "FeatureCollection", "features": []})
 
     # 1) Local names (optional)
-    storm_name_file = STORMS_DIR / "storm_names.json"
-    name_lookup = {}
-    if storm_name_file.exists():
+    name_lookup = await in_thread(advisories.load_name_lookup)(STORMS_DIR)
+
+    # 2) Live NHC supplement (adds stormType)
+    nhc_storms, nhc_types = [], {}  # sid -> stormType string
+    with metrics.timer("storms_geojson_phase_seconds", phase="nhc"):
         try:
-            with open(storm_name_file, "r", encoding="utf-8") as fh:
-                raw = json.load(fh)
-            for sid, val in raw.items():
-                sid = sid.lower()
-                if isinstance(val, dict):
-                    name_lookup[sid] = {
-                        "name": (val.get("name") or "").strip(),
-                        "type": (val.get("type") or "").strip(),
-                    }
-                else:
-                    name_lookup[sid] = {"name": str(val).strip(), "type": ""}
-        except Exception:
+            nhc_storms = await nhc.acurrent_storms()
+            nhc_types = advisories.merge_nhc_storms(name_lookup, nhc_storms)
+        except nhc.UpstreamUnavailable:
             pass
 
-    # 2) Live NHC supplement (adds stormType)
-    nhc_types = {}  # sid -> stormType string
+    resp = await in_thread(_build_live_collection)(filters, detail, name_lookup, nhc_types)
+    return _mark_stale(resp, nhc_storms)
+
+
+def _layer_features(journal, keys, detail):
+    """Enriched (and, with a detail level, simplified) features of each journal layer in `keys`."""
+    layers = journal["layers"]
+    name_lookup = {k.split("/")[0]: {"name": v["name"], "type": v["type"]} for k, v in layers.items()}
+    out = []
+    for key in keys:
+        layer = layers[key]
+        storm_id, kind = key.split("/")
+        try:
+            features = FEATURE_CACHE.features(STORMS_DIR / layer["file"], name_lookup, {})
+        except OSError:
+            continue  # replaced since the journal was read; the next cursor brings it
+        if detail is not None:
+            _, tolerance, decimals = detail
+            features = advisories.simplify_collection({"features": features}, tolerance, decimals)["features"]
+        out.append({"stormId": storm_id, "kind": kind, "advisory": layer["advisory"], "features": features})
+    return out
+
+
+@require_GET
+def storm_changes(request):
+    """
+    Delta feed over the newest advisory per storm/kind (what ?latest=1
+    serves). ?since=<cursor> from the previous response returns only the
+    layers added or replaced after it, plus "removed" storm ids (and
+    "removedLayers" for storms that are still active); a client that's up
+    to date gets an empty delta. Without a usable cursor the response has
+    "reset": true and every layer. Each layer's features replace whatever
+    the client holds for that (stormId, kind). zoom=/tolerance= work as on
+    /api/storms.geojson.
+
+    The cursor is the ingest sequence download_storms.py writes to the
+    change journal (advisories.update_changes).
+    """
     try:
-        resp = requests.get("https://www.nhc.noaa.gov/CurrentStorms.json", timeout=6)
-        resp.raise_for_status()
-        for s in resp.json():
-            sid = (s.get("id") or "").lower()
-            stype = (s.get("stormType") or "").strip()  # e.g., "Tropical Storm", "Hurricane"
-            if sid:
-                nhc_types[sid] = stype
-                if sid not in name_lookup:
-                    name_lookup[sid] = {"name": (s.get("name") or "").strip(), "type": stype}
-                else:
-                    if stype and not name_lookup[sid].get("type"):
-                        name_lookup[sid]["type"] = stype
-    except Exception:
-        pass
-
-    def classify_from_props(props):
-        # direct text fields
-        for k in ("status", "stormType", "type", "CLASS", "Class", "system", "SYSTEM"):
-            v = str(props.get(k, "")).strip()
-            if v:
-                return v
-
-        # code fields (TS/HU/TD etc.)
-        code = str(props.get("INTENSITY") or props.get("TCtype") or "").upper().strip()
-        cmap = {
-            "TD": "Tropical Depression",
-            "TS": "Tropical Storm",
-            "HU": "Hurricane",
-            "SS": "Subtropical Storm",
-            "SD": "Subtropical Depression",
-            "EX": "Extratropical",
-            "PT": "Post-Tropical",
-            "LO": "Low",
-            "DB": "Disturbance",
+        detail = _storm_detail(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    journal = advisories.read_changes(STORMS_DIR)
+    if journal is None:
+        # No snapshot build yet: answer from the directory and leave the client without a cursor
+        name_lookup = advisories.load_name_lookup(STORMS_DIR)
+        latest = advisories.select_files(advisories.index_storm_files(STORMS_DIR), latest=True)
+        journal = advisories.fold_changes(None, latest, name_lookup, {}) or advisories.empty_journal()
+        cursor = None
+    else:
+        cursor = advisories.format_cursor(journal)
+
+    reset, updated, tombstones = advisories.changes_since(journal, request.GET.get("since"))
+    live = {k.split("/")[0] for k in journal["layers"]}
+    removed_layers = [k.split("/") for k in tombstones]
+    data = {
+        "cursor": cursor,
+        "reset": reset,
+        "layers": _layer_features(journal, updated, detail),
+        "removed": sorted({sid for sid, _ in removed_layers if sid not in live}),
+        "removedLayers": [{"stormId": sid, "kind": kind} for sid, kind in removed_layers if sid in live],
+    }
+    if not data["removedLayers"]:
+        del data["removedLayers"]
+    resp = JsonResponse(data)
+    resp["Cache-Control"] = "no-cache"
+    return resp
+
+
+@require_GET
+async def storm_stream(request):
+    """
+    Server-Sent Events: one small "changes" event per ingest that touched
+    the newest advisories (see tracker/events.py), which tells the map to
+    pull /api/storms/changes. The client's cursor comes from Last-Event-ID
+    on reconnects, else ?since=. Under ASGI the stream stays open; under WSGI
+    it answers once and EventSource's reconnects do the polling.
+    """
+    last_event_id = request.headers.get("Last-Event-ID") or request.GET.get("since")
+    if isinstance(request, ASGIRequest):
+        resp = StreamingHttpResponse(events.stream(last_event_id), content_type="text/event-stream")
+        resp["X-Accel-Buffering"] = "no"  # don't let a proxy hold events back
+    else:
+        resp = HttpResponse(await in_thread(events.catch_up)(last_event_id), content_type="text/event-stream")
+    resp["Cache-Control"] = "no-cache"
+    return resp
+
+
+@require_GET
+def storm_shelters(request, storm_id):
+    """
+    Shelters inside the storm's latest forecast cone, optionally grown by
+    ?buffer_km=, with capacity totals. Cached per (storm, advisory, buffer,
+    shelter import) so repeat map loads skip the geometry work.
+    """
+    try:
+        buffer = float(request.GET.get("buffer_km", 0))
+    except ValueError:
+        return JsonResponse({"error": "buffer_km must be a number"}, status=400)
+    if not 0 <= buffer <= 500:
+        return JsonResponse({"error": "buffer_km must be between 0 and 500"}, status=400)
+
+    storm_id = storm_id.lower()
+    latest = advisories.latest_file(advisories.index_storm_files(STORMS_DIR), storm_id, "cone")
+    if latest is None:
+        return JsonResponse({"error": f"no forecast cone for {storm_id}"}, status=404)
+    advisory, cone_path = latest
+
+    index = shelter_index.get_index()
+    try:
+        cache_key = f"storm-shelters:{storm_id}:{advisory}:{cone_path.stat().st_mtime_ns}:{buffer:g}:{index.version}"
+        data = cache.get(cache_key)
+        area = None if data is not None else advisories.buffer_km(advisories.load_area(cone_path), buffer)
+    except FileNotFoundError:
+        # Removed (a storm leaving the feed) since the directory was listed
+        return JsonResponse({"error": f"no forecast cone for {storm_id}"}, status=404)
+    if data is None:
+        ids = index.within(area).tolist()
+        shelters = list(Shelter.objects.filter(id__in=ids).order_by("county", "city", "name").values("id", *SHELTER_FIELDS))
+        data = {
+            "stormId": storm_id,
+            "advisory": advisory,
+            "buffer_km": buffer,
+            "count": len(shelters),
+            "total_capacity": sum(s["capacity"] or 0 for s in shelters),
+            "pet_friendly_count": sum(1 for s in shelters if s["is_pet_friendly"]),
+            "shelters": shelters,
         }
-        if code in cmap:
-            if code == "HU":
-                cat = props.get("SS") or props.get("SAFFIR_SIMPSON") or props.get("Category") or props.get("category")
-                if cat:
-                    return f"Hurricane Cat {cat}"
-            return cmap[code]
-
-        # wind-based inference
-        wind_keys = ("MAX_WIND_MPH", "MAX_WIND", "Vmax", "V_MAX", "VMAX", "MAX_WIND_KTS")
-        vmax = None
-        for k in wind_keys:
-            if k in props and props[k] not in (None, "", "NA"):
-                try:
-                    n = float(props[k])
-                    vmax = n * 1.15078 if ("KTS" in k or (k == "Vmax" and n < 120)) else n
-                except Exception:
-                    pass
-                break
-        if vmax is not None:
-            if vmax < 39:
-                return "Tropical Depression"
-            if vmax < 74:
-                return "Tropical Storm"
-            cat = 5 if vmax >= 157 else 4 if vmax >= 130 else 3 if vmax >= 111 else 2 if vmax >= 96 else 1
-            return f"Hurricane Cat {cat}"
+        cache.set(cache_key, data, 60 * 60 * 6)
+    return JsonResponse(data)
 
-        return ""
 
-    features = []
-    files = list(STORMS_DIR.rglob("*.geojson"))
-    for p in files:
+ARCHIVE_LIMIT = 200
+ARCHIVE_MAX_LIMIT = 2000
+
+
+def _parse_when(value, end=False):
+    """ISO date or datetime -> aware UTC datetime; a bare date as `end` means the end of that day."""
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is not None:
+        when = datetime.combine(day + timedelta(days=1) if end else day, datetime.min.time())
+    else:
         try:
-            gj = json.loads(p.read_text(encoding="utf-8"))
-            storm_id = p.stem.split("_")[0].lower()  # e.g., al012025_cone_005 -> al012025
-            info = name_lookup.get(storm_id, {})
-            friendly_name = info.get("name") or f"Unnamed Storm ({storm_id.upper()})"
-            nhc_type = info.get("type") or nhc_types.get(storm_id, "")
-
-            def enrich(feat):
-                props = feat.setdefault("properties", {})
-                # ensure stormName
-                if not props.get("stormName"):
-                    props["stormName"] = props.get("name") or props.get("storm") or friendly_name
-                # status: prefer NHC type, else classify from props
-                status = nhc_type or classify_from_props(props)
-                if status:
-                    props["status"] = status
-                    props["title"] = f"{status} {props['stormName']}"
-                else:
-                    props["title"] = props["stormName"]
-                # also expose a likely ID so client can match if needed
-                props.setdefault("stormId", storm_id)
-                return feat
-
-            if gj.get("type") == "FeatureCollection":
-                features.extend(enrich(f) for f in gj.get("features", []))
-            elif gj.get("type") == "Feature":
-                features.append(enrich(gj))
-        except Exception:
-            continue
-
-    print(f"[storms_geojson] files={len(files)} features={len(features)} dir={STORMS_DIR}")
-    return JsonResponse({"type": "FeatureCollection", "features": features})
+            when = parse_datetime(value)
+        except ValueError:
+            when = None  # well-formed but out of range, e.g. a 25th hour
+        if when is None:
+            raise ValueError(f"{value!r} is not an ISO date or datetime")
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return when
+
+
+def _archive_filters(request):
+    """
+    Parse /api/advisories' query string into (filters, bbox, start, end, limit);
+    filters as _storm_filters() minus latest. Raises ValueError on malformed input.
+    """
+    filters = _storm_filters(request)
+    if filters.pop("latest", False):
+        raise ValueError("latest is not supported on the archive")
+    q = request.GET
+    bbox = None
+    if q.get("bbox", "").strip():
+        try:
+            parts = [float(v) for v in q["bbox"].split(",")]
+        except ValueError:
+            parts = []
+        if len(parts) != 4 or not all(map(math.isfinite, parts)) or parts[0] > parts[2] or parts[1] > parts[3]:
+            raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+        bbox = parts
+    start = _parse_when(q["start"]) if q.get("start", "").strip() else None
+    end = _parse_when(q["end"], end=True) if q.get("end", "").strip() else None
+    try:
+        limit = int(q.get("limit") or ARCHIVE_LIMIT)
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= ARCHIVE_MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {ARCHIVE_MAX_LIMIT}")
+    return filters, bbox, start, end, limit
 
 
 @require_GET
-def nhc_current(request):
+def advisory_archive(request):
     """
-    CORS-safe proxy for https://www.nhc.noaa.gov/CurrentStorms.json
-    Returns {"byId": {...}, "byName": {...}}.
+    Archived advisory layers (every cone/track/points ever ingested) as one
+    FeatureCollection, oldest first. Filters: bbox=min_lon,min_lat,max_lon,max_lat
+    (features must intersect it), start= / end= (issue time; ISO date or
+    datetime, UTC unless given, end dates inclusive), storm=, kind=,
+    advisory_min=, advisory_max=, limit= (layers, default ARCHIVE_LIMIT).
+    bbox queries go through the R-tree, the rest through indexed columns;
+    nothing is read from the data directory. "truncated" is true when more
+    layers matched than limit.
     """
-    url = "https://www.nhc.noaa.gov/CurrentStorms.json"
+    try:
+        filters, bbox, start, end, limit = _archive_filters(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
 
-    def build_maps(obj):
-        # Accept either {"activeStorms":[...]} or a raw list [...]
-        if isinstance(obj, dict):
-            arr = obj.get("activeStorms", [])
-        elif isinstance(obj, list):
-            arr = obj
-        else:
-            arr = []
-        by_id, by_name = {}, {}
-        for s in arr:
-            if not isinstance(s, dict):
+    qs = Advisory.objects.all()
+    if "storm" in filters:
+        qs = qs.filter(storm_id=filters["storm"])
+    if "kind" in filters:
+        qs = qs.filter(kind=filters["kind"])
+    if "advisory_min" in filters:
+        qs = qs.filter(advisory_rank__gte=archive.advisory_rank(filters["advisory_min"]))
+    if "advisory_max" in filters:
+        qs = qs.filter(advisory_rank__lte=archive.advisory_rank(filters["advisory_max"]))
+    if start is not None:
+        qs = qs.filter(issue_time__gte=start)
+    if end is not None:
+        qs = qs.filter(issue_time__lt=end)
+    if bbox is not None:
+        where = ["max_lon >= %s", "min_lon <= %s", "max_lat >= %s", "min_lat <= %s"]
+        params = [bbox[0], bbox[2], bbox[1], bbox[3]]
+        # The R-tree holds issue time too, so a time window narrows the index scan
+        if start is not None:
+            where.append("max_t >= %s")
+            params.append(start.timestamp())
+        if end is not None:
+            where.append("min_t <= %s")
+            params.append(end.timestamp())
+        qs = qs.filter(id__in=RawSQL(f"SELECT id FROM {archive.RTREE} WHERE {' AND '.join(where)}", params))
+
+    rows = list(qs.order_by("issue_time", "storm_id", "kind", "advisory_rank")[:limit + 1])
+    area = shapely.box(*bbox) if bbox is not None else None
+    features = []
+    for row in rows[:limit]:
+        for feat in row.feature_collection().get("features", []):
+            if area is not None and not (feat.get("geometry") and shape(feat["geometry"]).intersects(area)):
                 continue
-            sid = (s.get("id") or "").strip().lower()
-            nm  = (s.get("name") or "").strip().lower()
-            st  = (s.get("stormType") or "").strip()
-            if sid and st:
-                by_id[sid] = st
-            if nm and st:
-                by_name[nm] = st
-        return by_id, by_name
-
-    # Primary attempt (normal SSL)
-    try:
-        r = requests.get(url, timeout=6)
-        r.raise_for_status()
-        obj = r.json()
-        by_id, by_name = build_maps(obj)
-        return JsonResponse({"byId": by_id, "byName": by_name}, status=200)
-    except Exception as e1:
-        print(f"[nhc_current] primary fetch failed: {e1}")
-
-    # One retry for dev SSL hiccups
+            props = feat.setdefault("properties", {})
+            props.setdefault("stormName", row.storm_name)
+            props.update(stormId=row.storm_id, kind=row.kind, advisory=row.advisory,
+                         issueTime=row.issue_time.isoformat())
+            features.append(feat)
+    resp = JsonResponse({"type": "FeatureCollection", "features": features, "truncated": len(rows) > limit})
+    resp["Cache-Control"] = "public, max-age=300"
+    return resp
+
+
+@require_GET
+def vector_tile(request, layer, z, x, y):
+    """
+    Mapbox Vector Tile for one layer: "cones", "tracks" (latest advisory per
+    storm) or "shelters". Tiles are rendered once per data version and served
+    from the on-disk tile cache after that; a tile with nothing in it is a 204.
+    """
+    if layer not in tiles.LAYERS or z > tiles.MAX_ZOOM or x >= 2 ** z or y >= 2 ** z:
+        raise Http404("No such tile")
+
+    body, version = tiles.get_tile(layer, z, x, y)
+    etag = f'"{layer}-{version}"'
+    if _etag_matches(request, etag):
+        resp = HttpResponseNotModified()
+    elif not body:
+        resp = HttpResponse(status=204)
+    else:
+        resp = HttpResponse(body, content_type="application/vnd.mapbox-vector-tile")
+    resp["ETag"] = etag
+    resp["Cache-Control"] = "public, max-age=300"
+    return resp
+
+
+@require_GET
+async def nhc_current(request):
+    """
+    CORS-safe proxy for https://www.nhc.noaa.gov/CurrentStorms.json
+    Returns {"byId": {...}, "byName": {...}}.
+    """
     try:
-        r = requests.get(url, timeout=6, verify=False)
-        r.raise_for_status()
-        obj = r.json()
-        by_id, by_name = build_maps(obj)
-        print("[nhc_current] succeeded on retry with verify=False (dev-only).")
-        return JsonResponse({"byId": by_id, "byName": by_name}, status=200)
-    except Exception as e2:
-        print(f"[nhc_current] retry failed: {e2}")
+        storms = await nhc.acurrent_storms()
+    except nhc.UpstreamUnavailable:
         # Don’t break the UI—return empty maps
         return JsonResponse({"byId": {}, "byName": {}, "error": "upstream_failed"}, status=200)
+
+    by_id, by_name = {}, {}
+    for s in storms:
+        sid = (s.get("id") or "").strip().lower()
+        nm  = (s.get("name") or "").strip().lower()
+        st  = (s.get("stormType") or "").strip()
+        if sid and st:
+            by_id[sid] = st
+        if nm and st:
+            by_name[nm] = st
+    body = {"byId": by_id, "byName": by_name}
+    if storms.stale:
+        # NHC is down; this is the last good copy
+        body.update(stale=True, fetchedAt=_isoformat(storms.fetched_at))
+    return _mark_stale(JsonResponse(body, status=200), storms)
+
+
+@require_GET
+def metrics_view(request):
+    """Prometheus text exposition of tracker.metrics, summed over every worker."""
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponse("Unauthorized\n", status=401, content_type="text/plain")
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")